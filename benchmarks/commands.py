@@ -0,0 +1,248 @@
+"""Time the bot's commands end to end against a temporary database.
+
+Runs full pick/ban drafts (started both from rulesets and with pickban
+given a pool and order directly), bursts of signups and checkins, and listings of
+the resulting large tables, through the real command coroutines with fake
+Discord objects. Latency is measured per command call.
+
+Usage: python benchmarks/commands.py [--drafts N] [--players N] [--output FILE]
+                                     [--compare FILE]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+
+from fakes import FakeChannel, FakeContext, FakeGuild, FakeMember
+
+import solomonbot
+
+
+class Timings:
+    """Latencies of the operations in one scenario."""
+
+    def __init__(self):
+        self.latencies = []
+        self.started = None
+        self.elapsed = 0.0
+
+    async def time(self, coro):
+        start = time.perf_counter()
+        await coro
+        self.latencies.append(time.perf_counter() - start)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed += time.perf_counter() - self.started
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            "ops": len(latencies),
+            "seconds": round(self.elapsed, 4),
+            "ops_per_sec": round(len(latencies) / self.elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+        }
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[max(math.ceil(p * len(ordered)) - 1, 0)]
+
+
+async def run_draft(timings, start, rng):
+    """Play one draft to completion, choosing maps at random.
+
+    start(ctx, captain1, captain2) is the command starting it."""
+    guild = FakeGuild()
+    captains = FakeMember("captain1"), FakeMember("captain2")
+    by_id = {c.id: c for c in captains}
+    channel = FakeChannel()
+
+    await timings.time(start(FakeContext(captains[0], guild, channel), *captains))
+    actives = solomonbot.guild_states.get(guild.id)["active-pickbans-by-user"]
+    while captains[0].id in actives:
+        process = actives[captains[0].id]
+        command = (
+            solomonbot.pick
+            if process.next_action == solomonbot.PICK
+            else solomonbot.ban
+        )
+        ctx = FakeContext(by_id[process.next_captain], guild, channel)
+        await timings.time(command(ctx, rng.choice(process.pool)))
+
+
+def ruleset_draft(name):
+    return lambda ctx, captain1, captain2: solomonbot.ruleset(
+        ctx, name, captain1, captain2
+    )
+
+
+def pickban_draft(ruleset):
+    return lambda ctx, captain1, captain2: solomonbot.pickban(
+        ctx, captain1, captain2, ruleset.pool, ruleset.order
+    )
+
+
+async def drafts(args, rng, starts):
+    """Run args.drafts drafts, going round the given ways of starting one."""
+    timings = Timings()
+    with timings:
+        for first in range(0, args.drafts, args.concurrency):
+            count = min(args.concurrency, args.drafts - first)
+            await asyncio.gather(
+                *(
+                    run_draft(timings, starts[(first + i) % len(starts)], rng)
+                    for i in range(count)
+                )
+            )
+    return timings
+
+
+async def burst(command, guild, players):
+    """Everyone runs a command at once, as they do when signups open."""
+    timings = Timings()
+    with timings:
+        await asyncio.gather(
+            *(timings.time(command(FakeContext(p, guild))) for p in players)
+        )
+    return timings
+
+
+async def listing(command, guild, repeat):
+    """List the first, a middle and the last page, repeatedly."""
+    timings = Timings()
+    ctx = FakeContext(FakeMember("viewer"), guild)
+    tournament = await solomonbot.tournament_store.find(guild.id)
+    total = await solomonbot.PlayerList(solomonbot.db, tournament, "signups").count()
+    pages = max((total - 1) // solomonbot.roster.PAGE_SIZE + 1, 1)
+    with timings:
+        for _ in range(repeat):
+            for page in (1, (pages + 1) // 2, pages):
+                await timings.time(command(ctx, None, page))
+    return timings
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    # Listings would otherwise sit waiting for someone to turn the page.
+    solomonbot.PAGE_TIMEOUT = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        await solomonbot.start_up(os.path.join(tmp, "benchmark.sqlite3"))
+        db = solomonbot.db
+        try:
+            rulesets = solomonbot.catalog.DEFAULT_CATALOG.rulesets
+            results = {
+                "drafts": (
+                    await drafts(args, rng, [ruleset_draft(name) for name in rulesets])
+                ).summary(),
+                "pickban_drafts": (
+                    await drafts(
+                        args, rng, [pickban_draft(r) for r in rulesets.values()]
+                    )
+                ).summary(),
+            }
+
+            guild = FakeGuild()
+            await solomonbot.tournament_store.create(guild.id, "benchmark")
+            await solomonbot.tournament_store.open(guild.id, "benchmark", "signups")
+            await solomonbot.tournament_store.open(guild.id, "benchmark", "checkins")
+            players = [FakeMember("player{}".format(i)) for i in range(args.players)]
+            results["signup_burst"] = (
+                await burst(solomonbot.signup, guild, players)
+            ).summary()
+            results["checkin_burst"] = (
+                await burst(solomonbot.checkin, guild, players[::2])
+            ).summary()
+            results["list_signups"] = (
+                await listing(solomonbot.signups, guild, args.repeat)
+            ).summary()
+            results["list_checkins"] = (
+                await listing(solomonbot.checkins, guild, args.repeat)
+            ).summary()
+        finally:
+            db.close()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def report(results, baseline=None):
+    print(
+        "{:<14} {:>7} {:>10} {:>10} {:>10}".format(
+            "scenario", "ops", "ops/sec", "p50 ms", "p99 ms"
+        )
+    )
+    for name, r in results.items():
+        line = "{:<14} {:>7} {:>10} {:>10} {:>10}".format(
+            name, r["ops"], r["ops_per_sec"], r["p50_ms"], r["p99_ms"]
+        )
+        old = (baseline or {}).get(name)
+        if old:
+            line += "   ops/sec {:+.0%}, p99 {:+.0%}".format(
+                r["ops_per_sec"] / old["ops_per_sec"] - 1,
+                r["p99_ms"] / old["p99_ms"] - 1,
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drafts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    # Commands may wait on the bot (e.g. for reactions), so use its event loop.
+    results = solomonbot.bot.loop.run_until_complete(run(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    report(results, baseline)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "revision": git_revision(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "parameters": vars(args),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("Results written to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Local stand-ins for the Discord objects the bot's commands use.
+
+Commands are called directly (e.g. ``await solomonbot.signup(ctx)``), which
+skips argument conversion and checks, so all they need is something shaped
+like a Context: an author, guild and channel, and send() returning a message.
+Nothing here touches the network.
+"""
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import solomonbot  # noqa: E402
+
+_ids = itertools.count(10**17)
+
+
+def new_id():
+    """A new snowflake-sized ID."""
+    return next(_ids)
+
+
+class FakeMember:
+    def __init__(self, name, id=None, bot=False):
+        self.id = new_id() if id is None else id
+        self.name = self.display_name = name
+        self.bot = bot
+        self.mention = "<@!{}>".format(self.id)
+
+    def __str__(self):
+        return "{}#0001".format(self.name)
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeGuild:
+    def __init__(self, id=None):
+        self.id = new_id() if id is None else id
+
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None):
+        self.id = new_id()
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.edits = 0
+        self.deleted = False
+
+    async def delete(self):
+        self.deleted = True
+
+    async def edit(self, content=None, embed=None):
+        self.content = content
+        self.embed = embed
+        self.edits += 1
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def remove_reaction(self, emoji, member):
+        pass
+
+    async def clear_reactions(self):
+        pass
+
+
+class FakeChannel:
+    """A channel remembering the messages sent to it (when keep is set)."""
+
+    def __init__(self, id=None, keep=False):
+        self.id = new_id() if id is None else id
+        self.keep = keep
+        self.messages = []
+        self.sent = 0
+
+    async def send(self, content=None, embed=None):
+        message = FakeMessage(self, content, embed)
+        self.sent += 1
+        if self.keep:
+            self.messages.append(message)
+        return message
+
+
+class FakeContext:
+    def __init__(self, author, guild=None, channel=None):
+        self.author = author
+        self.guild = guild
+        self.channel = channel or FakeChannel()
+        self.bot = solomonbot.bot
+
+    async def send(self, content=None, embed=None):
+        return await self.channel.send(content, embed=embed)
@@ -0,0 +1,60 @@
+"""Compare MapMatcher against a plain fuzzy_choice scan over every map pool.
+
+Usage: python benchmarks/fuzzy_choice.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import solomonbot  # noqa: E402
+from solomonbot.matching import MapMatcher, fuzzy_choice  # noqa: E402
+
+
+def queries_for(pool):
+    """Exact, prefix, acronym, ambiguous and missing lookups for a pool."""
+    queries = []
+    for option in sorted(pool):
+        queries.append(option.upper())
+        queries.append(option[:3].lower())
+        queries.append("".join(c for c in option if c.isupper()).lower())
+    queries.extend(["", "x", "zzz", "c", "t"])
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    for name, pool in sorted(solomonbot.catalog.DEFAULT_CATALOG.pools.items()):
+        queries = queries_for(pool)
+        matcher = MapMatcher(pool)
+        for query in queries:
+            expected = fuzzy_choice(pool, query)
+            actual = matcher.match(query)
+            assert actual == expected, (name, query, actual, expected)
+
+        scan = timeit.timeit(
+            lambda: [fuzzy_choice(pool, q) for q in queries], number=args.number
+        )
+        indexed = timeit.timeit(
+            lambda: [matcher.match(q) for q in queries], number=args.number
+        )
+        lookups = len(queries) * args.number
+        print(
+            "{:<12} {:>3} maps  fuzzy_choice {:>7.2f} us/lookup  "
+            "MapMatcher {:>6.2f} us/lookup  ({:.1f}x)".format(
+                name,
+                len(pool),
+                scan / lookups * 1e6,
+                indexed / lookups * 1e6,
+                scan / indexed,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""Simulate a tournament night: a signup/checkin rush alongside many drafts.
+
+Thousands of members sign up, withdraw and check in while dozens of pick/ban
+processes run in parallel, all on one event loop. Messages go through the
+bot's real on_message handler (prefix parsing, argument conversion, hooks and
+Context.send) via a stand-in for the gateway, and replies go to a stand-in
+for the HTTP API which adds latency like Discord's would.
+
+Afterwards it reports throughput and latency per command, how long the event
+loop was stalled, and whether the database agrees with the "#N" replies.
+Exits with status 1 if it doesn't.
+
+Usage: python benchmarks/loadgen.py [--members N] [--drafts N] [--duration S]
+                                    [--http-latency S] [--output FILE]
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from fakes import FakeGuild, FakeMember, new_id
+
+import solomonbot
+
+SIGNED_UP = re.compile(r"<@!(\d+)> is now signed up \(#(\d+),")
+CHECKED_IN = re.compile(r"<@!(\d+)> has checked in \(#(\d+),")
+WITHDRAWN = re.compile(r"Your signup has been withdrawn, <@!(\d+)>")
+
+
+class FakeHTTP:
+    """Stands in for the HTTP API: replies take a while, and are remembered."""
+
+    def __init__(self, latency, jitter, rng):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = rng
+        self.sent = []
+
+    async def _delay(self):
+        await asyncio.sleep(
+            max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0)
+        )
+
+    async def send_message(self, channel_id, content, **kwargs):
+        await self._delay()
+        self.sent.append(content)
+        return {"id": new_id(), "channel_id": channel_id, "content": content}
+
+
+class FakeState:
+    """The parts of the connection state that Context.send() uses."""
+
+    allowed_mentions = None
+
+    def __init__(self, http):
+        self.http = http
+
+    def create_message(self, channel, data):
+        return FakeGatewayMessage(self, data["content"], None, None, channel)
+
+
+class FakeTextChannel:
+    def __init__(self):
+        self.id = new_id()
+
+
+class FakeMemberGuild(FakeGuild):
+    """A guild whose members can be looked up, for mentions in arguments."""
+
+    def __init__(self):
+        super().__init__()
+        self.members = {}
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    def get_member_named(self, name):
+        return None
+
+
+class FakeGatewayMessage:
+    def __init__(self, state, content, author, guild, channel):
+        self._state = state
+        self.id = new_id()
+        self.content = content
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.mentions = []
+
+
+class Gateway:
+    """Stands in for the gateway, delivering members' messages to the bot."""
+
+    def __init__(self, state, guild):
+        self.state = state
+        self.guild = guild
+        self.channel = FakeTextChannel()
+        self.latencies = collections.defaultdict(list)
+        # As the READY event would, so the bot can ignore its own messages.
+        solomonbot.bot._connection.user = FakeMember("solomonbot", bot=True)
+
+    async def message(self, member, content):
+        """Have a member send a message, returning once the bot has replied."""
+        message = FakeGatewayMessage(
+            self.state, content, member, self.guild, self.channel
+        )
+        start = time.perf_counter()
+        await solomonbot.on_message(message)
+        command = content.split()[0].lstrip("$")
+        self.latencies[command].append(time.perf_counter() - start)
+
+
+class LoopMonitor:
+    """Measures how late the event loop is to wake up a sleeping task."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(time.perf_counter() - start - self.interval, 0))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+    def summary(self, threshold=0.01):
+        lags = sorted(self.lags)
+        return {
+            "samples": len(lags),
+            "p99_ms": round(percentile(lags, 0.99) * 1000, 3),
+            "max_ms": round(lags[-1] * 1000, 3),
+            # Time spent in stalls long enough to be noticeable
+            "stalled_seconds": round(sum(l for l in lags if l >= threshold), 3),
+        }
+
+
+def percentile(ordered, p):
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+async def member_rush(gateway, member, args, rng):
+    """One member's evening: sign up, maybe change their mind, check in."""
+    await asyncio.sleep(rng.uniform(0, args.duration))
+    await gateway.message(member, "$signup")
+    if rng.random() < args.duplicate_rate:
+        await gateway.message(member, "$signup")
+    if rng.random() < args.withdraw_rate:
+        await asyncio.sleep(rng.uniform(0, args.duration / 4))
+        await gateway.message(member, "$withdraw")
+        if rng.random() < 0.5:
+            await gateway.message(member, "$signup")
+    if rng.random() < args.checkin_rate:
+        await asyncio.sleep(rng.uniform(0, args.duration / 2))
+        await gateway.message(member, "$checkin")
+
+
+async def draft(gateway, captains, args, rng):
+    """A pair of captains running a ruleset draft to completion."""
+    await asyncio.sleep(rng.uniform(0, args.duration))
+    by_id = {c.id: c for c in captains}
+    ruleset = rng.choice(list(solomonbot.catalog.DEFAULT_CATALOG.rulesets))
+    await gateway.message(
+        captains[0], "$ruleset {} {} {}".format(ruleset, *(c.mention for c in captains))
+    )
+    actives = solomonbot.guild_states.get(gateway.guild.id)["active-pickbans-by-user"]
+    while captains[0].id in actives:
+        await asyncio.sleep(rng.uniform(0, args.think))
+        process = actives[captains[0].id]
+        action = "pick" if process.next_action == solomonbot.PICK else "ban"
+        choice = rng.choice(process.pool)
+        await gateway.message(
+            by_id[process.next_captain], "${} {}".format(action, choice)
+        )
+
+
+async def check_consistency(guild, replies):
+    """Compare the database with the replies members were given."""
+    signed_up = collections.Counter()
+    withdrawn = set()
+    checked_in = {}
+    numbers = collections.Counter()
+    for content in replies:
+        match = SIGNED_UP.match(content)
+        if match:
+            signed_up[int(match.group(1))] += 1
+            numbers[int(match.group(2))] += 1
+            continue
+        match = WITHDRAWN.match(content)
+        if match:
+            withdrawn.add(int(match.group(1)))
+            continue
+        match = CHECKED_IN.match(content)
+        if match:
+            checked_in[int(match.group(1))] = int(match.group(2))
+
+    withdrawals = sum(1 for r in replies if WITHDRAWN.match(r))
+    expected_signups = sum(signed_up.values()) - withdrawals
+
+    db = solomonbot.db
+    tournament = await solomonbot.tournament_store.find(guild.id)
+    rows = await db.fetchall(
+        "SELECT user_id, checkin_time FROM signups WHERE tournament_id = ?;",
+        (tournament.id,),
+    )
+    counters = {
+        r["name"]: r["value"]
+        for r in await db.fetchall(
+            "SELECT name, value FROM counters WHERE tournament_id = ?;",
+            (tournament.id,),
+        )
+    }
+    checkins = sum(1 for r in rows if r["checkin_time"])
+    problems = []
+    if not len(rows) == counters.get("signups", 0) == expected_signups:
+        problems.append(
+            "signups: {} rows, counter {}, replies imply {}".format(
+                len(rows), counters.get("signups"), expected_signups
+            )
+        )
+    if checkins != counters.get("checkins", 0):
+        problems.append(
+            "checkins: {} rows, counter {}".format(checkins, counters.get("checkins"))
+        )
+    # A number can only be handed out again after a withdrawal took it back.
+    reused = sum(count - 1 for count in numbers.values() if count > 1)
+    if reused > withdrawals:
+        problems.append(
+            "{} signup numbers reused with only {} withdrawals".format(
+                reused, withdrawals
+            )
+        )
+    if len(set(checked_in.values())) != len(checked_in) and not withdrawn:
+        problems.append("duplicate checkin numbers without any withdrawals")
+    return {
+        "signup_replies": sum(signed_up.values()),
+        "withdrawals": withdrawals,
+        "checkin_replies": len(checked_in),
+        "rows": len(rows),
+        "counters": counters,
+        "problems": problems,
+    }
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    http = FakeHTTP(args.http_latency, args.http_jitter, rng)
+    guild = FakeMemberGuild()
+    gateway = Gateway(FakeState(http), guild)
+
+    members = [FakeMember("member{}".format(i)) for i in range(args.members)]
+    captains = [
+        (FakeMember("captain{}a".format(i)), FakeMember("captain{}b".format(i)))
+        for i in range(args.drafts)
+    ]
+    for member in members + [c for pair in captains for c in pair]:
+        guild.members[member.id] = member
+
+    with tempfile.TemporaryDirectory() as tmp:
+        await solomonbot.start_up(os.path.join(tmp, "loadgen.sqlite3"))
+        db = solomonbot.db
+        try:
+            await solomonbot.tournament_store.create(guild.id, "loadgen")
+            await solomonbot.tournament_store.open(guild.id, "loadgen", "signups")
+            await solomonbot.tournament_store.open(guild.id, "loadgen", "checkins")
+            monitor = LoopMonitor()
+            monitor.start()
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(member_rush(gateway, m, args, rng) for m in members),
+                *(draft(gateway, pair, args, rng) for pair in captains),
+            )
+            elapsed = time.perf_counter() - start
+            monitor.stop()
+            consistency = await check_consistency(guild, http.sent)
+        finally:
+            db.close()
+
+    commands = {}
+    for command, latencies in sorted(gateway.latencies.items()):
+        latencies.sort()
+        commands[command] = {
+            "ops": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+        }
+    total = sum(c["ops"] for c in commands.values())
+    return {
+        "seconds": round(elapsed, 3),
+        "messages": total,
+        "messages_per_sec": round(total / elapsed, 1),
+        "replies": len(http.sent),
+        "errors": {
+            "{} {}".format(c, e): n
+            for (c, e), n in solomonbot.command_metrics.errors.items()
+        },
+        "commands": commands,
+        "event_loop": monitor.summary(),
+        "consistency": consistency,
+    }
+
+
+def report(results):
+    print(
+        "{} messages in {}s ({} msg/s), {} replies".format(
+            results["messages"],
+            results["seconds"],
+            results["messages_per_sec"],
+            results["replies"],
+        )
+    )
+    print(
+        "{:<10} {:>7} {:>10} {:>10} {:>10}".format(
+            "command", "ops", "p50 ms", "p99 ms", "max ms"
+        )
+    )
+    for name, c in results["commands"].items():
+        print(
+            "{:<10} {:>7} {:>10} {:>10} {:>10}".format(
+                name, c["ops"], c["p50_ms"], c["p99_ms"], c["max_ms"]
+            )
+        )
+    loop = results["event_loop"]
+    print(
+        "Event loop lag: p99 {} ms, max {} ms, {}s stalled".format(
+            loop["p99_ms"], loop["max_ms"], loop["stalled_seconds"]
+        )
+    )
+    if results["errors"]:
+        print("Command errors: {}".format(results["errors"]))
+    consistency = results["consistency"]
+    print(
+        "Database: {} signups, counters {}; {} signup, {} withdrawal and {} checkin"
+        " replies".format(
+            consistency["rows"],
+            consistency["counters"],
+            consistency["signup_replies"],
+            consistency["withdrawals"],
+            consistency["checkin_replies"],
+        )
+    )
+    for problem in consistency["problems"]:
+        print("INCONSISTENT: {}".format(problem))
+    if not consistency["problems"]:
+        print("Database is consistent with the replies.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=3000)
+    parser.add_argument("--drafts", type=int, default=40)
+    parser.add_argument(
+        "--duration", type=float, default=10, help="seconds over which people arrive"
+    )
+    parser.add_argument(
+        "--think", type=float, default=0.5, help="longest a captain takes per turn"
+    )
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--withdraw-rate", type=float, default=0.05)
+    parser.add_argument("--checkin-rate", type=float, default=0.8)
+    parser.add_argument("--http-latency", type=float, default=0.08)
+    parser.add_argument("--http-jitter", type=float, default=0.04)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Commands dispatch events on the bot's event loop, so run there.
+    results = solomonbot.bot.loop.run_until_complete(run(args))
+    report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
+    sys.exit(1 if results["consistency"]["problems"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,47 @@
 import argparse
 import importlib
+import logging
 import os
 
 sb = importlib.import_module("solomonbot")
+sharding = importlib.import_module("solomonbot.sharding")
 
-parser = argparse.ArgumentParser(
-    description="A Discord bot for organizing competitive games."
-)
-parser.add_argument("--key", help="Discord bot authentication key")
-args = parser.parse_args()
 
-sb.bot.run(args.key or os.getenv("DISCORD_BOT_KEY"))
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(
+        description="A Discord bot for organizing competitive games."
+    )
+    parser.add_argument("--key", help="Discord bot authentication key")
+    parser.add_argument(
+        "--db",
+        default=sb.DATABASE_PATH,
+        help="Path of the SQLite database (created if it doesn't exist)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Total number of shards (required to run more than one process)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of worker processes to split the shards between",
+    )
+    args = parser.parse_args()
+    key = args.key or os.getenv("DISCORD_BOT_KEY")
+    logging.basicConfig(level=logging.INFO)
+
+    if args.processes > 1:
+        if not args.shards or args.shards < args.processes:
+            parser.error("--shards must be given, and at least --processes")
+        sharding.launch(key, args.shards, args.processes, args.db)
+    elif args.shards:
+        sb.run_sharded(key, range(args.shards), args.shards, args.db)
+    else:
+        sb.run(key, args.db)
+
+
+# Worker processes re-import this module, and mustn't start launching again.
+if __name__ == "__main__":
+    main()
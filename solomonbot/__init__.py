@@ -1,149 +1,403 @@
-from copy import deepcopy
+import asyncio
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+import logging
+import os
 import random
-import sqlite3
-
-_default_state = {
-    "maps": {
-        "arena": {
-            "Aquarena",
-            "Authority",
-            "Calico",
-            "Cerberus",
-            "Chasm",
-            "Skyway",
-            "Vertex",
-        },
-        "byo5": {
-            "Brynhildr",
-            "Coral",
-            "Elite",
-            "Exhumed",
-            "Ingonyama",
-            "Kryosis",
-            "Minora",
-            "NightFlare",
-            "Raptor",
-            "TwilightGrove",
-        },
-        "ctf": {
-            "Authority",
-            "BeachBlitz",
-            "Brynhildr",
-            "Cerberus",
-            "Coral",
-            "CrushDepth",
-            "Drought",
-            "Elite",
-            "Exhumed",
-            "FatalFortress",
-            "Gloomlands",
-            "Icedance",
-            "Ingonyama",
-            "Kryosis",
-            "Minora",
-            "NightFlare",
-            "Outpost",
-            "Raptor",
-            "RiftValley",
-            "Tolar",
-            "Trailblazer",
-            "TwilightGrove",
-            "Zephyr",
-        },
-        "ctf-ladder": {
-            "Brynhildr",
-            "Coral",
-            "Elite",
-            "Exhumed",
-            "Ingonyama",
-            "Kryosis",
-            "Minora",
-            "NightFlare",
-            "Outpost",
-            "Raptor",
-            "RiftValley",
-            "Trailblazer",
-            "TwilightGrove",
-        },
-        "tdm": {
-            "Authority",
-            "Blitz",
-            "Calypso",
-            "Cerberus",
-            "Crystalline",
-            "Skyway",
-            "Speedway",
-            "Tribulus",
-            "Zephyr",
-        },
-    },
-    "rulesets": {
-        "ctf-byo5": {
-            "pool": "byo5",
-            "order": "~pp~bbbbbbbr",
-        },
-        "ctf-ladder": {
-            "pool": "ctf-ladder",
-            "order": "pppppppp6?",
-        },
-        "ctf-ladder-bans": {
-            "pool": "ctf-ladder",
-            "order": "bbbbpppppppp6?",
-        },
-    },
-    "active-pickbans-by-user": {},
-}
-state = deepcopy(_default_state)
-
-db = sqlite3.connect("solomonbot.sqlite3")
-db.row_factory = sqlite3.Row
-
-bot = commands.Bot(command_prefix="$")
+import time
+import typing
+
+from .board import Board, mention
+from .catalog import (
+    CatalogError,
+    CatalogStore,
+    add_maps,
+    remove_maps,
+    remove_pool,
+    remove_ruleset,
+    set_ruleset,
+)
+from .database import Database
+from .draft import (
+    BAN,
+    PICK,
+    Draft,
+    NotInPool,
+    NotYourTurn,
+    OrderError,
+    PoolExhausted,
+    WrongAction,
+    compile_order,
+)
+from .export import FORMATS
+from .guilds import GuildStates
+from . import history
+from .history import CANCELLED, COMPLETED
+from .metrics import Metrics
+from .migrations import migrate, unclaimed_tables, upgrade_tables
+from .outbound import Outbox, pack
+from .pools import parse_pool_spec
+from . import schema
+from .render import RenderCache
+from .roster import LISTS, PlayerList
+from .sessions import SessionStore
+from . import simulation
+from .simulation import SimulationError
+from .settings import SettingsCache
+from .teams import TeamError, balance
+from .timeouts import Scheduler
+from .tournaments import PHASES, TournamentError, TournamentStore, player_table
+from .sharding import LEASE_LOST, LEASE_RENEWAL, ShardLeases
+
+
+def new_guild_state():
+    # Map pools and rulesets live in the guild's (shared, frozen) catalog.
+    return {"active-pickbans-by-user": {}}
+
+
+guild_states = GuildStates(new_guild_state)
+
+command_metrics = Metrics()
+# Where the metrics are periodically written, for Prometheus to pick up
+metrics_path = "solomonbot.prom"
+
+DATABASE_PATH = "solomonbot.sqlite3"
+# Set up by open_database(), so that importing the bot doesn't touch any files
+db = None
+settings_cache = None
+catalogs = None
+session_store = None
+tournament_store = None
+render_cache = RenderCache()
+outbox = Outbox()
+# Turn and session timeouts of every draft in progress
+scheduler = Scheduler()
+TURN_TIMEOUT = "turn-timeout"
+SESSION_TIMEOUT = "session-timeout"
+# Used for guilds without the setting; abandoned drafts are eventually cleared.
+DEFAULT_TIMEOUTS = {TURN_TIMEOUT: None, SESSION_TIMEOUT: 2 * 60 * 60}
+# Set when this process is only running some of the shards
+shard_leases = None
+_schema_version = None
+
+log = logging.getLogger(__name__)
+
+bot = commands.AutoShardedBot(command_prefix="$")
+
+
+class TimedContext(commands.Context):
+    """A command context which times the messages sent through it."""
+
+    async def send(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().send(*args, **kwargs)
+        finally:
+            command_metrics.sent(time.perf_counter() - start)
+
+
+@bot.event
+async def on_message(message):
+    if message.author.bot:
+        return
+    ctx = await bot.get_context(message, cls=TimedContext)
+    await bot.invoke(ctx)
+
+
+@bot.before_invoke
+async def start_timing(ctx: commands.Context):
+    command_metrics.start(ctx.command.qualified_name)
+
+
+@bot.after_invoke
+async def finish_timing(ctx: commands.Context):
+    command_metrics.finish()
+
+
+@bot.event
+async def on_command_error(ctx: commands.Context, error):
+    command_metrics.error(ctx.command and ctx.command.qualified_name, error)
+    # Carry on with the default handling (printing the error)
+    await commands.Bot.on_command_error(bot, ctx, error)
+
+
+def open_database(path):
+    """Point the bot at a database file, with fresh caches.
+
+    Nothing is read or written until the database is first used."""
+    global db, settings_cache, catalogs, session_store, tournament_store
+    db = Database(path, metrics=command_metrics)
+    settings_cache = SettingsCache(db)
+    catalogs = CatalogStore(db)
+    session_store = SessionStore(db)
+    tournament_store = TournamentStore(db)
+    return db
+
+
+async def start_up(path=DATABASE_PATH, shard_ids=None, shard_count=None):
+    """Get everything ready to handle commands, before connecting to Discord.
+
+    Opens the database and brings its schema up to date, takes out the shard
+    leases if only some of the shards are being run, and loads the catalogs,
+    settings and drafts in progress, logging how long each of those took."""
+    global shard_leases
+    times = {}
+    started = last = time.perf_counter()
+
+    def finished(phase):
+        nonlocal last
+        now = time.perf_counter()
+        times[phase] = now - last
+        last = now
+
+    open_database(path)
+    applied = await db.transaction(migrate)
+    if applied:
+        log.info("Migrated %s to schema version %s", path, applied[-1])
+    unclaimed = await db.transaction(unclaimed_tables)
+    if unclaimed:
+        log.warning(
+            "Tables %s are from before the database was split up by server;"
+            " run dbupgrade in the server they belong to",
+            ", ".join(unclaimed),
+        )
+    finished("migrations")
+
+    if shard_ids is not None:
+        shard_leases = ShardLeases(db, shard_ids, shard_count)
+        await shard_leases.acquire()
+        # Renew them from now on, however long it takes to get to on_ready.
+        renew_shard_leases.start()
+        finished("leases")
+
+    await warm_caches(unclaimed)
+    finished("caches")
+    log.info(
+        "Started up in %.3fs (%s)",
+        time.perf_counter() - started,
+        ", ".join("{} {:.3f}s".format(phase, t) for phase, t in times.items()),
+    )
+
+
+async def warm_caches(unclaimed=()):
+    """Load what the first commands in each guild would otherwise wait for."""
+    owns = shard_leases.owns if shard_leases else None
+    await catalogs.load()
+    await tournament_store.load()
+    if "settings" not in unclaimed:
+        await settings_cache.load_all(owns)
+    # Output rendered from the default catalog is shared by most guilds.
+    default = catalogs.default
+    rendered(default, "maps", lambda: maps_embed(default))
+    rendered(default, "rulesets", lambda: rulesets_embed(default))
+
+    for process in await session_store.load():
+        if owns and not owns(process.guild_id):
+            continue
+        if process.complete:
+            await session_store.finish(process, COMPLETED)
+            continue
+        actives = guild_states.get(process.guild_id)["active-pickbans-by-user"]
+        captain1, captain2 = process.captains
+        actives[captain1] = actives[captain2] = process
+        # Their clocks start again from now.
+        await schedule_timeouts(process)
+
+
+def run(key, path=DATABASE_PATH):
+    """Start up, then run the bot (for all shards) until it's shut down."""
+    bot.loop.run_until_complete(start_up(path))
+    try:
+        bot.run(key)
+    finally:
+        # Closing the last connection checkpoints the WAL into the database.
+        db.close()
+
+
+def run_sharded(key, shard_ids, shard_count, path=DATABASE_PATH):
+    """Run the bot for some of the shards, with other processes running the rest.
+
+    The processes share the database, and each takes out a lease on its shards
+    so that no guild is ever served by two of them."""
+    global metrics_path
+    metrics_path = "solomonbot-shards-{}-{}.prom".format(shard_ids[0], shard_ids[-1])
+    bot.shard_ids = list(shard_ids)
+    bot.shard_count = shard_count
+    loop = bot.loop
+    loop.run_until_complete(start_up(path, shard_ids, shard_count))
+    try:
+        loop.run_until_complete(bot.start(key))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(bot.close())
+        # Let a replacement process take over straight away.
+        loop.run_until_complete(shard_leases.release())
+        db.close()
+    if shard_leases.lost:
+        raise SystemExit(LEASE_LOST)
+
+
+def guild_id(ctx: commands.Context):
+    """The ID of the guild a command was used in (0 for direct messages)."""
+    return ctx.guild.id if ctx.guild else 0
+
+
+def guild_state(ctx: commands.Context):
+    """The runtime state of the guild a command was used in."""
+    return guild_states.get(guild_id(ctx))
+
+
+@bot.event
+async def on_ready():
+    scheduler.start()
+    if not evict_idle_guilds.is_running():
+        evict_idle_guilds.start()
+    if not dump_metrics.is_running():
+        dump_metrics.start()
+
+
+@tasks.loop(minutes=5)
+async def evict_idle_guilds():
+    for evicted in guild_states.evict_idle():
+        settings_cache.invalidate(evicted)
+
+
+@tasks.loop(minutes=1)
+async def dump_metrics():
+    try:
+        command_metrics.write(metrics_path)
+    except OSError as e:
+        log.warning("Couldn't write metrics to %s: %s", metrics_path, e)
+
+
+@tasks.loop(seconds=LEASE_RENEWAL)
+async def renew_shard_leases():
+    global _schema_version
+    if not await shard_leases.renew():
+        # Someone else has taken over our shards; carrying on would mean both
+        # of us handling the same guilds.
+        log.warning("Lost the lease on shards %s, stopping", shard_leases.shard_ids)
+        await bot.close()
+        return
+    # Another process may have wiped or upgraded the database.
+    version = (await db.fetchone("PRAGMA schema_version;"))[0]
+    if _schema_version is not None and version != _schema_version:
+        await forget_database()
+    _schema_version = version
+
+
+async def forget_database():
+    """Drop everything cached from a database that has been reset or upgraded."""
+    settings_cache.invalidate()
+    catalogs.invalidate()
+    tournament_store.invalidate()
+    # An upgrade keeps the drafts in progress, but a wipe takes them with it
+    # (and their IDs may since have been handed out to other drafts).
+    rows = await db.fetchall(
+        "SELECT id, guild_id, captain1_id, captain2_id FROM pickbans;"
+    )
+    persisted = {tuple(row) for row in rows}
+    for _, state in guild_states:
+        for process in state["active-pickbans-by-user"].values():
+            captain1, captain2 = process.captains
+            key = (process.session_id, process.guild_id, captain1, captain2)
+            if key not in persisted:
+                process.session_id = None
 
 
 @bot.command()
 async def maps(ctx: commands.Context, pool=None):
     """List the maps available for picks/bans."""
+    catalog = await guild_catalog(ctx)
     if pool is None:
-        embed = discord.Embed()
-        for pool_name, maps in state["maps"].items():
-            embed.add_field(
-                name="`{}`".format(pool_name),
-                value=", ".join(sorted(maps)),
-                inline=False,
-            )
+        embed = rendered(catalog, "maps", lambda: maps_embed(catalog))
         await ctx.send("Available map pools:", embed=embed)
         return
 
-    map_list = state["maps"].get(pool)
+    map_list = catalog.pools.get(pool)
     if not map_list:
-        valid_pools = ", ".join("`{}`".format(m) for m in sorted(state["maps"]))
         await ctx.send(
-            "No maps found for specified pool. (Valid pools: {})".format(valid_pools)
+            "No maps found for specified pool. (Valid pools: {})".format(
+                valid_pools(catalog)
+            )
         )
         return
 
-    await ctx.send(", ".join("`{}`".format(m) for m in sorted(map_list)))
+    await ctx.send(
+        rendered(
+            catalog,
+            ("maps", pool),
+            lambda: ", ".join("`{}`".format(m) for m in map_list),
+        )
+    )
+
+
+async def guild_catalog(ctx: commands.Context):
+    """The map pools and rulesets of the guild a command was used in."""
+    return await catalogs.get(guild_id(ctx))
+
+
+def rendered(catalog, key, render):
+    """Output rendered from a catalog, cached until it is replaced."""
+    return render_cache.get(catalog.version, key, render)
+
+
+def maps_embed(catalog):
+    embed = discord.Embed()
+    for pool_name, maps in catalog.pools.items():
+        embed.add_field(
+            name="`{}`".format(pool_name),
+            value=", ".join(maps),
+            inline=False,
+        )
+    return embed
+
+
+def rulesets_embed(catalog):
+    embed = discord.Embed()
+    for ruleset_name, config in catalog.rulesets.items():
+        embed.add_field(
+            name="`{}`".format(ruleset_name),
+            value="Map pool: `{}`, order: `{}`".format(config.pool, config.order),
+            inline=False,
+        )
+    return embed
+
+
+def valid_pools(catalog):
+    return rendered(
+        catalog,
+        "valid-pools",
+        lambda: ", ".join("`{}`".format(m) for m in catalog.pools),
+    )
+
+
+def valid_rulesets(catalog):
+    return rendered(
+        catalog,
+        "valid-rulesets",
+        lambda: ", ".join("`{}`".format(r) for r in catalog.rulesets),
+    )
 
 
 @bot.command()
 async def cancel(ctx: commands.Context):
     """Cancel a pick/ban process."""
+    state = guild_state(ctx)
     actives = state["active-pickbans-by-user"]
-    process = actives.get(ctx.author)
+    process = actives.get(ctx.author.id)
     if not process:
         await ctx.send(
             "You do not have an active pick/ban process. Start one with the `pickban` command."
         )
         return
-    captain1, captain2 = process["captains"]
-    actives.pop(captain1, None)
-    actives.pop(captain2, None)
+    captain1, captain2 = process.captains
+    if not await end_draft(process, actives, CANCELLED):
+        return
     await ctx.send(
         "Cancelled pick/ban process for {} and {}.".format(
-            captain1.mention, captain2.mention
+            mention(captain1), mention(captain2)
         )
     )
 
@@ -151,32 +405,22 @@ async def cancel(ctx: commands.Context):
 @bot.command()
 async def rulesets(ctx: commands.Context, choice=None):
     """List the pre-defined rulesets available for picks/bans."""
+    catalog = await guild_catalog(ctx)
     if choice is None:
-        embed = discord.Embed()
-        for ruleset_name, config in state["rulesets"].items():
-            embed.add_field(
-                name="`{}`".format(ruleset_name),
-                value="Map pool: `{}`, order: `{}`".format(
-                    config["pool"], config["order"]
-                ),
-                inline=False,
-            )
+        embed = rendered(catalog, "rulesets", lambda: rulesets_embed(catalog))
         await ctx.send("Available rulesets:", embed=embed)
         return
 
-    config = state["rulesets"].get(choice)
+    config = catalog.rulesets.get(choice)
     if not config:
-        valid_rulesets = ", ".join("`{}`".format(r) for r in sorted(state["rulesets"]))
         await ctx.send(
             "No ruleset found with the specified name. (Valid rulesets: {})".format(
-                valid_rulesets
+                valid_rulesets(catalog)
             )
         )
         return
 
-    await ctx.send(
-        "Map pool: `{}`, order: `{}`".format(config["pool"], config["order"])
-    )
+    await ctx.send("Map pool: `{}`, order: `{}`".format(config.pool, config.order))
 
 
 @bot.command()
@@ -184,17 +428,17 @@ async def ruleset(
     ctx: commands.Context, choice, captain1: discord.Member, captain2: discord.Member
 ):
     """Begin a pick/ban process using a predefined ruleset."""
-    config = state["rulesets"].get(choice)
+    catalog = await guild_catalog(ctx)
+    config = catalog.rulesets.get(choice)
     if not config:
-        valid_rulesets = ", ".join("`{}`".format(m) for m in sorted(state["rulesets"]))
         await ctx.send(
             "The specified ruleset was not found. (Valid rulesets: {})".format(
-                valid_rulesets
+                valid_rulesets(catalog)
             )
         )
         return
 
-    await pickban(ctx, captain1, captain2, config["pool"], config["order"])
+    await start_draft(ctx, captain1, captain2, config.pool, config.order, choice)
 
 
 @bot.command()
@@ -227,12 +471,16 @@ async def pickban(
         a total of three maps actually played.)
 
     """
+    await start_draft(ctx, captain1, captain2, pool, order)
+
+
+async def start_draft(ctx, captain1, captain2, pool, order, ruleset_name=None):
+    """Start a pick/ban process, from a ruleset if ruleset_name is given."""
+    state = guild_state(ctx)
     actives = state["active-pickbans-by-user"]
-    acceptable = tuple("pbr123456789?~")
-    digits = tuple("123456789")
 
     # Make sure neither captain is already picking
-    busy_captains = {c.mention for c in (captain1, captain2) if c in actives}
+    busy_captains = {c.mention for c in (captain1, captain2) if c.id in actives}
     if busy_captains:
         await ctx.send(
             "These captain(s) are already busy: {}".format(", ".join(busy_captains))
@@ -240,65 +488,54 @@ async def pickban(
         return
 
     # Get the pool of maps
-    digit_prefix, _, pool_name = pool.rpartition("/")
-    pool_size = int(digit_prefix) if digit_prefix else None
-    map_list = state["maps"].get(pool_name)
-    if not map_list:
-        valid_pools = ", ".join("`{}`".format(m) for m in sorted(state["maps"]))
+    pool_name, pool_size = parse_pool_spec(pool)
+    catalog = await guild_catalog(ctx)
+    # The draft keeps this pool even if the catalog changes before it's done.
+    maps = catalog.pools.get(pool_name)
+    if not maps:
         await ctx.send(
-            "No maps found for specified pool. (Valid pools: {})".format(valid_pools)
+            "No maps found for specified pool. (Valid pools: {})".format(
+                valid_pools(catalog)
+            )
         )
+        return
 
     # Validate the pick/ban order specification
-    seen_digit = False
-    seen_question_mark = False
-    for action in order:
-        if action not in acceptable:
-            await ctx.send(
-                "Invalid pick/ban process order."
-                "> Must consist only of `p`, `b`, `r`, and/or a digit followed by `?`s."
-            )
-            return
-        if seen_question_mark and action != "?":
-            await ctx.send(
-                "Invalid pick/ban process order. All `?` must be at the end after a digit."
-            )
-            return
-        if action == "?":
-            if not seen_digit:
-                await ctx.send(
-                    "Invalid pick/ban process order. All `?` must be at the end after a digit."
-                )
-                return
-            seen_question_mark = True
-        if action in digits:
-            if seen_digit:
-                await ctx.send(
-                    "Invalid pick/ban process order. Only one digit is allowed."
-                )
-                return
-            seen_digit = True
-
-    process = {
-        "captains": (captain1, captain2),
-        "pool": set(random.sample(map_list, pool_size) if pool_size else map_list),
-        "picks": [],
-        "bans": [],
-        "order": order,
-        "reversals": 0,
-    }
-    actives[captain1] = actives[captain2] = process
-    embed = discord.Embed()
+    try:
+        program = compile_order(order)
+    except OrderError as e:
+        await ctx.send(str(e))
+        return
+
+    process = Draft(
+        (captain1.id, captain2.id),
+        maps,
+        program,
+        pool_name=pool_name,
+        remaining=maps.sample(random, pool_size) if pool_size else None,
+    )
+    process.ruleset = ruleset_name
+    actives[captain1.id] = actives[captain2.id] = process
+    await session_store.create(process, guild_id(ctx), ctx.channel.id)
+    if not is_active(process):
+        return  # Cancelled before it got going
     if pool_size:
-        embed.add_field(
-            name="Pool", value="`{}` (random {})".format(pool_name, pool_size)
-        )
+        pool_label = "`{}` (random {})".format(pool_name, pool_size)
     else:
-        embed.add_field(name="Pool", value="`{}`".format(pool_name))
-    embed.add_field(name="Order", value="`{}`".format(process["order"]))
+        pool_label = "`{}`".format(pool_name)
+
+    if await get_setting(ctx, "board") == "on":
+        # check_next posts the board once any automatic actions have run
+        process.board = Board(process, pool_label)
+        await check_next(ctx, process)
+        return
+
+    embed = discord.Embed()
+    embed.add_field(name="Pool", value=pool_label)
+    embed.add_field(name="Order", value="`{}`".format(process.order))
     embed.add_field(
         name="Available Maps",
-        value=", ".join("`{}`".format(m) for m in process["pool"]),
+        value=", ".join("`{}`".format(m) for m in process.pool),
         inline=False,
     )
     await ctx.send(
@@ -314,33 +551,41 @@ async def pickban(
 @bot.command()
 async def pick(ctx: commands.Context, choice):
     """Pick a map to during a pick/ban process."""
-    await pick_or_ban(ctx, "picks", choice)
+    await pick_or_ban(ctx, PICK, choice)
 
 
 @bot.command()
 async def ban(ctx: commands.Context, choice):
     """Ban a map during a pick/ban process."""
-    await pick_or_ban(ctx, "bans", choice)
+    await pick_or_ban(ctx, BAN, choice)
 
 
 @bot.command()
 async def status(ctx: commands.Context):
     """Check the status of the current pick/ban process."""
+    state = guild_state(ctx)
     actives = state["active-pickbans-by-user"]
-    process = actives.get(ctx.author)
+    process = actives.get(ctx.author.id)
     if not process:
         await ctx.send(
             "You do not have an active pick/ban process. Start one with the `pickban` command."
         )
         return
-    await check_next(ctx, process)
+    if process.board:
+        # Bring the board back to the bottom of the channel
+        await process.board.post(ctx.channel)
+    else:
+        await check_next(ctx, process)
+    if actives.get(ctx.author.id) is process:
+        await ctx.send(timeouts_summary(process))
 
 
 @bot.command()
 async def remaining(ctx: commands.Context):
     """List the maps remaining in the pool for a pick/ban process."""
+    state = guild_state(ctx)
     actives = state["active-pickbans-by-user"]
-    process = actives.get(ctx.author)
+    process = actives.get(ctx.author.id)
     if not process:
         await ctx.send(
             "You do not have an active pick/ban process. Start one with the `pickban` command."
@@ -349,46 +594,16 @@ async def remaining(ctx: commands.Context):
     embed = discord.Embed()
     embed.add_field(
         name="Available Maps",
-        value=", ".join("`{}`".format(m) for m in process["pool"]),
+        value=", ".join("`{}`".format(m) for m in process.pool),
     )
     await ctx.send("Remaining in the pool:", embed=embed)
 
 
-def fuzzy_choice(options, choice):
-    """Match a choice with one of multiple options in a human-friendly way.
-
-    Will always match either one or none of the options. If a choice is ambiguous,
-    it will choose to match none of them."""
-    # Exact match, case-insensitive
-    for option in options:
-        if option.lower() == choice.lower():
-            return option
-    # Prefix match, case-insensitive
-    potential_options = []
-    for option in options:
-        if option.lower().startswith(choice.lower()):
-            potential_options.append(option)
-    if potential_options:
-        if len(potential_options) == 1:
-            return potential_options[0]
-        return None
-    # Acronym match, case insensitive
-    potential_options = []
-    for option in options:
-        acronym = "".join(letter for letter in option if "A" <= letter <= "Z")
-        if len(acronym) > 1 and acronym.lower() == choice.lower():
-            potential_options.append(option)
-    if potential_options:
-        if len(potential_options) == 1:
-            return potential_options[0]
-        return None
-    return None
-
-
 async def pick_or_ban(ctx: commands.Context, action, choice):
     """Shared logic between picks and bans."""
+    state = guild_state(ctx)
     actives = state["active-pickbans-by-user"]
-    captain = ctx.author
+    captain = ctx.author.id
 
     # We're actively picking?
     process = actives.get(captain)
@@ -398,292 +613,1070 @@ async def pick_or_ban(ctx: commands.Context, action, choice):
         )
         return
 
-    total_actions = len(process["picks"] + process["bans"]) + process["reversals"]
-    next_captain = process["captains"][total_actions % 2]
-    next_action = process["order"][total_actions]
-
-    # Our turn?
-    if captain != next_captain:
+    try:
+        process.select(captain, action, choice)
+    except NotYourTurn as e:
         await ctx.send(
-            "It's currently {}'s turn, not yours.".format(next_captain.mention)
+            "It's currently {}'s turn, not yours.".format(mention(e.captain))
         )
         return
-
-    # Next action is a pick?
-    if action == "picks" and next_action != "p":
-        await ctx.send("The next action is a ban, not a pick. Use `ban` instead.")
-        return
-
-    # Next action is a ban?
-    if action == "bans" and next_action != "b":
-        await ctx.send("The next action is a pick, not a ban. Use `pick` instead.")
+    except WrongAction as e:
+        if e.expected == BAN:
+            await ctx.send("The next action is a ban, not a pick. Use `ban` instead.")
+        else:
+            await ctx.send("The next action is a pick, not a ban. Use `pick` instead.")
         return
-
-    # Our selection is still available?
-    choice = fuzzy_choice(process["pool"], choice)
-    if not choice:
+    except NotInPool:
         embed = discord.Embed()
         embed.add_field(
             name="Available Maps",
-            value=", ".join("`{}`".format(m) for m in sorted(process["pool"])),
+            value=", ".join("`{}`".format(m) for m in process.pool),
         )
         await ctx.send("That choice isn't in the pool.", embed=embed)
         return
 
-    process["pool"].remove(choice)
-    process[action].append(choice)
-
     await check_next(ctx, process)
 
 
 async def check_next(ctx: commands.Context, process):
-    """Check for potential automated action in a pick/ban process and output status."""
-    actives = state["active-pickbans-by-user"]
-    total_actions = len(process["picks"] + process["bans"]) + process["reversals"]
+    """Run automated actions in a pick/ban process and output status.
 
-    # Complete?
-    if total_actions >= len(process["order"]):
-        captain1, captain2 = process["captains"]
-        embed = discord.Embed()
-        embed.add_field(
-            name="Picks",
-            value=", ".join("`{}`".format(m) for m in process["picks"]) or "-",
+    With the "board" setting on, progress is shown by editing the process's
+    board message, and only the final result is sent as a new message."""
+    state = guild_state(ctx)
+    actives = state["active-pickbans-by-user"]
+    captain1, captain2 = process.captains
+    board = process.board
+    if board is None and await get_setting(ctx, "board") == "on":
+        # Restored after a restart, or the setting was turned on midway
+        board = process.board = Board(process, "`{}`".format(process.pool_name))
+    if not is_active(process):
+        return  # Cancelled while the setting was being looked up
+
+    try:
+        auto_selections = process.advance()
+    except PoolExhausted as e:
+        if e.automatic:
+            await ctx.send(
+                "Failed to automatically select a map: no maps remaining in pool."
+            )
+        else:
+            await ctx.send("Unable to continue: ran out of maps in the pool.")
+        # Not cancel(): whoever started or carried on the draft needn't be in it.
+        if await end_draft(process, actives, CANCELLED):
+            await ctx.send(
+                "Cancelled pick/ban process for {} and {}.".format(
+                    mention(captain1), mention(captain2)
+                )
+            )
+        return
+    await session_store.save(process)
+    if not is_active(process):
+        return  # Cancelled while it was being saved
+    if not process.complete:
+        await schedule_timeouts(process)
+
+    auto_selected = [
+        "Automatically selected {} from the remaining pool.".format(
+            ", ".join("`{}`".format(m) for m in selections)
         )
-        embed.add_field(name="Bans", value=", ".join(process["bans"]) or "-")
+        for selections in auto_selections
+    ]
+
+    if board:
+        board.update(" ".join(auto_selected).replace("`", "") or None)
+        if board.message is None:
+            await board.post(ctx.channel)
+        if not process.complete:
+            return
+        await board.flush()
+    else:
+        for message in auto_selected:
+            await ctx.send(message)
+
+    # Pick or ban
+    if not process.complete:
         await ctx.send(
-            "{} and {} have completed the pick/ban process:".format(
-                captain1.mention,
-                captain2.mention,
-            ),
-            embed=embed,
+            "{}, it's your turn to {}.".format(
+                mention(process.next_captain),
+                "pick" if process.next_action == PICK else "ban",
+            )
         )
-        actives.pop(captain1, None)
-        actives.pop(captain2, None)
         return
 
-    next_captain = process["captains"][total_actions % 2]
-    next_action = process["order"][total_actions]
-    later_actions = process["order"][total_actions + 1 :]
-
-    # Complete with random subset of picks?
-    if next_action in tuple("123456789"):
-        captain1, captain2 = process["captains"]
-        subpool_size = int(next_action)
-        subpool_selections = sum(action == "?" for action in later_actions)
-
-        preserved_picks = process["picks"][:-subpool_size]
-        subpool = process["picks"][-subpool_size:]
-        selections = random.sample(subpool, subpool_selections)
-        embed = discord.Embed()
+    embed = discord.Embed()
+    if process.program.subpool_size:
+        # Complete with random subset of picks
         embed.add_field(
             name="Picks",
             value=(
-                ", ".join(["__{}__".format(m) for m in preserved_picks] + subpool)
+                ", ".join(
+                    ["__{}__".format(m) for m in process.preserved_picks]
+                    + process.subpool
+                )
                 or "*n/a*"
             ),
         )
-        embed.add_field(name="Bans", value=(", ".join(process["bans"]) or "*n/a*"))
+        embed.add_field(name="Bans", value=(", ".join(process.bans) or "*n/a*"))
         embed.add_field(
             name="Selections",
-            value=", ".join("`{}`".format(m) for m in preserved_picks + selections),
+            value=", ".join("`{}`".format(m) for m in process.selections),
             inline=False,
         )
-        await ctx.send(
-            "{} and {} have completed the pick/ban process:".format(
-                captain1.mention,
-                captain2.mention,
-            ),
-            embed=embed,
+    else:
+        embed.add_field(
+            name="Picks",
+            value=", ".join("`{}`".format(m) for m in process.picks) or "-",
+        )
+        embed.add_field(name="Bans", value=", ".join(process.bans) or "-")
+    if not await end_draft(process, actives, COMPLETED):
+        return  # Cancelled at the last moment
+    await ctx.send(
+        "{} and {} have completed the pick/ban process:".format(
+            mention(captain1),
+            mention(captain2),
+        ),
+        embed=embed,
+    )
+
+
+async def end_draft(process, actives, outcome):
+    """Stop tracking a pick/ban process that has been completed or cancelled,
+    and archive it (the outcome being which).
+
+    Returns False, doing nothing, if it had already been ended: only the
+    first of a completion and a cancellation racing each other counts."""
+    if actives.get(process.captains[0]) is not process:
+        return False
+    for captain in process.captains:
+        if actives.get(captain) is process:
+            del actives[captain]
+    scheduler.cancel((process, TURN_TIMEOUT))
+    scheduler.cancel((process, SESSION_TIMEOUT))
+    await session_store.finish(process, outcome)
+    if process.board is not None and outcome == CANCELLED:
+        # Left alone, it (and any edit still pending) would show it going on.
+        await process.board.cancel()
+    return True
+
+
+async def schedule_timeouts(process):
+    """Start the clock on a draft's next turn, and on the draft itself if new.
+
+    How long captains get is set by the guild's "turn-timeout" and
+    "session-timeout" settings, in seconds ("off" for no limit). A turn whose
+    clock is already running (e.g. when someone asks for the status) keeps
+    its deadline."""
+    turn = await timeout_setting(process.guild_id, TURN_TIMEOUT)
+    session = await timeout_setting(process.guild_id, SESSION_TIMEOUT)
+    if not is_active(process):
+        return  # Ended while the settings were being looked up
+    key = (process, TURN_TIMEOUT)
+    if not turn:
+        scheduler.cancel(key)
+    elif process.timed_turn != process.cursor or scheduler.remaining(key) is None:
+        scheduler.schedule(key, turn, lambda: turn_timed_out(process))
+        process.timed_turn = process.cursor
+    key = (process, SESSION_TIMEOUT)
+    if session and scheduler.remaining(key) is None:
+        scheduler.schedule(key, session, lambda: session_timed_out(process))
+
+
+async def timeout_setting(guild_id, name):
+    """A timeout from the settings in seconds, or None if there is none."""
+    data = await settings_cache.get(guild_id, name)
+    if data is None:
+        return DEFAULT_TIMEOUTS[name]
+    try:
+        seconds = float(data)
+    except ValueError:
+        return None
+    return seconds if seconds > 0 else None
+
+
+class DraftContext:
+    """Stands in for a command's context when the bot acts on a draft by itself."""
+
+    def __init__(self, process):
+        self.guild = discord.Object(process.guild_id) if process.guild_id else None
+        self.channel = bot.get_channel(process.channel_id)
+        # Whoever "runs" a command on a draft has to be one of its captains.
+        self.author = discord.Object(process.captains[0])
+
+    async def send(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
+
+
+def is_active(process):
+    actives = guild_states.get(process.guild_id)["active-pickbans-by-user"]
+    return actives.get(process.captains[0]) is process
+
+
+async def turn_timed_out(process):
+    """Act for a captain who took too long: at random, or by cancelling."""
+    if not is_active(process) or process.complete:
+        return
+    ctx = DraftContext(process)
+    if ctx.channel is None:
+        # Nowhere left to carry on the draft
+        await end_draft(process, guild_state(ctx)["active-pickbans-by-user"], CANCELLED)
+        return
+    action = process.next_action
+    if action not in (PICK, BAN):
+        # Stopped short of a captain's turn (e.g. on a ~); carry on to it.
+        await check_next(ctx, process)
+        return
+    captain = process.next_captain
+    cursor = process.cursor
+    verb, done = ("pick", "picked") if action == PICK else ("ban", "banned")
+    timeout_action = await settings_cache.get(process.guild_id, "turn-timeout-action")
+    if not is_active(process) or process.cursor != cursor:
+        return  # The captain got there while the setting was being looked up
+    if timeout_action == "cancel":
+        await ctx.send("{} took too long to {}.".format(mention(captain), verb))
+        await cancel(ctx)
+        return
+    choice = process.select(captain, action, random.choice(process.pool))
+    await ctx.send(
+        "{} took too long to {}, so `{}` was {} at random.".format(
+            mention(captain), verb, choice, done
         )
-        actives.pop(captain1, None)
-        actives.pop(captain2, None)
+    )
+    await check_next(ctx, process)
+
+
+async def session_timed_out(process):
+    """Cancel a draft that has been going on for too long."""
+    if not is_active(process):
+        return
+    ctx = DraftContext(process)
+    if ctx.channel is None:
+        await end_draft(process, guild_state(ctx)["active-pickbans-by-user"], CANCELLED)
         return
+    await ctx.send("This pick/ban process has run out of time.")
+    await cancel(ctx)
+
+
+def timeouts_summary(process):
+    turn = scheduler.remaining((process, TURN_TIMEOUT))
+    session = scheduler.remaining((process, SESSION_TIMEOUT))
+    limits = []
+    if turn is not None:
+        limits.append("this turn times out in {}".format(_duration(turn)))
+    if session is not None:
+        limits.append("the process is cancelled in {}".format(_duration(session)))
+    return "{}. ({} timeouts pending, {} fired so far.)".format(
+        "; ".join(limits).capitalize() if limits else "No timeouts are set",
+        len(scheduler),
+        scheduler.fired,
+    )
 
-    # Pick
-    if next_action == "p":
-        if not process["pool"]:
-            await ctx.send("Unable to continue: ran out of maps in the pool.")
-            await cancel(ctx)
-            return
-        await ctx.send("{}, it's your turn to pick.".format(next_captain.mention))
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return "{}h {}m".format(hours, minutes)
+    if minutes:
+        return "{}m {}s".format(minutes, seconds)
+    return "{}s".format(seconds)
+
+
+@bot.command(name="tournaments")
+async def list_tournaments(ctx: commands.Context):
+    """List this server's tournaments."""
+    rows = await tournament_store.all(guild_id(ctx))
+    if not rows:
+        await ctx.send("There are no tournaments at the moment.")
         return
-    # Ban
-    if next_action == "b":
-        if not process["pool"]:
-            await ctx.send("Unable to continue: ran out of maps in the pool.")
-            await cancel(ctx)
-            return
-        await ctx.send("{}, it's your turn to ban.".format(next_captain.mention))
-        return
-    # Random
-    if next_action == "r":
-        auto_selections = []
-        while next_action == "r":
-            if not process["pool"]:
-                await ctx.send(
-                    "Failed to automatically select a map: no maps remaining in pool."
-                )
-                await cancel(ctx)
-                return
-            choice = random.choice(list(process["pool"]))
-            process["pool"].remove(choice)
-            process["picks"].append(choice)
-            auto_selections.append(choice)
-            total_actions += 1
-            next_action = process["order"][total_actions : total_actions + 1]
-        await ctx.send(
-            "Automatically selected {} from the remaining pool.".format(
-                ", ".join("`{}`".format(m) for m in auto_selections)
-            )
+    counts = await db.fetchall(
+        "SELECT tournament_id, name, value FROM counters WHERE tournament_id IN ({});".format(
+            ", ".join("?" for _ in rows)
+        ),
+        tuple(t.id for t in rows),
+    )
+    counts = {(r["tournament_id"], r["name"]): r["value"] for r in counts}
+    embed = discord.Embed()
+    for t in rows:
+        embed.add_field(
+            name="`{}`".format(t.name),
+            value="{}: {} signed up, {} checked in".format(
+                tournament_status(t).capitalize(),
+                counts.get((t.id, "signups"), 0),
+                counts.get((t.id, "checkins"), 0),
+            ),
+            inline=False,
         )
-    # Swap
-    if next_action == "~":
-        process["reversals"] += 1
+    await ctx.send("Tournaments:", embed=embed)
 
-    await check_next(ctx, process)
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def tournament(ctx: commands.Context, action, name, phase=None):
+    """Create, open, close or archive a tournament.
+
+    "open" opens signups, or checkins if 'phase' is "checkins". "close"
+    closes just signups or checkins if given a phase, and otherwise the whole
+    tournament. Only closed tournaments can be archived, which moves their
+    players out of the way of those of the tournaments still going."""
+    try:
+        if action == "create":
+            t = await tournament_store.create(guild_id(ctx), name)
+        elif action == "open":
+            t = await tournament_store.open(guild_id(ctx), name, phase or "signups")
+        elif action == "close":
+            t = await tournament_store.close(guild_id(ctx), name, phase)
+        elif action == "archive":
+            t = await tournament_store.archive(guild_id(ctx), name)
+        else:
+            await ctx.send(
+                "Usage: `tournament create|open|close|archive <name>"
+                " [signups|checkins]`."
+            )
+            return
+    except TournamentError as e:
+        await ctx.send(str(e))
+        return
+    await ctx.send("`{}` is now {}.".format(t.name, tournament_status(t)))
+
+
+def tournament_status(t):
+    opened = [phase for phase in PHASES if getattr(t, phase)]
+    if opened:
+        return "{} for {}".format(t.status, " and ".join(opened))
+    return t.status
+
+
+class TournamentName(commands.Converter):
+    """An argument naming one of the server's tournaments.
+
+    Lets commands take a tournament name ahead of other optional arguments:
+    anything else is passed over to them."""
+
+    async def convert(self, ctx, argument):
+        if await tournament_store.get(guild_id(ctx), argument) is None:
+            raise commands.BadArgument("No tournament called {}.".format(argument))
+        return argument
+
+
+async def find_tournament(ctx: commands.Context, name=None, phase=None):
+    """The tournament a command is for (see TournamentStore.find).
+
+    Returns None, having said why, if that isn't clear."""
+    try:
+        return await tournament_store.find(guild_id(ctx), name, phase)
+    except TournamentError as e:
+        await ctx.send(str(e))
+        return None
 
 
 @bot.command()
-async def signup(ctx: commands.Context):
-    """Sign up for a draft tournament."""
+async def signup(ctx: commands.Context, tournament=None):
+    """Sign up for a draft tournament.
 
-    if get_setting("signups") != "on":
-        await ctx.send("Signups are not currently enabled.")
+    'tournament' is only needed if more than one is open for signups."""
+    t = await find_tournament(ctx, tournament, "signups")
+    if t is None:
         return
 
-    c = db.cursor()
     u = ctx.author
 
-    signedup = c.execute(
-        "SELECT mention FROM signups WHERE mention = ?;", (u.mention,)
-    ).fetchone()
-    if signedup:
+    total = await db.batched(_add_signup, t.id, guild_id(ctx), u.id, u.display_name)
+    if total is None:
         await ctx.send("You're already signed up, {}.".format(u.mention))
         return
 
-    c.execute(
-        "INSERT INTO signups (mention, display_name) VALUES (?, ?);",
-        (u.mention, u.display_name),
-    )
-    db.commit()
-    signups = c.execute("SELECT COUNT(1) AS total FROM signups;").fetchone()
     await ctx.send(
-        "{} is now signed up (#{}, {}).".format(
-            u.mention, signups["total"], u.display_name
-        )
+        "{} is now signed up (#{}, {}).".format(u.mention, total, u.display_name)
+    )
+
+
+def _add_signup(c, tournament_id, guild_id, user_id, display_name):
+    c.execute(
+        "INSERT OR IGNORE INTO signups (tournament_id, user_id, guild_id, display_name)"
+        " VALUES (?, ?, ?, ?);",
+        (tournament_id, user_id, guild_id, display_name),
     )
+    if not c.rowcount:
+        return None
+    return _bump_counter(c, tournament_id, "signups", 1)
 
 
 @bot.command()
-async def withdraw(ctx: commands.Context):
+async def withdraw(ctx: commands.Context, tournament=None):
     """Withdraw from a draft tournament."""
-
-    if get_setting("signups") != "on":
-        await ctx.send("Signups are not currently enabled.")
+    t = await find_tournament(ctx, tournament, "signups")
+    if t is None:
         return
 
-    c = db.cursor()
     u = ctx.author
 
-    signedup = c.execute(
-        "SELECT mention FROM signups WHERE mention = ?;", (u.mention,)
-    ).fetchone()
-    if not signedup:
+    withdrawn = await db.batched(_remove_signup, t.id, u.id)
+    if not withdrawn:
         await ctx.send("You're not signed up, {}.".format(u.mention))
         return
 
-    c.execute("DELETE FROM signups WHERE mention = ?;", (u.mention,))
-    db.commit()
     await ctx.send("Your signup has been withdrawn, {}.".format(u.mention))
 
 
+def _remove_signup(c, tournament_id, user_id):
+    signedup = c.execute(
+        "SELECT checkin_time FROM signups WHERE tournament_id = ? AND user_id = ?;",
+        (tournament_id, user_id),
+    ).fetchone()
+    if not signedup:
+        return False
+
+    c.execute(
+        "DELETE FROM signups WHERE tournament_id = ? AND user_id = ?;",
+        (tournament_id, user_id),
+    )
+    _bump_counter(c, tournament_id, "signups", -1)
+    if signedup["checkin_time"]:
+        _bump_counter(c, tournament_id, "checkins", -1)
+    return True
+
+
 @bot.command()
-async def checkin(ctx: commands.Context):
+async def checkin(ctx: commands.Context, tournament=None):
     """Check in for a draft tournament."""
-
-    if get_setting("checkins") != "on":
-        await ctx.send("Checkins are not currently enabled.")
+    t = await find_tournament(ctx, tournament, "checkins")
+    if t is None:
         return
 
-    c = db.cursor()
     u = ctx.author
 
-    signedup = c.execute(
-        "SELECT mention, checkin_time FROM signups WHERE mention = ? OR mention = ?;",
-        (u.mention, u.mention.replace("@!", "@")),
-    ).fetchone()
-    if not signedup:
+    total = await db.batched(_add_checkin, t.id, u.id)
+    if total is None:
         await ctx.send("You're not signed up, {}.".format(u.mention))
         return
-    if signedup["checkin_time"]:
+    if total is False:
         await ctx.send("You're already checked in, {}.".format(u.mention))
         return
 
+    await ctx.send(
+        "{} has checked in (#{}, {}).".format(u.mention, total, u.display_name)
+    )
+
+
+def _add_checkin(c, tournament_id, user_id):
+    """Returns the new checkin count, None if not signed up, or False if already in."""
     c.execute(
-        "UPDATE signups SET checkin_time = CURRENT_TIMESTAMP WHERE mention = ? OR mention = ?;",
-        (u.mention, u.mention.replace("@!", "@")),
+        "UPDATE signups SET checkin_time = CURRENT_TIMESTAMP"
+        " WHERE tournament_id = ? AND user_id = ? AND checkin_time IS NULL;",
+        (tournament_id, user_id),
     )
-    db.commit()
-    checkins = c.execute(
-        "SELECT COUNT(1) AS total FROM signups WHERE checkin_time IS NOT NULL;"
+    if c.rowcount:
+        return _bump_counter(c, tournament_id, "checkins", 1)
+
+    signedup = c.execute(
+        "SELECT 1 FROM signups WHERE tournament_id = ? AND user_id = ?;",
+        (tournament_id, user_id),
     ).fetchone()
-    await ctx.send(
-        "{} has checked in (#{}, {}).".format(
-            u.mention, checkins["total"], u.display_name
-        )
+    return False if signedup else None
+
+
+def _bump_counter(c, tournament_id, name, delta):
+    """Adjust one of a tournament's maintained totals and return its new value."""
+    c.execute(
+        "INSERT INTO counters (tournament_id, name, value) VALUES (?, ?, ?)"
+        " ON CONFLICT (tournament_id, name)"
+        " DO UPDATE SET value = value + excluded.value;",
+        (tournament_id, name, delta),
     )
+    total = c.execute(
+        "SELECT value FROM counters WHERE tournament_id = ? AND name = ?;",
+        (tournament_id, name),
+    ).fetchone()
+    return total["value"]
 
 
 @bot.command()
-async def signups(ctx: commands.Context):
+async def signups(
+    ctx: commands.Context,
+    tournament: typing.Optional[TournamentName] = None,
+    page: int = 1,
+):
     """List the currently signed up players for a draft tournament."""
-    c = db.cursor()
-
-    signedup = c.execute(
-        "SELECT display_name FROM signups ORDER BY signup_time ASC;"
-    ).fetchall()
-    if not signedup:
-        await ctx.send("No players signed up.")
+    t = await find_tournament(ctx, tournament)
+    if t is None:
         return
-
-    embed = player_list_embed(signedup)
-    await ctx.send("{} players signed up.".format(len(signedup)), embed=embed)
+    players = PlayerList(db, t, "signups")
+    await show_player_list(
+        ctx, players, page, "{} players signed up.", "No players signed up."
+    )
 
 
 @bot.command()
-async def checkins(ctx: commands.Context):
+async def checkins(
+    ctx: commands.Context,
+    tournament: typing.Optional[TournamentName] = None,
+    page: int = 1,
+):
     """List the currently checked in players for a draft tournament."""
-    c = db.cursor()
+    t = await find_tournament(ctx, tournament)
+    if t is None:
+        return
+    players = PlayerList(db, t, "checkins")
+    await show_player_list(
+        ctx, players, page, "{} players checked in.", "No players checked in."
+    )
+
+
+@bot.command(name="export", hidden=True)
+@commands.is_owner()
+async def export_players(
+    ctx: commands.Context, name="signups", format="csv", tournament=None
+):
+    """Send the full list of signed up (or checked in) players as a file.
 
-    checkedin = c.execute(
-        "SELECT display_name FROM signups WHERE checkin_time IS NOT NULL ORDER BY checkin_time ASC;"
-    ).fetchall()
-    if not checkedin:
-        await ctx.send("No players checked in.")
+    'name' is "signups" or "checkins", and 'format' is "csv" or "jsonl".
+    Archived tournaments can be exported by name."""
+    if name not in LISTS or format not in FORMATS:
+        await ctx.send("Usage: `export [signups|checkins] [csv|jsonl] [tournament]`.")
+        return
+    t = await find_tournament(ctx, tournament)
+    if t is None:
         return
+    out, count = await PlayerList(db, t, name).export(format)
+    with out:
+        size = out.seek(0, os.SEEK_END)
+        out.seek(0)
+        limit = ctx.guild.filesize_limit if ctx.guild else 8 * 1024 * 1024
+        if size > limit:
+            await ctx.send(
+                "The export is {:.1f} MB, too big to upload here.".format(size / 1e6)
+            )
+            return
+        await ctx.send(
+            "{} players, {:.1f} kB.".format(count, size / 1e3),
+            file=discord.File(out, filename="{}.{}".format(name, format)),
+        )
+
 
-    embed = player_list_embed(checkedin)
-    await ctx.send("{} players checked in.".format(len(checkedin)), embed=embed)
+@bot.command(hidden=True)
+@commands.is_owner()
+async def remind(ctx: commands.Context, mode="channel", tournament=None):
+    """Remind the signed up players who haven't checked in yet.
 
+    'mode' is "channel" to mention them all here (in as few messages as
+    possible), "dm" to message each of them directly, or "both"."""
+    if mode not in ("channel", "dm", "both"):
+        await ctx.send("The mode must be `channel`, `dm` or `both`.")
+        return
+    t = await find_tournament(ctx, tournament, "checkins")
+    if t is None:
+        return
+    rows = await db.fetchall(
+        "SELECT user_id FROM signups"
+        " WHERE tournament_id = ? AND checkin_time IS NULL ORDER BY user_id;",
+        (t.id,),
+    )
+    if not rows:
+        await ctx.send("Everyone who signed up has checked in.")
+        return
 
-def player_list_embed(player_list, group_size=20):
-    """Generates a discord embed that lists a set of players, grouped into fields."""
+    calls = 0
+    messages = 0
+    if mode != "dm":
+        for content in pack(
+            "Check-in is open, and you haven't checked in yet; use `$checkin`:",
+            [mention(r["user_id"]) for r in rows],
+        ):
+            await outbox.send(ctx.channel, content)
+            messages += 1
+        calls += messages
+
+    sent = unreachable = 0
+    if mode != "channel":
+        text = "Reminder: you haven't checked in yet. Use `$checkin` in {}.".format(
+            ctx.channel.mention
+        )
+        users = []
+        for r in rows:
+            user = (ctx.guild and ctx.guild.get_member(r["user_id"])) or bot.get_user(
+                r["user_id"]
+            )
+            if user is None:
+                # Looking them up would take a request each.
+                unreachable += 1
+            else:
+                users.append(user)
+        # Opening a DM channel is a request of its own.
+        calls += sum(2 if u.dm_channel is None else 1 for u in users)
+        results = await asyncio.gather(
+            *(outbox.send(u, text) for u in users), return_exceptions=True
+        )
+        sent = sum(not isinstance(r, Exception) for r in results)
+        unreachable += len(results) - sent
+
+    report = "Reminded {} players".format(len(rows))
+    if mode != "dm":
+        report += ", in {} messages here".format(messages)
+    if mode != "channel":
+        report += ", with {} DMs sent ({} couldn't be sent)".format(sent, unreachable)
+    await ctx.send("{}. {} API requests made.".format(report, calls))
+
+
+PREVIOUS_PAGE = "\u25c0\ufe0f"
+NEXT_PAGE = "\u25b6\ufe0f"
+PAGE_STEPS = {PREVIOUS_PAGE: -1, NEXT_PAGE: 1}
+PAGE_TIMEOUT = 120
+# The messages whose pages can currently be turned, as the tasks doing it
+page_turners = set()
+
+
+async def show_player_list(ctx: commands.Context, players, page, header, empty):
+    """Send a page of a list of players, which can then be turned with reactions."""
+    total = await players.count()
+    if not total:
+        await ctx.send(empty)
+        return
+
+    pages = (total - 1) // players.page_size + 1
+    page = min(max(page, 1), pages)
+    start = (page - 1) * players.page_size
+    after = await players.key_at(start - 1) if start else None
+    rows = await players.page(after=after)
+    message = await ctx.send(
+        header.format(total), embed=page_embed(players, rows, start, total)
+    )
+    if pages == 1:
+        return
+
+    async def turn(step):
+        nonlocal rows, start
+        if not rows:
+            return None
+        if step > 0:
+            new_rows = await players.page(after=players.key(rows[-1]))
+            new_start = start + len(rows)
+        else:
+            new_rows = await players.page(before=players.key(rows[0]))
+            new_start = max(start - len(new_rows), 0)
+        if not new_rows:
+            return None  # Already at the end of the list
+        rows, start = new_rows, new_start
+        total = await players.count()
+        return header.format(total), page_embed(players, rows, start, total)
+
+    start_turning_pages(message, turn)
+
+
+def start_turning_pages(message, turn):
+    """Run turn_pages() on its own: waiting for reactions isn't part of the
+    command (or its latency)."""
+    task = asyncio.ensure_future(turn_pages(message, turn))
+    page_turners.add(task)
+    task.add_done_callback(_stopped_turning_pages)
+    return task
+
+
+def _stopped_turning_pages(task):
+    page_turners.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Turning pages failed", exc_info=task.exception())
+
+
+async def turn_pages(message, turn):
+    """Let people turn the pages of a message with reactions, for a while.
+
+    turn(step) is called with -1 (previous) or 1 (next), and returns the
+    content and embed of that page, or None if there is no page that way."""
+    for emoji in PAGE_STEPS:
+        await message.add_reaction(emoji)
+
+    def check(reaction, user):
+        return (
+            reaction.message.id == message.id
+            and user != bot.user
+            and str(reaction.emoji) in PAGE_STEPS
+        )
+
+    while True:
+        try:
+            reaction, user = await bot.wait_for(
+                "reaction_add", check=check, timeout=PAGE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            break
+        try:
+            await message.remove_reaction(reaction.emoji, user)
+        except discord.HTTPException:
+            pass  # Missing the permission to manage messages
+
+        page = await turn(PAGE_STEPS[str(reaction.emoji)])
+        if page is not None:
+            content, embed = page
+            await message.edit(content=content, embed=embed)
+
+    try:
+        await message.clear_reactions()
+    except discord.HTTPException:
+        pass
+
+
+def page_embed(players, rows, start, total):
+    pages = (total - 1) // players.page_size + 1
+    footer = None
+    if pages > 1:
+        footer = "Page {} of {}".format(
+            min(start // players.page_size + 1, pages), pages
+        )
+    return player_list_embed(rows, start=start, footer=footer)
+
+
+def player_list_embed(player_list, group_size=20, start=0, footer=None):
+    """Generates a discord embed that lists a set of players, grouped into fields.
+
+    start is the position in the full list of the first player given."""
     embed = discord.Embed()
     group_count = (len(player_list) - 1) // group_size
     for g in range(group_count + 1):
-        start = g * group_size
-        end = (g + 1) * group_size
-        players = player_list[start:end]
-        range_label = "{}-{}:".format(start + 1, start + len(players))
+        first = g * group_size
+        players = player_list[first : first + group_size]
+        range_label = "{}-{}:".format(start + first + 1, start + first + len(players))
         player_text = "\n".join(p["display_name"] for p in players)
         embed.add_field(name=range_label, value=player_text)
+    if footer:
+        embed.set_footer(text=footer)
     return embed
 
 
+@bot.command(hidden=True)
+@commands.is_owner()
+async def rating(
+    ctx: commands.Context,
+    u: discord.Member,
+    value: typing.Optional[float] = None,
+    tournament=None,
+):
+    """Set (or with no value, clear) the rating of a signed up player.
+
+    The ratings of an archived tournament's players can be corrected by
+    naming it."""
+    t = await find_tournament(ctx, tournament)
+    if t is None:
+        return
+    updated = await db.execute(
+        "UPDATE {} SET rating = ? WHERE tournament_id = ? AND user_id = ?;".format(
+            player_table(t)
+        ),
+        (value, t.id, u.id),
+    )
+    if not updated:
+        await ctx.send("{} isn't signed up.".format(u.mention))
+    elif value is None:
+        await ctx.send("Cleared the rating of {}.".format(u.mention))
+    else:
+        await ctx.send("Set the rating of {} to {:g}.".format(u.mention, value))
+
+
+@bot.command(name="teams", hidden=True)
+@commands.is_owner()
+async def balance_teams(
+    ctx: commands.Context,
+    count: int,
+    tournament: typing.Optional[TournamentName] = None,
+    *captains: discord.Member
+):
+    """Split the checked in players into balanced teams.
+
+    Teams are balanced by the players' ratings, with unrated players counting
+    as average. Captains, if given, lead teams 1, 2, ... in that order."""
+    t = await find_tournament(ctx, tournament)
+    if t is None:
+        return
+    rows = await db.fetchall(
+        "SELECT user_id, display_name, rating FROM {}"
+        " WHERE tournament_id = ? AND checkin_time IS NOT NULL;".format(
+            player_table(t)
+        ),
+        (t.id,),
+    )
+    names = {r["user_id"]: r["display_name"] for r in rows}
+    given = {r["user_id"]: r["rating"] for r in rows}
+    if len(captains) > count:
+        await ctx.send("There are more captains than teams.")
+        return
+    if len({c.id for c in captains}) < len(captains):
+        await ctx.send("A captain can only lead one team.")
+        return
+    for c in captains:
+        names.setdefault(c.id, c.display_name)
+        given.setdefault(c.id, None)
+
+    rated = [r for r in given.values() if r is not None]
+    average = sum(rated) / len(rated) if rated else 0
+    ratings = {p: average if r is None else r for p, r in given.items()}
+    pinned = {c.id: i for i, c in enumerate(captains)}
+    try:
+        # Large splits take a noticeable fraction of a second.
+        split = await asyncio.get_running_loop().run_in_executor(
+            None, balance, ratings, count, pinned
+        )
+    except TeamError as e:
+        await ctx.send(str(e))
+        return
+
+    embeds = team_embeds(split, names, given, ratings, pinned)
+    content = "{} players split into {} teams.".format(len(ratings), count)
+    message = await ctx.send(content, embed=embeds[0])
+    if len(embeds) == 1:
+        return
+
+    page = 0
+
+    async def turn(step):
+        nonlocal page
+        if not 0 <= page + step < len(embeds):
+            return None
+        page += step
+        return content, embeds[page]
+
+    start_turning_pages(message, turn)
+
+
+def team_embeds(split, names, given, ratings, pinned, group_size=20):
+    """Embeds listing teams, as many to a page as fit (captains in bold)."""
+    fields = []
+    for t, team in enumerate(split):
+        lines = []
+        for p in team:
+            name = "**{}**".format(names[p]) if p in pinned else names[p]
+            if given[p] is not None:
+                name += " ({:g})".format(given[p])
+            lines.append(name)
+        label = "Team {} ({:g} total):".format(
+            t + 1, round(sum(ratings[p] for p in team))
+        )
+        for g in range(0, len(lines), group_size):
+            fields.append(
+                (
+                    label if g == 0 else "Team {} (cont.):".format(t + 1),
+                    lines[g : g + group_size],
+                )
+            )
+
+    # Discord allows at most 25 fields and 6000 characters per embed.
+    embeds = [discord.Embed()]
+    size = 0
+    for label, lines in fields:
+        value = "\n".join(lines)
+        if len(embeds[-1].fields) == 24 or size + len(label) + len(value) > 5000:
+            embeds.append(discord.Embed())
+            size = 0
+        embeds[-1].add_field(name=label, value=value)
+        size += len(label) + len(value)
+    if len(embeds) > 1:
+        for i, embed in enumerate(embeds):
+            embed.set_footer(text="Page {} of {}".format(i + 1, len(embeds)))
+    return embeds
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def simulate(ctx: commands.Context, choice, trials: int = 1000000, *preferences):
+    """Estimate how often each map gets played under a ruleset.
+
+    Captains are simulated choosing at random. Preferences such as Coral=3
+    make them pick a map three times as often as usual, and ban it a third
+    as often."""
+    catalog = await guild_catalog(ctx)
+    config = catalog.rulesets.get(choice)
+    if not config:
+        await ctx.send(
+            "The specified ruleset was not found. (Valid rulesets: {})".format(
+                valid_rulesets(catalog)
+            )
+        )
+        return
+    pool_name, pool_size = parse_pool_spec(config.pool)
+    maps = catalog.pools.get(pool_name)
+    if not maps:
+        await ctx.send("The ruleset's pool `{}` doesn't exist.".format(pool_name))
+        return
+    if not 0 < trials <= simulation.MAX_TRIALS:
+        await ctx.send("Trials must be between 1 and {}.".format(simulation.MAX_TRIALS))
+        return
+
+    weights = {}
+    for preference in preferences:
+        name, _, weight = preference.partition("=")
+        map_id = maps.matcher.match_index(name)
+        if map_id is None:
+            await ctx.send("`{}` isn't in the pool.".format(name))
+            return
+        try:
+            weights[maps.names[map_id]] = float(weight)
+        except ValueError:
+            await ctx.send("Preferences are given as `Map=weight`.")
+            return
+
+    started = time.perf_counter()
+    try:
+        outcome = await asyncio.get_running_loop().run_in_executor(
+            None,
+            simulation.simulate,
+            maps,
+            compile_order(config.order),
+            trials,
+            weights,
+            pool_size,
+        )
+    except SimulationError as e:
+        await ctx.send(str(e))
+        return
+    elapsed = time.perf_counter() - started
+
+    width = max(len(name) for name in maps)
+    lines = ["{:<{}}  Played  Picked  Banned".format("Map", width)]
+    for name in sorted(maps, key=lambda m: -outcome.played[m]):
+        lines.append(
+            "{:<{}}  {:>6.1%}  {:>6.1%}  {:>6.1%}".format(
+                name,
+                width,
+                outcome.played[name],
+                outcome.picked[name],
+                outcome.banned[name],
+            )
+        )
+    embed = discord.Embed(description="```\n{}\n```".format("\n".join(lines)))
+    await ctx.send(
+        "Simulated {:,} drafts of `{}` (pool `{}`, order `{}`) in {:.1f}s.".format(
+            trials, choice, config.pool, config.order, elapsed
+        ),
+        embed=embed,
+    )
+
+
+@bot.command()
+async def mapstats(ctx: commands.Context, name=None, kind=None):
+    """Show how often each map has been picked, banned and played.
+
+    'name' is a ruleset or a pool; where both have the name, the ruleset is
+    shown unless 'kind' is "pool". Without a name, lists how many pick/ban
+    processes of each have finished."""
+    if kind not in (None, history.POOL, history.RULESET):
+        await ctx.send("Usage: `mapstats [name] [pool|ruleset]`.")
+        return
+    if name is None:
+        totals = await db.read(history.read_totals, guild_id(ctx))
+        if not totals:
+            await ctx.send("No pick/ban processes have finished yet.")
+            return
+        embed = discord.Embed()
+        for kind in (history.RULESET, history.POOL):
+            lines = [
+                "`{}`: {} completed, {} cancelled".format(
+                    r["name"], r["completed"], r["cancelled"]
+                )
+                for r in totals
+                if r["kind"] == kind
+            ]
+            if lines:
+                embed.add_field(
+                    name="{}s".format(kind.capitalize()),
+                    value="\n".join(lines),
+                    inline=False,
+                )
+        await ctx.send("Finished pick/ban processes:", embed=embed)
+        return
+
+    stats = await db.read(history.read_stats, guild_id(ctx), name, kind)
+    if stats is None:
+        await ctx.send("No pick/ban processes using `{}` have finished.".format(name))
+        return
+    kind, totals, rows = stats
+    completed = totals["completed"]
+    summary = "{} completed and {} cancelled pick/ban processes using {} `{}`".format(
+        completed, totals["cancelled"], kind, name
+    )
+    if not rows:
+        await ctx.send(summary + ".")
+        return
+    # As a share of completed drafts, to compare with simulate
+    width = max(len(r["map"]) for r in rows)
+    lines = ["{:<{}}  Played  Picked  Banned".format("Map", width)]
+    for r in rows:
+        lines.append(
+            "{:<{}}  {:>6.1%}  {:>6.1%}  {:>6.1%}".format(
+                r["map"],
+                width,
+                r["plays"] / completed,
+                r["picks"] / completed,
+                r["bans"] / completed,
+            )
+        )
+    embed = discord.Embed(description="```\n{}\n```".format("\n".join(lines)))
+    await ctx.send(summary + ":", embed=embed)
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def addmaps(ctx: commands.Context, pool, *names):
+    """Add maps to a pool, creating the pool if it doesn't exist yet."""
+    await change_catalog(ctx, "pools", add_maps, pool, names)
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def removemaps(ctx: commands.Context, pool, *names):
+    """Remove maps from a pool (removing the pool along with its last map)."""
+    await change_catalog(ctx, "pools", remove_maps, pool, names)
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def removepool(ctx: commands.Context, pool):
+    await change_catalog(ctx, "pools", remove_pool, pool)
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def addruleset(ctx: commands.Context, name, pool, order):
+    """Add a ruleset, or change the one with the same name."""
+    try:
+        compile_order(order)
+    except OrderError as e:
+        await ctx.send(str(e))
+        return
+    await change_catalog(ctx, "rulesets", set_ruleset, name, pool, order)
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def removeruleset(ctx: commands.Context, name):
+    await change_catalog(ctx, "rulesets", remove_ruleset, name)
+
+
+async def change_catalog(ctx: commands.Context, listing, edit, *args):
+    """Make a change to the guild's catalog and show the result.
+
+    Drafts already in progress carry on with the pools they started with."""
+    try:
+        catalog = await catalogs.change(guild_id(ctx), edit, *args)
+    except CatalogError as e:
+        await ctx.send(str(e))
+        return
+    if listing == "pools":
+        embed = rendered(catalog, "maps", lambda: maps_embed(catalog))
+    else:
+        embed = rendered(catalog, "rulesets", lambda: rulesets_embed(catalog))
+    await ctx.send("Updated. Available {}:".format(listing), embed=embed)
+
+
 @bot.command(hidden=True)
 @commands.is_owner()
 async def setting(ctx: commands.Context, name: str, data: str):
-    set_setting(name, data)
+    if name in PHASES:
+        # No longer settings: each tournament opens and closes its own.
+        await ctx.send(
+            "{} are opened and closed for each tournament, with"
+            " `tournament open|close <name> {}`.".format(name.capitalize(), name)
+        )
+        return
+    await set_setting(ctx, name, data)
     await ctx.send("Set `{}` to `{}`.".format(name, data))
 
 
@@ -699,20 +1692,62 @@ async def disable(ctx: commands.Context, name: str):
     await setting(ctx, name, "off")
 
 
-def get_setting(name):
-    c = db.cursor()
-    result = c.execute("SELECT data FROM settings WHERE name = ?;", (name,)).fetchone()
-    if not result:
-        return None
-    return result["data"]
+@bot.command(name="settings", hidden=True)
+@commands.is_owner()
+async def list_settings(ctx: commands.Context):
+    """Show the cached settings and how well the cache is doing."""
+    embed = discord.Embed()
+    for name, data in settings_cache.items(guild_id(ctx)):
+        embed.add_field(name="`{}`".format(name), value="`{}`".format(data))
+    await ctx.send(
+        "Settings cache: {} hits, {} misses.".format(
+            settings_cache.hits, settings_cache.misses
+        ),
+        embed=embed,
+    )
 
 
-def set_setting(name, data):
-    c = db.cursor()
-    c.execute(
-        "INSERT OR REPLACE INTO settings (name, data) VALUES (?, ?);", (name, data)
+async def get_setting(ctx: commands.Context, name):
+    return await settings_cache.get(guild_id(ctx), name)
+
+
+async def set_setting(ctx: commands.Context, name, data):
+    await settings_cache.set(guild_id(ctx), name, data)
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def stats(ctx: commands.Context):
+    """Show how long commands take and where the time goes."""
+    embed = discord.Embed()
+    busiest = sorted(command_metrics.latency.items(), key=lambda i: -i[1].count)
+    for name, latency in busiest[:20]:
+        queries = command_metrics.query_counts[name]
+        embed.add_field(
+            name="`{}` ({} runs)".format(name, latency.count),
+            value="p50 {} / p99 {} ms\n{:.1f} queries, {:.0f} ms DB, {:.0f} ms send".format(
+                _milliseconds(latency.quantile(0.5)),
+                _milliseconds(latency.quantile(0.99)),
+                queries.sum / queries.count,
+                command_metrics.query_time[name].sum / latency.count * 1000,
+                command_metrics.send_time[name].sum / latency.count * 1000,
+            ),
+        )
+    errors = ", ".join(
+        "`{}` {}: {}".format(command, error, count)
+        for (command, error), count in sorted(command_metrics.errors.items())
     )
-    db.commit()
+    await ctx.send(
+        "Command latency (bucket upper bounds), averages per run. Errors: {}."
+        " Paced messages: {} sent, {:.1f}s spent waiting on rate limits.".format(
+            errors or "none", outbox.sent, outbox.waited
+        ),
+        embed=embed,
+    )
+
+
+def _milliseconds(seconds):
+    return "{:g}".format(seconds * 1000) if seconds != float("inf") else ">10000"
 
 
 @bot.command(hidden=True)
@@ -726,25 +1761,25 @@ async def whoami(ctx: commands.Context):
 @commands.is_owner()
 async def dbwipe(ctx: commands.Context):
     """Reset the database of persistent state."""
-    c = db.cursor()
-    c.executescript(
-        """
-        DROP TABLE IF EXISTS settings;
-        CREATE TABLE settings (
-            name TEXT PRIMARY KEY,
-            data TEXT NOT NULL
-        );
-        
-        DROP TABLE IF EXISTS signups;
-        CREATE TABLE signups (
-            mention TEXT PRIMARY KEY,
-            display_name TEXT,
-            signup_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            checkin_time TIMESTAMP DEFAULT NULL
-        );
-    """
-    )
-    db.commit()
+    await db.executescript(schema.create_script())
+    await forget_database()
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def dbupgrade(ctx: commands.Context):
+    """Bring a database from an older version of the bot up to date.
+
+    Rows from before the database was split up by server are given to the
+    server this is run in."""
+    upgraded = await db.transaction(upgrade_tables, guild_id(ctx))
+    settings_cache.invalidate()
+    catalogs.invalidate()
+    tournament_store.invalidate()
+    if not upgraded:
+        await ctx.send("The database is already up to date.")
+        return
+    await ctx.send("Upgraded {}.".format(", ".join("`{}`".format(t) for t in upgraded)))
 
 
 @bot.command(hidden=True)
@@ -757,10 +1792,15 @@ async def user(ctx: commands.Context, u: discord.Member = None):
 @bot.command(hidden=True)
 @commands.is_owner()
 async def wipe(ctx: commands.Context):
-    """Clear all non-default state for the bot."""
-    global state
-    state = deepcopy(_default_state)
-    await ctx.send("Global state wiped.")
+    """Clear all non-default state for the bot in this server."""
+    actives = guild_state(ctx)["active-pickbans-by-user"]
+    # Archived (history survives a wipe) and shown as cancelled on their boards
+    for process in list(actives.values()):
+        await end_draft(process, actives, CANCELLED)
+    guild_states.reset(guild_id(ctx))
+    await catalogs.reset(guild_id(ctx))
+    await session_store.clear(guild_id(ctx))
+    await ctx.send("State wiped.")
 
 
 @bot.command(hidden=True)
@@ -768,4 +1808,8 @@ async def wipe(ctx: commands.Context):
 async def shutdown(ctx: commands.Context):
     """Shut down the bot process."""
     await ctx.send("Shutting down.")
-    await bot.logout()
\ No newline at end of file
+    # No timeouts should go off on drafts that will be restored next time.
+    scheduler.stop()
+    if shard_leases:
+        await shard_leases.release()
+    await bot.logout()
@@ -0,0 +1,125 @@
+"""A single message showing a pick/ban process, edited in place as it goes."""
+import asyncio
+
+import discord
+
+from .draft import PICK
+
+# How long to wait after a change before editing the board, so that changes
+# arriving close together (e.g. a pick followed by automatic selections) are
+# shown with a single edit.
+EDIT_DELAY = 1.0
+
+
+def mention(user_id):
+    """Mention a user by ID."""
+    return "<@{}>".format(user_id)
+
+
+class Board:
+    """The board message of a draft.
+
+    update() only marks the board as out of date; the message is edited once
+    EDIT_DELAY has passed, showing whatever the draft looks like by then."""
+
+    def __init__(self, draft, pool_label, delay=EDIT_DELAY):
+        self.draft = draft
+        self.pool_label = pool_label
+        self.delay = delay
+        self.message = None
+        self.note = None
+        self.cancelled = False
+        self._pending = None
+
+    def render(self):
+        """The content and embed of the board message."""
+        draft = self.draft
+        captain1, captain2 = draft.captains
+        if self.cancelled:
+            turn = "Cancelled."
+        elif draft.complete:
+            turn = "Complete."
+        else:
+            turn = "{}, it's your turn to {}.".format(
+                mention(draft.next_captain),
+                "pick" if draft.next_action == PICK else "ban",
+            )
+        content = "Pick/ban between {} and {}. {}".format(
+            mention(captain1), mention(captain2), turn
+        )
+
+        embed = discord.Embed()
+        embed.add_field(name="Pool", value=self.pool_label)
+        embed.add_field(
+            name="Order",
+            value="`{}` (step {} of {})".format(
+                draft.order,
+                min(draft.cursor + 1, len(draft.program.steps)),
+                len(draft.program.steps),
+            ),
+        )
+        embed.add_field(
+            name="Picks",
+            value=", ".join("`{}`".format(m) for m in draft.picks) or "-",
+            inline=False,
+        )
+        embed.add_field(name="Bans", value=", ".join(draft.bans) or "-", inline=False)
+        embed.add_field(
+            name="Available Maps",
+            value=", ".join("`{}`".format(m) for m in draft.pool) or "-",
+            inline=False,
+        )
+        if self.note:
+            embed.set_footer(text=self.note)
+        return content, embed
+
+    async def post(self, channel):
+        """Send a new board message, which replaces any previous one."""
+        self._cancel()
+        content, embed = self.render()
+        previous, self.message = self.message, await channel.send(content, embed=embed)
+        if previous is not None:
+            # Otherwise it would go on showing the turn it was last edited at.
+            try:
+                await previous.delete()
+            except discord.HTTPException:
+                pass
+
+    def update(self, note=None):
+        """Mark the board as changed, optionally replacing its footer note."""
+        if note is not None:
+            self.note = note
+        if self._pending is None and self.message is not None:
+            self._pending = asyncio.ensure_future(self._edit_later())
+
+    async def flush(self):
+        """Edit the board right away with any pending changes."""
+        if self._pending is not None:
+            self._cancel()
+            await self._edit()
+
+    async def cancel(self):
+        """Show the draft as cancelled, in place of any pending edit."""
+        self._cancel()
+        self.cancelled = True
+        await self._edit()
+
+    def _cancel(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+    async def _edit_later(self):
+        await asyncio.sleep(self.delay)
+        self._pending = None
+        await self._edit()
+
+    async def _edit(self):
+        if self.message is None:
+            return
+        content, embed = self.render()
+        try:
+            await self.message.edit(content=content, embed=embed)
+        except discord.NotFound:
+            # Deleted from under us; the next change posts a new one.
+            self.message = None
@@ -0,0 +1,46 @@
+"""What the in-memory caches of database tables have in common."""
+
+
+class WriteThroughCache:
+    """Rows from the database kept in memory, and kept up to date by making
+    every change through the cache.
+
+    Every change (and every invalidation) bumps the cache's version. A load
+    notes the version before it reads, and only keeps what it read if the
+    version is the same once it's done: otherwise the rows may be from before
+    the change, and would clobber it."""
+
+    def __init__(self, db):
+        self.db = db
+        self._version = 0
+        self._loaded = False
+
+    async def _load(self, read, keep):
+        """Call keep() with what read() reads, unless the cache changes first.
+
+        Returns whether it was kept."""
+        version = self._version
+        data = await read()
+        if version != self._version:
+            return False
+        keep(data)
+        return True
+
+    async def _load_everything(self, read, keep):
+        """Load the whole cache from scratch, as _load() does."""
+        if await self._load(read, keep):
+            self._loaded = True
+
+    async def _ensure_loaded(self):
+        # Trying again if a change got in the way
+        while not self._loaded:
+            await self.load()
+
+    def _changed(self):
+        """Note a change made through the cache."""
+        self._version += 1
+
+    def _forget(self):
+        """Note that the cache has been emptied, to be loaded again."""
+        self._version += 1
+        self._loaded = False
@@ -0,0 +1,295 @@
+"""The map pools and rulesets available to each guild."""
+from collections import namedtuple
+import json
+from types import MappingProxyType
+
+from .cache import WriteThroughCache
+from .pools import intern_pool, parse_pool_spec
+from .render import DEFAULT_VERSION, new_version
+
+Ruleset = namedtuple("Ruleset", ("pool", "order"))
+
+DEFAULT_POOLS = {
+    "arena": {
+        "Aquarena",
+        "Authority",
+        "Calico",
+        "Cerberus",
+        "Chasm",
+        "Skyway",
+        "Vertex",
+    },
+    "byo5": {
+        "Brynhildr",
+        "Coral",
+        "Elite",
+        "Exhumed",
+        "Ingonyama",
+        "Kryosis",
+        "Minora",
+        "NightFlare",
+        "Raptor",
+        "TwilightGrove",
+    },
+    "ctf": {
+        "Authority",
+        "BeachBlitz",
+        "Brynhildr",
+        "Cerberus",
+        "Coral",
+        "CrushDepth",
+        "Drought",
+        "Elite",
+        "Exhumed",
+        "FatalFortress",
+        "Gloomlands",
+        "Icedance",
+        "Ingonyama",
+        "Kryosis",
+        "Minora",
+        "NightFlare",
+        "Outpost",
+        "Raptor",
+        "RiftValley",
+        "Tolar",
+        "Trailblazer",
+        "TwilightGrove",
+        "Zephyr",
+    },
+    "ctf-ladder": {
+        "Brynhildr",
+        "Coral",
+        "Elite",
+        "Exhumed",
+        "Ingonyama",
+        "Kryosis",
+        "Minora",
+        "NightFlare",
+        "Outpost",
+        "Raptor",
+        "RiftValley",
+        "Trailblazer",
+        "TwilightGrove",
+    },
+    "tdm": {
+        "Authority",
+        "Blitz",
+        "Calypso",
+        "Cerberus",
+        "Crystalline",
+        "Skyway",
+        "Speedway",
+        "Tribulus",
+        "Zephyr",
+    },
+}
+
+DEFAULT_RULESETS = {
+    "ctf-byo5": Ruleset("byo5", "~pp~bbbbbbbr"),
+    "ctf-ladder": Ruleset("ctf-ladder", "pppppppp6?"),
+    "ctf-ladder-bans": Ruleset("ctf-ladder", "bbbbpppppppp6?"),
+}
+
+
+class CatalogError(ValueError):
+    """A change to a catalog which doesn't make sense."""
+
+
+class Catalog:
+    """A frozen set of map pools and rulesets.
+
+    A catalog is never changed once made. Changes make a new catalog with a
+    new version, which replaces the old one for anything looked up from then
+    on, while whatever already holds the old one (e.g. a draft started from
+    one of its pools) carries on with it undisturbed. So catalogs can be
+    shared by every reader without copying."""
+
+    __slots__ = ("pools", "rulesets", "version")
+
+    def __init__(self, pools, rulesets, version=None):
+        self.pools = MappingProxyType(
+            {name: intern_pool(maps) for name, maps in sorted(pools.items())}
+        )
+        self.rulesets = MappingProxyType(
+            {name: Ruleset(*ruleset) for name, ruleset in sorted(rulesets.items())}
+        )
+        self.version = new_version() if version is None else version
+
+    def editable(self):
+        """Copies of the pools (as sets of map names) and rulesets to make changes to."""
+        return (
+            {name: set(pool) for name, pool in self.pools.items()},
+            dict(self.rulesets),
+        )
+
+
+DEFAULT_CATALOG = Catalog(DEFAULT_POOLS, DEFAULT_RULESETS, DEFAULT_VERSION)
+
+
+class CatalogStore(WriteThroughCache):
+    """The catalog of every guild, loaded once and then replaced as it changes.
+
+    Guilds share the default catalog until they change something, at which
+    point the whole of it is copied into the database as theirs to edit.
+    Every change is written to the database first and then published by
+    swapping the guild's new catalog in, so a lookup sees either all of a
+    change or none of it."""
+
+    def __init__(self, db, default=DEFAULT_CATALOG):
+        super().__init__(db)
+        self.default = default
+        self._catalogs = {}
+
+    async def load(self):
+        """(Re)load the catalogs of every guild with one of their own."""
+        await self._load_everything(lambda: self.db.read(_read_catalogs), self._keep)
+
+    def _keep(self, catalogs):
+        self._catalogs = {
+            guild_id: Catalog(pools, rulesets)
+            for guild_id, (pools, rulesets) in catalogs.items()
+        }
+
+    async def get(self, guild_id):
+        """The current catalog of a guild."""
+        await self._ensure_loaded()
+        return self._catalogs.get(guild_id, self.default)
+
+    async def change(self, guild_id, edit, *args):
+        """Apply an edit to a guild's catalog, returning the new catalog.
+
+        edit(pools, rulesets, *args) changes the editable() copies in place,
+        raising CatalogError (and so changing nothing) if it can't be made."""
+        catalog = await self.db.transaction(self._change, guild_id, edit, args)
+        self._changed()
+        self._catalogs[guild_id] = catalog
+        return catalog
+
+    def _change(self, c, guild_id, edit, args):
+        # Read back in the transaction, so that edits never overwrite each other
+        catalogs = _read_catalogs(c, guild_id)
+        if guild_id in catalogs:
+            pools, rulesets = catalogs[guild_id]
+        else:
+            pools, rulesets = self.default.editable()
+        edit(pools, rulesets, *args)
+        _delete_catalog(c, guild_id)
+        c.execute("INSERT INTO catalogs (guild_id) VALUES (?);", (guild_id,))
+        c.executemany(
+            "INSERT INTO map_pools (guild_id, name, maps) VALUES (?, ?, ?);",
+            [
+                (guild_id, name, json.dumps(sorted(maps)))
+                for name, maps in pools.items()
+                if maps
+            ],
+        )
+        c.executemany(
+            "INSERT INTO rulesets (guild_id, name, pool_name, pickban_order)"
+            " VALUES (?, ?, ?, ?);",
+            [(guild_id, name, r.pool, r.order) for name, r in rulesets.items()],
+        )
+        return Catalog({name: maps for name, maps in pools.items() if maps}, rulesets)
+
+    async def reset(self, guild_id):
+        """Put a guild back on the default catalog."""
+        await self.db.transaction(_delete_catalog, guild_id)
+        self._changed()
+        self._catalogs.pop(guild_id, None)
+
+    def invalidate(self):
+        """Forget every loaded catalog, e.g. after the database was wiped."""
+        self._forget()
+        self._catalogs = {}
+
+
+def _read_catalogs(c, guild_id=None):
+    """{guild ID: (pools, rulesets)} for guilds with their own catalog."""
+    where, params = (
+        ("WHERE guild_id = ?", (guild_id,)) if guild_id is not None else ("", ())
+    )
+    catalogs = {
+        r["guild_id"]: ({}, {})
+        for r in c.execute("SELECT guild_id FROM catalogs {};".format(where), params)
+    }
+    for r in c.execute(
+        "SELECT guild_id, name, maps FROM map_pools {};".format(where), params
+    ):
+        catalogs[r["guild_id"]][0][r["name"]] = set(json.loads(r["maps"]))
+    for r in c.execute(
+        "SELECT guild_id, name, pool_name, pickban_order FROM rulesets {};".format(
+            where
+        ),
+        params,
+    ):
+        catalogs[r["guild_id"]][1][r["name"]] = Ruleset(
+            r["pool_name"], r["pickban_order"]
+        )
+    return catalogs
+
+
+def _delete_catalog(c, guild_id):
+    for table in ("catalogs", "map_pools", "rulesets"):
+        c.execute("DELETE FROM {} WHERE guild_id = ?;".format(table), (guild_id,))
+
+
+def add_maps(pools, rulesets, pool, names):
+    """Add maps to a pool, creating it if it doesn't exist."""
+    if not pool or "/" in pool:
+        raise CatalogError("Pool names can't be empty or contain `/`.")
+    if not names:
+        raise CatalogError("Name the maps to add to `{}`.".format(pool))
+    maps = pools.setdefault(pool, set())
+    existing = {m.lower() for m in maps}
+    maps.update(n for n in names if n.lower() not in existing)
+
+
+def remove_maps(pools, rulesets, pool, names):
+    """Remove maps from a pool; a pool left without maps is removed too."""
+    if pool not in pools:
+        raise CatalogError("There is no pool `{}`.".format(pool))
+    lowered = {n.lower() for n in names}
+    missing = lowered - {m.lower() for m in pools[pool]}
+    if missing:
+        raise CatalogError("Not in `{}`: {}".format(pool, ", ".join(sorted(missing))))
+    maps = {m for m in pools[pool] if m.lower() not in lowered}
+    if not maps:
+        _check_unused(rulesets, pool)
+    pools[pool] = maps
+
+
+def remove_pool(pools, rulesets, pool):
+    """Remove a pool, as long as no ruleset uses it."""
+    if pool not in pools:
+        raise CatalogError("There is no pool `{}`.".format(pool))
+    _check_unused(rulesets, pool)
+    del pools[pool]
+
+
+def _check_unused(rulesets, pool):
+    users = sorted(
+        name for name, r in rulesets.items() if parse_pool_spec(r.pool)[0] == pool
+    )
+    if users:
+        raise CatalogError(
+            "`{}` is used by {}; remove or change those rulesets first.".format(
+                pool, ", ".join("`{}`".format(name) for name in users)
+            )
+        )
+
+
+def set_ruleset(pools, rulesets, name, pool, order):
+    """Add a ruleset, or replace the one with the same name.
+
+    As with pickban, the pool can be a random part of one (e.g. 7/ctf)."""
+    try:
+        pool_name, _ = parse_pool_spec(pool)
+    except ValueError:
+        raise CatalogError("Pools are given as `name` or `size/name`.")
+    if pool_name not in pools:
+        raise CatalogError("There is no pool `{}`.".format(pool_name))
+    rulesets[name] = Ruleset(pool, order)
+
+
+def remove_ruleset(pools, rulesets, name):
+    if rulesets.pop(name, None) is None:
+        raise CatalogError("There is no ruleset `{}`.".format(name))
@@ -0,0 +1,217 @@
+"""Asynchronous access to the bot's SQLite database."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pathlib
+import sqlite3
+import threading
+import time
+
+
+class Database:
+    """Runs SQLite queries in worker threads so the event loop never blocks.
+
+    There is a single writer thread which owns the only read-write connection,
+    so writes are serialized without any locking on the loop. Reads are spread
+    over a small pool of threads with their own read-only connections, and the
+    database is kept in WAL mode so those reads never wait for the writer.
+
+    Small writes that arrive in bursts can go through batched(), which groups
+    everything submitted within batch_window seconds (or while the previous
+    group is still committing) into a single transaction.
+
+    If metrics are given, the time every call takes (including waiting for a
+    thread or for its batch) is recorded with metrics.query()."""
+
+    def __init__(
+        self, path, readers=4, batch_window=0.05, batch_limit=500, metrics=None
+    ):
+        self.path = path
+        self.metrics = metrics
+        self.batch_window = batch_window
+        self.batch_limit = batch_limit
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="solomonbot-db-writer"
+        )
+        self._readers = ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="solomonbot-db-reader"
+        )
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._ready = None
+        self._batch = []
+        self._batcher = None
+
+    def _connect(self, readonly):
+        """Get (or open) the connection belonging to the current thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        if readonly:
+            uri = "{}?mode=ro".format(pathlib.Path(self.path).resolve().as_uri())
+            conn = sqlite3.connect(
+                uri, uri=True, isolation_level=None, check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode = WAL;")
+            conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute("PRAGMA busy_timeout = 5000;")
+        conn.row_factory = sqlite3.Row
+        self._local.conn = conn
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _transaction(self, fn, args):
+        conn = self._connect(readonly=False)
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            result = fn(conn.cursor(), *args)
+        except BaseException:
+            conn.execute("ROLLBACK;")
+            raise
+        conn.execute("COMMIT;")
+        return result
+
+    def _transaction_batch(self, calls):
+        # Each call gets a savepoint, so one failing call only undoes itself
+        # rather than the whole group.
+        conn = self._connect(readonly=False)
+        cursor = conn.cursor()
+        results = []
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            for fn, args in calls:
+                conn.execute("SAVEPOINT batched;")
+                try:
+                    result = fn(cursor, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO batched;")
+                    results.append((False, e))
+                else:
+                    results.append((True, result))
+                conn.execute("RELEASE batched;")
+        except BaseException:
+            conn.execute("ROLLBACK;")
+            raise
+        conn.execute("COMMIT;")
+        return results
+
+    def _script(self, script):
+        self._connect(readonly=False).executescript(script)
+
+    def _fetchone(self, sql, params):
+        return self._connect(readonly=True).execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        return self._connect(readonly=True).execute(sql, params).fetchall()
+
+    def _read(self, fn, args):
+        return fn(self._connect(readonly=True).cursor(), *args)
+
+    async def _open(self):
+        # The writer has to create the file (and switch it to WAL) before any
+        # read-only connection can be opened against it.
+        if self._ready is None:
+            loop = asyncio.get_running_loop()
+            self._ready = loop.run_in_executor(self._writer, self._connect, False)
+        try:
+            await self._ready
+        except Exception:
+            self._ready = None
+            raise
+
+    async def _run(self, executor, fn, *args):
+        await self._open()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fn, *args)
+
+    async def _timed(self, kind, awaitable):
+        if self.metrics is None:
+            return await awaitable
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.metrics.query(kind, time.perf_counter() - start)
+
+    async def fetchone(self, sql, params=()):
+        """Run a read-only query and return its first row (or None)."""
+        return await self._timed(
+            "fetchone", self._run(self._readers, self._fetchone, sql, params)
+        )
+
+    async def fetchall(self, sql, params=()):
+        """Run a read-only query and return all of its rows."""
+        return await self._timed(
+            "fetchall", self._run(self._readers, self._fetchall, sql, params)
+        )
+
+    async def read(self, fn, *args):
+        """Run fn(cursor, *args) on a reader thread, with a read-only connection.
+
+        For reads too big to fetch all at once: fn can step through the rows
+        of a query and deal with them as it goes."""
+        return await self._timed("read", self._run(self._readers, self._read, fn, args))
+
+    async def execute(self, sql, params=()):
+        """Run a single writing statement in its own transaction."""
+        return await self.transaction(lambda c: c.execute(sql, params).rowcount)
+
+    async def transaction(self, fn, *args):
+        """Run fn(cursor, *args) on the writer thread inside one transaction.
+
+        Use this whenever a write depends on something read first, so that the
+        read and the write can't interleave with anybody else's."""
+        return await self._timed(
+            "transaction", self._run(self._writer, self._transaction, fn, args)
+        )
+
+    async def batched(self, fn, *args):
+        """Like transaction(), but the transaction may be shared with other calls.
+
+        Calls are run one after another in the order they were submitted, each
+        seeing the effects of the ones before it, and all of them are committed
+        together."""
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((fn, args, future))
+        if self._batcher is None:
+            self._batcher = asyncio.ensure_future(self._run_batches())
+        return await self._timed("batched", future)
+
+    async def _run_batches(self):
+        await asyncio.sleep(self.batch_window)
+        while self._batch:
+            batch = self._batch[: self.batch_limit]
+            self._batch = self._batch[self.batch_limit :]
+            calls = [(fn, args) for fn, args, _ in batch]
+            try:
+                results = await self._run(self._writer, self._transaction_batch, calls)
+            except Exception as e:
+                results = [(False, e)] * len(batch)
+            for (_, _, future), (ok, result) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(result)
+        self._batcher = None
+
+    async def executescript(self, script):
+        """Run a multi-statement SQL script on the writer connection."""
+        await self._timed(
+            "executescript", self._run(self._writer, self._script, script)
+        )
+
+    def close(self):
+        """Wait for outstanding queries, then close every connection."""
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,288 @@
+"""The pick/ban process itself, independent of Discord."""
+from collections import namedtuple
+import functools
+import random
+
+from .pools import intern_pool
+
+PICK = "p"
+BAN = "b"
+RANDOM = "r"
+SWAP = "~"
+SELECT = "?"
+
+Program = namedtuple("Program", "order steps subpool_size subpool_selections")
+Program.__doc__ = """A compiled pick/ban order.
+
+'steps' holds the p/b/r/~ actions in order. If the order ended with a digit
+and ?s, 'subpool_size' is the digit and 'subpool_selections' the number of ?s;
+otherwise both are 0."""
+
+
+class OrderError(ValueError):
+    """The pick/ban order specification is invalid."""
+
+
+class DraftError(Exception):
+    """An action that isn't allowed at this point of the pick/ban process."""
+
+
+class NotYourTurn(DraftError):
+    def __init__(self, captain):
+        super().__init__(captain)
+        self.captain = captain
+
+
+class WrongAction(DraftError):
+    def __init__(self, expected):
+        super().__init__(expected)
+        self.expected = expected
+
+
+class NotInPool(DraftError):
+    pass
+
+
+class PoolExhausted(DraftError):
+    def __init__(self, automatic):
+        super().__init__(automatic)
+        self.automatic = automatic
+
+
+@functools.lru_cache(maxsize=None)
+def compile_order(order):
+    """Validate a pick/ban order specification and compile it into a Program.
+
+    Programs are cached, so the built-in rulesets are only ever parsed once."""
+    steps = []
+    subpool_size = 0
+    subpool_selections = 0
+    for action in order:
+        if action not in "pbr123456789?~":
+            raise OrderError(
+                "Invalid pick/ban process order."
+                "> Must consist only of `p`, `b`, `r`, and/or a digit followed by `?`s."
+            )
+        if subpool_selections and action != "?":
+            raise OrderError(
+                "Invalid pick/ban process order. All `?` must be at the end after a digit."
+            )
+        if action == "?":
+            if not subpool_size:
+                raise OrderError(
+                    "Invalid pick/ban process order. All `?` must be at the end after a digit."
+                )
+            subpool_selections += 1
+        elif action.isdigit():
+            if subpool_size:
+                raise OrderError(
+                    "Invalid pick/ban process order. Only one digit is allowed."
+                )
+            subpool_size = int(action)
+        elif not subpool_size:
+            # Anything between the digit and the ?s is never reached.
+            steps.append(action)
+    return Program(order, tuple(steps), subpool_size, subpool_selections)
+
+
+class Draft:
+    """A single pick/ban process between two captains.
+
+    Captains can be any objects that compare equal to themselves; the draft
+    only ever hands them back. The current position in the program is a plain
+    index, and the captain whose turn it is follows from its parity (every
+    step, including ~, passes the turn).
+
+    Every map taken out of the pool (and every final random selection) is
+    appended to 'journal' as an (action, map) pair, where the action is PICK,
+    BAN, RANDOM or SELECT. Replaying those entries on top of a snapshot() with
+    restore() gives back the same draft, without calling on the rng again.
+
+    The maps left are kept as a bitmask over the (shared, interned) MapPool,
+    plus an unordered array of their IDs for choosing one at random; both are
+    updated in O(1) when a map is taken. 'remaining' can limit the draft to
+    part of the pool from the start."""
+
+    def __init__(
+        self, captains, pool, program, rng=random, pool_name=None, remaining=None
+    ):
+        self.captains = tuple(captains)
+        self.pool_name = pool_name
+        self.maps = intern_pool(pool)
+        self.remaining = self.maps.full if remaining is None else remaining
+        self._ids = [self.maps.ids[name] for name in self.maps.names_in(self.remaining)]
+        self._slots = {map_id: i for i, map_id in enumerate(self._ids)}
+        self.program = program
+        self.rng = rng
+        self.picks = []
+        self.bans = []
+        self.selections = None
+        self.cursor = 0
+        self.seq = 0
+        self.journal = []
+        # For whoever is running the draft to keep track of it by.
+        self.ruleset = None
+        self.session_id = None
+        self.guild_id = None
+        self.channel_id = None
+        self.board = None
+        self.timed_turn = None
+
+    @property
+    def pool(self):
+        """The names of the maps left, in sorted order."""
+        return self.maps.names_in(self.remaining)
+
+    @property
+    def order(self):
+        return self.program.order
+
+    @property
+    def complete(self):
+        return self.cursor >= len(self.program.steps)
+
+    @property
+    def next_action(self):
+        """The next step of the program, or None once it has been run through."""
+        if self.complete:
+            return None
+        return self.program.steps[self.cursor]
+
+    @property
+    def next_captain(self):
+        return self.captains[self.cursor % 2]
+
+    @property
+    def preserved_picks(self):
+        """Picks which are played regardless of the final random selection."""
+        size = self.program.subpool_size
+        return self.picks[:-size] if size else list(self.picks)
+
+    @property
+    def subpool(self):
+        """Picks which the final random selection is made from."""
+        size = self.program.subpool_size
+        return self.picks[-size:] if size else []
+
+    def select(self, captain, action, choice):
+        """Pick or ban a map on behalf of a captain, returning the map chosen.
+
+        'action' is PICK or BAN; 'choice' is matched against the remaining pool
+        in the same forgiving way as fuzzy_choice."""
+        if captain != self.next_captain:
+            raise NotYourTurn(self.next_captain)
+        if action != self.next_action:
+            raise WrongAction(self.next_action)
+        map_id = self.maps.matcher.match_index(choice, self.remaining)
+        if map_id is None:
+            raise NotInPool()
+        self._take(map_id, action)
+        return self.maps.names[map_id]
+
+    def advance(self):
+        """Run any automatic steps until a captain has to act or the draft ends.
+
+        Returns the maps selected at random, as one list for each unbroken run
+        of r steps. Raises PoolExhausted if there is nothing left to pick from."""
+        runs = []
+        run = None
+        while not self.complete:
+            action = self.program.steps[self.cursor]
+            if action == SWAP:
+                self.cursor += 1
+                run = None
+            elif action == RANDOM:
+                if not self._ids:
+                    raise PoolExhausted(automatic=True)
+                if run is None:
+                    run = []
+                    runs.append(run)
+                map_id = self._ids[self.rng.randrange(len(self._ids))]
+                self._take(map_id, RANDOM)
+                run.append(self.maps.names[map_id])
+            else:
+                if not self._ids:
+                    raise PoolExhausted(automatic=False)
+                return runs
+        if self.selections is None:
+            self.selections = self.preserved_picks
+            if self.program.subpool_size:
+                selections = self.rng.sample(
+                    self.subpool, self.program.subpool_selections
+                )
+                for choice in selections:
+                    self._select(choice)
+        return runs
+
+    def snapshot(self):
+        """The state of the draft as plain (JSON-friendly) data.
+
+        The pool is stored whole along with the bitmask of what's left of it,
+        as the pool the draft was started with may since have changed."""
+        return {
+            "seq": self.seq,
+            "cursor": self.cursor,
+            "maps": self.maps.names,
+            "remaining": self.remaining,
+            "picks": list(self.picks),
+            "bans": list(self.bans),
+            "selections": self.selections,
+        }
+
+    @classmethod
+    def restore(cls, captains, program, snapshot, journal=(), **kwargs):
+        """Rebuild a draft from a snapshot() and the journal entries after it."""
+        if "remaining" in snapshot:
+            draft = cls(
+                captains,
+                snapshot["maps"],
+                program,
+                remaining=snapshot["remaining"],
+                **kwargs
+            )
+        else:
+            # Snapshotted before pools were interned: the pool is what was left
+            draft = cls(captains, snapshot["pool"], program, **kwargs)
+        draft.seq = snapshot["seq"]
+        draft.cursor = snapshot["cursor"]
+        draft.picks = list(snapshot["picks"])
+        draft.bans = list(snapshot["bans"])
+        if snapshot["selections"] is not None:
+            draft.selections = list(snapshot["selections"])
+        for action, choice in journal:
+            if action == SELECT:
+                if draft.selections is None:
+                    draft.selections = draft.preserved_picks
+                draft._select(choice)
+                continue
+            while draft.next_action == SWAP:
+                draft.cursor += 1
+            draft._take(draft.maps.ids[choice], action)
+        # The live draft had already run past any swaps after the last entry
+        # (and, if that finished it, made its selections) in advance().
+        while draft.next_action == SWAP:
+            draft.cursor += 1
+        if draft.complete and draft.selections is None:
+            if not program.subpool_size:
+                draft.selections = draft.preserved_picks
+        draft.journal = []
+        return draft
+
+    def _take(self, map_id, action):
+        # Move the last ID into the taken one's slot to keep the array compact.
+        slot = self._slots.pop(map_id)
+        last = self._ids.pop()
+        if last != map_id:
+            self._ids[slot] = last
+            self._slots[last] = slot
+        self.remaining &= ~(1 << map_id)
+        choice = self.maps.names[map_id]
+        (self.bans if action == BAN else self.picks).append(choice)
+        self.cursor += 1
+        self.seq += 1
+        self.journal.append((action, choice))
+
+    def _select(self, choice):
+        self.selections.append(choice)
+        self.seq += 1
+        self.journal.append((SELECT, choice))
@@ -0,0 +1,54 @@
+"""Writing out query results as files, a row at a time."""
+import csv
+import json
+import tempfile
+
+FORMATS = ("csv", "jsonl")
+# Exports are kept in memory up to this size, and moved to a temporary file
+# if they grow beyond it.
+SPOOL_SIZE = 1024 * 1024
+
+
+class _Encoder:
+    """Lets a text writer (such as csv.writer) write to a binary file."""
+
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, text):
+        return self.out.write(text.encode("utf-8"))
+
+
+def write_rows(cursor, format, out):
+    """Write a query's rows to a binary file, returning how many there were.
+
+    "csv" gives a header row of column names and then the rows; "jsonl" one
+    JSON object per row. Rows are written as they are read from the cursor,
+    so memory use doesn't grow with the number of rows."""
+    columns = [d[0] for d in cursor.description]
+    count = 0
+    if format == "csv":
+        writer = csv.writer(_Encoder(out))
+        writer.writerow(columns)
+        for row in cursor:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in cursor:
+            out.write(json.dumps(dict(zip(columns, row))).encode("utf-8") + b"\n")
+            count += 1
+    return count
+
+
+def export_query(c, sql, params, format, spool_size=SPOOL_SIZE):
+    """Run a query, returning a (rewound) temporary file of its rows and their count."""
+    if format not in FORMATS:
+        raise ValueError("Unknown export format {!r}".format(format))
+    out = tempfile.SpooledTemporaryFile(max_size=spool_size)
+    try:
+        count = write_rows(c.execute(sql, params), format, out)
+    except BaseException:
+        out.close()
+        raise
+    out.seek(0)
+    return out, count
@@ -0,0 +1,52 @@
+"""Runtime state kept separately for every guild the bot is in."""
+import time
+
+# Guilds which haven't used the bot for this many seconds (and have no draft in
+# progress) have their state dropped; it is rebuilt from scratch when needed.
+IDLE_TIMEOUT = 60 * 60
+
+
+class GuildStates:
+    """Holds one copy of the bot's state per guild.
+
+    A guild's state is made by new_state() when it is first used, so nothing
+    one guild does (or wipes) is visible to the others."""
+
+    def __init__(self, new_state, idle_timeout=IDLE_TIMEOUT, clock=time.monotonic):
+        self.new_state = new_state
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self._states = {}
+        self._last_used = {}
+
+    def __len__(self):
+        return len(self._states)
+
+    def __iter__(self):
+        return iter(list(self._states.items()))
+
+    def get(self, guild_id):
+        """The state for a guild, creating it if needed."""
+        self._last_used[guild_id] = self.clock()
+        state = self._states.get(guild_id)
+        if state is None:
+            state = self._states[guild_id] = self.new_state()
+        return state
+
+    def reset(self, guild_id):
+        """Throw away a guild's state, going back to the defaults."""
+        self._states.pop(guild_id, None)
+        self._last_used.pop(guild_id, None)
+
+    def evict_idle(self):
+        """Drop the state of idle guilds, returning the IDs of those evicted."""
+        cutoff = self.clock() - self.idle_timeout
+        evicted = [
+            guild_id
+            for guild_id, state in self._states.items()
+            if self._last_used[guild_id] < cutoff
+            and not state["active-pickbans-by-user"]
+        ]
+        for guild_id in evicted:
+            self.reset(guild_id)
+        return evicted
@@ -0,0 +1,107 @@
+"""The archive of finished pick/ban processes, and map statistics kept from it."""
+import json
+
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+
+# Statistics are kept per pool and per ruleset.
+POOL = "pool"
+RULESET = "ruleset"
+
+
+def record(draft, outcome):
+    """The archive row for a draft that has been completed or cancelled."""
+    captain1, captain2 = draft.captains
+    return (
+        draft.guild_id or 0,
+        draft.ruleset,
+        draft.pool_name,
+        draft.order,
+        captain1,
+        captain2,
+        outcome,
+        json.dumps(draft.picks),
+        json.dumps(draft.bans),
+        json.dumps(draft.selections) if draft.selections is not None else None,
+    )
+
+
+def archive(c, row):
+    """Add a record() to the archive, and count it in the statistics.
+
+    Meant to run in the same transaction as whatever ends the draft, so the
+    statistics never disagree with the archive. Maps are only counted for
+    completed drafts; cancelled ones just count as cancelled."""
+    c.execute(
+        "INSERT INTO pickban_history (guild_id, ruleset, pool_name, pickban_order,"
+        " captain1_id, captain2_id, outcome, picks, bans, selections)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+        row,
+    )
+    guild_id, ruleset, pool_name = row[:3]
+    outcome, picks, bans, selections = row[6:]
+    completed = outcome == COMPLETED
+
+    counts = {}
+    if completed:
+        for column, maps in enumerate((picks, bans, selections)):
+            for name in json.loads(maps or "[]"):
+                counts.setdefault(name, [0, 0, 0])[column] += 1
+
+    scopes = [(POOL, pool_name)]
+    if ruleset is not None:
+        scopes.append((RULESET, ruleset))
+    for kind, name in scopes:
+        c.execute(
+            "INSERT INTO draft_stats (guild_id, kind, name, completed, cancelled)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (guild_id, kind, name) DO UPDATE SET"
+            " completed = completed + excluded.completed,"
+            " cancelled = cancelled + excluded.cancelled;",
+            (guild_id, kind, name, int(completed), int(not completed)),
+        )
+        c.executemany(
+            "INSERT INTO map_stats (guild_id, kind, name, map, picks, bans, plays)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (guild_id, kind, name, map) DO UPDATE SET"
+            " picks = picks + excluded.picks,"
+            " bans = bans + excluded.bans,"
+            " plays = plays + excluded.plays;",
+            (
+                (guild_id, kind, name, map_name, *map_counts)
+                for map_name, map_counts in counts.items()
+            ),
+        )
+
+
+def read_totals(c, guild_id):
+    """How many drafts of each pool and ruleset have been completed and cancelled."""
+    return c.execute(
+        "SELECT kind, name, completed, cancelled FROM draft_stats"
+        " WHERE guild_id = ? ORDER BY kind DESC, name;",
+        (guild_id,),
+    ).fetchall()
+
+
+def read_stats(c, guild_id, name, kind=None):
+    """The statistics for a ruleset or pool, as (kind, totals, per-map rows).
+
+    Without a kind, a ruleset is looked for before a pool of the same name.
+    Returns None if no drafts of it have finished."""
+    for kind in (kind,) if kind else (RULESET, POOL):
+        totals = c.execute(
+            "SELECT completed, cancelled FROM draft_stats"
+            " WHERE guild_id = ? AND kind = ? AND name = ?;",
+            (guild_id, kind, name),
+        ).fetchone()
+        if totals is not None:
+            break
+    else:
+        return None
+    rows = c.execute(
+        "SELECT map, picks, bans, plays FROM map_stats"
+        " WHERE guild_id = ? AND kind = ? AND name = ?"
+        " ORDER BY plays DESC, picks DESC, map;",
+        (guild_id, kind, name),
+    ).fetchall()
+    return kind, totals, rows
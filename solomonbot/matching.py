@@ -0,0 +1,97 @@
+"""Human-friendly matching of map names."""
+import bisect
+
+
+def fuzzy_choice(options, choice):
+    """Match a choice with one of multiple options in a human-friendly way.
+
+    Will always match either one or none of the options. If a choice is ambiguous,
+    it will choose to match none of them."""
+    # Exact match, case-insensitive
+    for option in options:
+        if option.lower() == choice.lower():
+            return option
+    # Prefix match, case-insensitive
+    potential_options = []
+    for option in options:
+        if option.lower().startswith(choice.lower()):
+            potential_options.append(option)
+    if potential_options:
+        if len(potential_options) == 1:
+            return potential_options[0]
+        return None
+    # Acronym match, case insensitive
+    potential_options = []
+    for option in options:
+        acronym = "".join(letter for letter in option if "A" <= letter <= "Z")
+        if len(acronym) > 1 and acronym.lower() == choice.lower():
+            potential_options.append(option)
+    if potential_options:
+        if len(potential_options) == 1:
+            return potential_options[0]
+        return None
+    return None
+
+
+def acronym(option):
+    """The capital letters of an option, e.g. "NightFlare" -> "NF"."""
+    return "".join(letter for letter in option if "A" <= letter <= "Z")
+
+
+class MapMatcher:
+    """A precomputed index answering the same questions as fuzzy_choice.
+
+    The lowercased names, a sorted list of them for prefix lookups and the
+    acronyms are worked out once when the index is built, instead of being
+    recomputed on every lookup. The index never changes, so one can be shared
+    by every draft using a pool: lookups can be limited to the options still
+    available, given as a bitmask over the options' positions."""
+
+    def __init__(self, options):
+        self.options = tuple(options)
+        self._exact = {}
+        self._acronyms = {}
+        for i, option in enumerate(self.options):
+            lowered = option.lower()
+            self._exact.setdefault(lowered, i)
+            letters = acronym(option)
+            if len(letters) > 1:
+                self._acronyms.setdefault(letters.lower(), []).append(i)
+        prefixes = sorted((option.lower(), i) for i, option in enumerate(self.options))
+        self._prefixes = [lowered for lowered, _ in prefixes]
+        self._prefix_indexes = [i for _, i in prefixes]
+
+    def match(self, choice, mask=None):
+        """Match a choice with exactly one option, or None (see fuzzy_choice)."""
+        i = self.match_index(choice, mask)
+        return None if i is None else self.options[i]
+
+    def match_index(self, choice, mask=None):
+        """Like match(), but giving the position of the option matched.
+
+        If mask is given, only options whose bit (1 << position) is set in it
+        are considered."""
+        if mask is None:
+            mask = -1  # Every bit set
+        choice = choice.lower()
+        # Exact match
+        i = self._exact.get(choice)
+        if i is not None and mask >> i & 1:
+            return i
+        # Prefix match: everything starting with the choice sorts right after it
+        matches = []
+        j = bisect.bisect_left(self._prefixes, choice)
+        while j < len(self._prefixes) and self._prefixes[j].startswith(choice):
+            i = self._prefix_indexes[j]
+            if mask >> i & 1:
+                matches.append(i)
+                if len(matches) > 1:
+                    return None
+            j += 1
+        if matches:
+            return matches[0]
+        # Acronym match
+        matches = [i for i in self._acronyms.get(choice, ()) if mask >> i & 1]
+        if len(matches) == 1:
+            return matches[0]
+        return None
@@ -0,0 +1,191 @@
+"""Timings and counts of what the bot spends its time on."""
+from bisect import bisect_left
+import contextvars
+import os
+import time
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Upper bounds of the queries-per-command histogram buckets.
+QUERY_COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+# The command invocation being run by the current task, if any, so that
+# queries can be charged to it without passing it around.
+_invocation = contextvars.ContextVar("invocation", default=None)
+
+
+class Histogram:
+    """Counts of observed values falling into a fixed set of buckets."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """The upper bound of the bucket containing the q-quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return float("inf")
+
+    def cumulative(self):
+        """(upper bound, number of values <= it) for every bucket, Prometheus-style."""
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            yield bound, seen
+
+
+class Invocation:
+    """What a single run of a command has done so far."""
+
+    __slots__ = ("command", "started", "queries", "query_time", "send_time")
+
+    def __init__(self, command, started):
+        self.command = command
+        self.started = started
+        self.queries = 0
+        self.query_time = 0.0
+        self.send_time = 0.0
+
+
+class Metrics:
+    """Per-command latency, database and message sending statistics."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.latency = {}
+        self.query_counts = {}
+        self.query_time = {}
+        self.send_time = {}
+        self.queries = {}
+        self.errors = {}
+
+    def start(self, command):
+        """Begin timing a command in the current task."""
+        invocation = Invocation(command, self.clock())
+        _invocation.set(invocation)
+        return invocation
+
+    def finish(self):
+        """Record the command being run by the current task as done."""
+        invocation = _invocation.get()
+        if invocation is None:
+            return
+        _invocation.set(None)
+        command = invocation.command
+        _histogram(self.latency, command).observe(self.clock() - invocation.started)
+        _histogram(self.query_counts, command, QUERY_COUNT_BUCKETS).observe(
+            invocation.queries
+        )
+        _histogram(self.query_time, command).observe(invocation.query_time)
+        _histogram(self.send_time, command).observe(invocation.send_time)
+
+    def query(self, kind, seconds):
+        """Record a database call, charging it to the running command."""
+        _histogram(self.queries, kind).observe(seconds)
+        invocation = _invocation.get()
+        if invocation is not None:
+            invocation.queries += 1
+            invocation.query_time += seconds
+
+    def sent(self, seconds):
+        """Record time spent sending a message for the running command."""
+        invocation = _invocation.get()
+        if invocation is not None:
+            invocation.send_time += seconds
+
+    def error(self, command, error):
+        key = (command or "", type(error).__name__)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def prometheus(self):
+        """All of the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, help, histograms, label in (
+            (
+                "solomonbot_command_seconds",
+                "Time taken to run a command.",
+                self.latency,
+                "command",
+            ),
+            (
+                "solomonbot_command_queries",
+                "Database calls made by a command.",
+                self.query_counts,
+                "command",
+            ),
+            (
+                "solomonbot_command_query_seconds",
+                "Time a command spent waiting on the database.",
+                self.query_time,
+                "command",
+            ),
+            (
+                "solomonbot_command_send_seconds",
+                "Time a command spent sending messages.",
+                self.send_time,
+                "command",
+            ),
+            (
+                "solomonbot_query_seconds",
+                "Time taken by database calls.",
+                self.queries,
+                "kind",
+            ),
+        ):
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} histogram".format(name))
+            for key, histogram in sorted(histograms.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        '{}_bucket{{{}="{}",le="{}"}} {}'.format(
+                            name, label, key, _format_bound(bound), count
+                        )
+                    )
+                lines.append(
+                    '{}_sum{{{}="{}"}} {}'.format(name, label, key, histogram.sum)
+                )
+                lines.append(
+                    '{}_count{{{}="{}"}} {}'.format(name, label, key, histogram.count)
+                )
+        lines.append("# HELP solomonbot_command_errors_total Failed commands.")
+        lines.append("# TYPE solomonbot_command_errors_total counter")
+        for (command, error), count in sorted(self.errors.items()):
+            lines.append(
+                'solomonbot_command_errors_total{{command="{}",error="{}"}} {}'.format(
+                    command, error, count
+                )
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to a file, replacing it in one go.
+
+        Readers (such as the node exporter's textfile collector) never see a
+        partially written file."""
+        temp = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(temp, path)
+
+
+def _histogram(histograms, key, buckets=LATENCY_BUCKETS):
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = Histogram(buckets)
+    return histogram
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
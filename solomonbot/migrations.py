@@ -0,0 +1,488 @@
+"""Bringing an existing database up to date with the bot's schema."""
+from . import schema
+from .tournaments import CLOSED, OPEN
+
+
+class MigrationError(Exception):
+    """The database can't be brought up to date automatically."""
+
+
+def upgrade_tables(c, guild_id=None):
+    """Make the tables match schema.TABLES, returning the names of those changed.
+
+    This is for dbupgrade, so follows the schema as it is now; the migrations
+    have their own copies of the tables, as they were at each version.
+
+    Missing tables are created, and existing ones get any columns and indexes
+    added since. Tables from before the database was split up by guild have
+    their rows given to guild_id; without one they are left as they are, as
+    are tables still keyed by guild that partition_signups re-keys."""
+    upgraded = []
+    for table, creates in schema.TABLES.items():
+        columns = _columns(c, table)
+        if not columns:
+            # Added since the database was created
+            rows = []
+        elif "guild_id" in creates[0] and "guild_id" not in columns:
+            if guild_id is None:
+                continue
+            rows = [dict(r) for r in c.execute("SELECT * FROM {};".format(table))]
+            c.execute("DROP TABLE {};".format(table))
+        elif "tournament_id" in creates[0] and "tournament_id" not in columns:
+            continue
+        else:
+            # Only its columns and indexes may have changed
+            for column, definition in schema.ADDED_COLUMNS.get(table, {}).items():
+                if column not in columns:
+                    c.execute(
+                        "ALTER TABLE {} ADD COLUMN {} {};".format(
+                            table, column, definition
+                        )
+                    )
+                    upgraded.append(table)
+            for create in creates[1:]:
+                c.execute(create)
+            continue
+
+        for create in creates:
+            c.execute(create)
+        if rows and "tournament_id" in creates[0]:
+            tournament_id = _default_tournament(c, guild_id)
+        for row in rows:
+            row["guild_id"] = guild_id
+            if "mention" in row:
+                # Mentions are "<@id>" or "<@!id>"; a user may appear in both forms.
+                row["user_id"] = int(row.pop("mention").strip("<@!>"))
+            if "tournament_id" in creates[0]:
+                row["tournament_id"] = tournament_id
+            c.execute(
+                "INSERT OR IGNORE INTO {} ({}) VALUES ({});".format(
+                    table, ", ".join(row), ", ".join("?" for _ in row)
+                ),
+                tuple(row.values()),
+            )
+        upgraded.append(table)
+    for index in schema.RETIRED_INDEXES:
+        c.execute("DROP INDEX IF EXISTS {};".format(index))
+
+    if "signups" in upgraded or "counters" in upgraded:
+        _recount(c)
+    return upgraded
+
+
+def unclaimed_tables(c):
+    """Tables from before the database was split up by guild, if any are left."""
+    unclaimed = []
+    for table, creates in schema.TABLES.items():
+        columns = _columns(c, table)
+        if columns and "guild_id" not in columns and "guild_id" in creates[0]:
+            unclaimed.append(table)
+    return unclaimed
+
+
+# The tables as of each version, frozen: whatever schema.TABLES says now,
+# a migration always takes a database to the same place.
+V1_TABLES = {
+    "settings": (
+        """
+        CREATE TABLE settings (
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (guild_id, name)
+        );
+        """,
+    ),
+    "signups": (
+        """
+        CREATE TABLE signups (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            display_name TEXT,
+            signup_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            checkin_time TIMESTAMP DEFAULT NULL,
+            rating REAL DEFAULT NULL,
+            PRIMARY KEY (guild_id, user_id)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS signups_by_signup_key"
+        " ON signups (guild_id, signup_time, user_id);",
+        "CREATE INDEX IF NOT EXISTS signups_by_checkin_key"
+        " ON signups (guild_id, checkin_time, user_id);",
+    ),
+    "counters": (
+        """
+        CREATE TABLE counters (
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, name)
+        );
+        """,
+    ),
+    "pickbans": (
+        """
+        CREATE TABLE pickbans (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            captain1_id INTEGER NOT NULL,
+            captain2_id INTEGER NOT NULL,
+            pool_name TEXT NOT NULL,
+            pickban_order TEXT NOT NULL,
+            channel_id INTEGER,
+            snapshot TEXT NOT NULL
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS pickbans_by_guild ON pickbans (guild_id);",
+    ),
+    "pickban_actions": (
+        """
+        CREATE TABLE pickban_actions (
+            pickban_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            map TEXT NOT NULL,
+            PRIMARY KEY (pickban_id, seq)
+        ) WITHOUT ROWID;
+        """,
+    ),
+    "catalogs": (
+        """
+        CREATE TABLE catalogs (
+            guild_id INTEGER PRIMARY KEY
+        );
+        """,
+    ),
+    "map_pools": (
+        """
+        CREATE TABLE map_pools (
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            maps TEXT NOT NULL,
+            PRIMARY KEY (guild_id, name)
+        );
+        """,
+    ),
+    "rulesets": (
+        """
+        CREATE TABLE rulesets (
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            pool_name TEXT NOT NULL,
+            pickban_order TEXT NOT NULL,
+            PRIMARY KEY (guild_id, name)
+        );
+        """,
+    ),
+    "shard_leases": (
+        """
+        CREATE TABLE shard_leases (
+            shard_id INTEGER PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+        """,
+    ),
+}
+
+V2_TABLES = {
+    "pickban_history": (
+        """
+        CREATE TABLE pickban_history (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            ruleset TEXT,
+            pool_name TEXT NOT NULL,
+            pickban_order TEXT NOT NULL,
+            captain1_id INTEGER NOT NULL,
+            captain2_id INTEGER NOT NULL,
+            outcome TEXT NOT NULL,
+            picks TEXT NOT NULL,
+            bans TEXT NOT NULL,
+            selections TEXT,
+            finished_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_ruleset"
+        " ON pickban_history (guild_id, ruleset, finished_time);",
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_pool"
+        " ON pickban_history (guild_id, pool_name, finished_time);",
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_captain1"
+        " ON pickban_history (guild_id, captain1_id, finished_time);",
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_captain2"
+        " ON pickban_history (guild_id, captain2_id, finished_time);",
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_time"
+        " ON pickban_history (guild_id, finished_time);",
+    ),
+    "draft_stats": (
+        """
+        CREATE TABLE draft_stats (
+            guild_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, kind, name)
+        ) WITHOUT ROWID;
+        """,
+    ),
+    "map_stats": (
+        """
+        CREATE TABLE map_stats (
+            guild_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            map TEXT NOT NULL,
+            picks INTEGER NOT NULL DEFAULT 0,
+            bans INTEGER NOT NULL DEFAULT 0,
+            plays INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, kind, name, map)
+        ) WITHOUT ROWID;
+        """,
+    ),
+}
+
+V3_TABLES = {
+    "tournaments": (
+        """
+        CREATE TABLE tournaments (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            signups INTEGER NOT NULL DEFAULT 0,
+            checkins INTEGER NOT NULL DEFAULT 0,
+            created_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            closed_time TIMESTAMP DEFAULT NULL
+        );
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS tournaments_by_name"
+        " ON tournaments (guild_id, name);",
+    ),
+    "archived_signups": (
+        """
+        CREATE TABLE archived_signups (
+            tournament_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            display_name TEXT,
+            signup_time TIMESTAMP,
+            checkin_time TIMESTAMP,
+            rating REAL,
+            PRIMARY KEY (tournament_id, user_id)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS archived_signups_by_signup_key"
+        " ON archived_signups (tournament_id, signup_time, user_id);",
+        "CREATE INDEX IF NOT EXISTS archived_signups_by_checkin_key"
+        " ON archived_signups (tournament_id, checkin_time, user_id);",
+    ),
+}
+
+V3_SIGNUPS = (
+    """
+    CREATE TABLE signups (
+        tournament_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        display_name TEXT,
+        signup_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        checkin_time TIMESTAMP DEFAULT NULL,
+        rating REAL DEFAULT NULL,
+        PRIMARY KEY (tournament_id, user_id)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS signups_by_signup_key"
+    " ON signups (tournament_id, signup_time, user_id);",
+    "CREATE INDEX IF NOT EXISTS signups_by_checkin_key"
+    " ON signups (tournament_id, checkin_time, user_id);",
+)
+
+V3_COUNTERS = """
+    CREATE TABLE counters (
+        tournament_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        value INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tournament_id, name)
+    );
+    """
+
+
+def create_tables(c):
+    """Version 1: every table there was when the schema started being versioned.
+
+    Databases from before then may have some of them already, perhaps without
+    the rating column or the current indexes; tables from before the database
+    was split up by guild are left for dbupgrade."""
+    changed = _create_tables(c, V1_TABLES, {"signups": {"rating": "REAL DEFAULT NULL"}})
+    for index in ("signups_by_signup_time", "signups_by_checkin_time"):
+        c.execute("DROP INDEX IF EXISTS {};".format(index))
+    if "signups" in changed or "counters" in changed:
+        if "guild_id" in _columns(c, "signups"):
+            c.execute("DELETE FROM counters;")
+            c.execute(
+                "INSERT INTO counters (guild_id, name, value)"
+                " SELECT guild_id, 'signups', COUNT(1) FROM signups GROUP BY guild_id"
+                " UNION ALL"
+                " SELECT guild_id, 'checkins', COUNT(1) FROM signups"
+                " WHERE checkin_time IS NOT NULL GROUP BY guild_id;"
+            )
+
+
+def add_pickban_history(c):
+    """Version 2: the archive of finished drafts, its statistics, and the
+    ruleset each draft was started from."""
+    _create_tables(c, V2_TABLES)
+    _create_tables(
+        c,
+        {"pickbans": V1_TABLES["pickbans"]},
+        {"pickbans": {"ruleset": "TEXT DEFAULT NULL"}},
+    )
+
+
+def partition_signups(c):
+    """Version 3: signups (and their counters) belong to tournaments, not guilds.
+
+    Each guild's signups become those of a tournament called "default", which
+    takes over its "signups" and "checkins" settings."""
+    _create_tables(c, V3_TABLES)
+    columns = _columns(c, "signups")
+    if "guild_id" in columns and "tournament_id" not in columns:
+        c.execute("ALTER TABLE signups RENAME TO guild_signups;")
+        # Indexes go with the renamed table, so are only made once it's gone.
+        create, *indexes = V3_SIGNUPS
+        c.execute(create)
+        guilds = {r[0] for r in c.execute("SELECT guild_id FROM guild_signups;")}
+        if "guild_id" in _columns(c, "settings"):
+            guilds.update(
+                r[0]
+                for r in c.execute(
+                    "SELECT guild_id FROM settings"
+                    " WHERE name IN ('signups', 'checkins') AND data = 'on';"
+                )
+            )
+        for guild in guilds:
+            tournament_id = _default_tournament(c, guild)
+            c.execute(
+                "INSERT INTO signups (tournament_id, user_id, guild_id,"
+                " display_name, signup_time, checkin_time, rating)"
+                " SELECT ?, user_id, guild_id,"
+                " display_name, signup_time, checkin_time, rating"
+                " FROM guild_signups WHERE guild_id = ?;",
+                (tournament_id, guild),
+            )
+        if "guild_id" in _columns(c, "settings"):
+            # Those of guilds without signups, now unused
+            c.execute("DELETE FROM settings WHERE name IN ('signups', 'checkins');")
+        c.execute("DROP TABLE guild_signups;")
+        for index in indexes:
+            c.execute(index)
+    if "tournament_id" not in _columns(c, "counters"):
+        c.execute("DROP TABLE IF EXISTS counters;")
+        c.execute(V3_COUNTERS)
+    _recount(c)
+
+
+def _create_tables(c, tables, added_columns=None):
+    """Create whichever of the given tables are missing, returning those changed.
+
+    Tables that are there get the given columns and indexes, unless they are
+    from before the database was split up by guild."""
+    changed = []
+    for table, creates in tables.items():
+        columns = _columns(c, table)
+        if not columns:
+            for create in creates:
+                c.execute(create)
+            changed.append(table)
+            continue
+        if "guild_id" in creates[0] and "guild_id" not in columns:
+            continue
+        for column, definition in (added_columns or {}).get(table, {}).items():
+            if column not in columns:
+                c.execute(
+                    "ALTER TABLE {} ADD COLUMN {} {};".format(table, column, definition)
+                )
+                changed.append(table)
+        for create in creates[1:]:
+            c.execute(create)
+    return changed
+
+
+def _columns(c, table):
+    return [r["name"] for r in c.execute("PRAGMA table_info({});".format(table))]
+
+
+def _default_tournament(c, guild_id):
+    """The ID of the tournament for a guild's signups from before tournaments,
+    which takes over its "signups" and "checkins" settings."""
+    phases = {}
+    if "guild_id" in _columns(c, "settings"):
+        phases = {
+            r["name"]: r["data"] == "on"
+            for r in c.execute(
+                "SELECT name, data FROM settings"
+                " WHERE guild_id = ? AND name IN ('signups', 'checkins');",
+                (guild_id,),
+            )
+        }
+        c.execute(
+            "DELETE FROM settings"
+            " WHERE guild_id = ? AND name IN ('signups', 'checkins');",
+            (guild_id,),
+        )
+    signups = phases.get("signups", False)
+    checkins = phases.get("checkins", False)
+    c.execute(
+        "INSERT OR IGNORE INTO tournaments (guild_id, name, status, signups, checkins)"
+        " VALUES (?, 'default', ?, ?, ?);",
+        (guild_id, OPEN if signups or checkins else CLOSED, signups, checkins),
+    )
+    return c.execute(
+        "SELECT id FROM tournaments WHERE guild_id = ? AND name = 'default';",
+        (guild_id,),
+    ).fetchone()["id"]
+
+
+def _recount(c):
+    """Work out every tournament's counters again from its players."""
+    if "tournament_id" not in _columns(c, "signups"):
+        return  # Counted once partition_signups has re-keyed them
+    c.execute("DELETE FROM counters;")
+    for table in ("signups", "archived_signups"):
+        c.execute(
+            "INSERT INTO counters (tournament_id, name, value)"
+            " SELECT tournament_id, 'signups', COUNT(1) FROM {0}"
+            " GROUP BY tournament_id"
+            " UNION ALL"
+            " SELECT tournament_id, 'checkins', COUNT(1) FROM {0}"
+            " WHERE checkin_time IS NOT NULL GROUP BY tournament_id;".format(table)
+        )
+
+
+# The steps from one schema version to the next: MIGRATIONS[0] takes a
+# database to version 1, and so on. Steps are only ever appended, and each
+# must cope with any database the bot could have left at the version before
+# (the first with any database at all, including an empty one).
+MIGRATIONS = (create_tables, add_pickban_history, partition_signups)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(c):
+    """Apply the migrations a database hasn't had yet, returning the versions applied."""
+    c.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL);")
+    row = c.execute("SELECT version FROM schema_version;").fetchone()
+    version = row["version"] if row else 0
+    if version > SCHEMA_VERSION:
+        raise MigrationError(
+            "The database is at schema version {}, but this version of the bot"
+            " only knows up to {}.".format(version, SCHEMA_VERSION)
+        )
+    applied = []
+    for step in MIGRATIONS[version:]:
+        step(c)
+        version += 1
+        applied.append(version)
+    c.execute("DELETE FROM schema_version;")
+    c.execute("INSERT INTO schema_version (version) VALUES (?);", (version,))
+    return applied
@@ -0,0 +1,106 @@
+"""Sending many messages without running into Discord's rate limits."""
+import asyncio
+from collections import deque
+import time
+
+MESSAGE_LIMIT = 2000
+# Discord allows 5 messages per 5 seconds in a channel, and 50 requests a
+# second across the whole bot.
+CHANNEL_RATE = (5, 5.0)
+GLOBAL_RATE = (50, 1.0)
+
+
+def pack(header, items, limit=MESSAGE_LIMIT, separator=" "):
+    """Join items into as few messages as possible, the first starting with header.
+
+    Each message is filled up before the next is started, which gives the
+    fewest messages for items that have to stay in order."""
+    messages = []
+    current = header
+    for item in items:
+        if len(item) > limit:
+            raise ValueError("An item doesn't fit in a message on its own.")
+        if current and len(current) + len(separator) + len(item) > limit:
+            messages.append(current)
+            current = ""
+        current = current + separator + item if current else item
+    if current:
+        messages.append(current)
+    return messages
+
+
+class Bucket:
+    """At most 'limit' requests in any 'per' seconds, over a sliding window."""
+
+    def __init__(self, limit, per, clock=time.monotonic):
+        self.limit = limit
+        self.per = per
+        self.clock = clock
+        self._sent = deque()
+
+    def delay(self):
+        """How long until another request is allowed."""
+        now = self.clock()
+        while self._sent and self._sent[0] <= now - self.per:
+            self._sent.popleft()
+        if len(self._sent) < self.limit:
+            return 0
+        return self._sent[0] + self.per - now
+
+    def take(self):
+        self._sent.append(self.clock())
+
+    @property
+    def idle(self):
+        """Whether the bucket is as good as new."""
+        return self.delay() == 0 and not self._sent
+
+
+class Outbox:
+    """A queue for outgoing messages, paced to stay within the rate limits.
+
+    discord.py backs off once Discord says a limit has been hit; going
+    through here means not hitting it in the first place, which matters
+    when sending a burst of messages, as each 429 response costs a request
+    and a wait. Messages to the same destination are sent one at a time, in
+    the order they were queued."""
+
+    def __init__(
+        self, channel_rate=CHANNEL_RATE, global_rate=GLOBAL_RATE, clock=time.monotonic
+    ):
+        self.channel_rate = channel_rate
+        self.clock = clock
+        self.sent = 0
+        self.waited = 0.0
+        self._global = Bucket(*global_rate, clock=clock)
+        self._destinations = {}
+
+    async def send(self, destination, *args, **kwargs):
+        """Send a message to a channel or user, once the rate limits allow."""
+        key = destination.id
+        entry = self._destinations.get(key)
+        if entry is None:
+            entry = self._destinations[key] = (
+                asyncio.Lock(),
+                Bucket(*self.channel_rate, clock=self.clock),
+            )
+        lock, bucket = entry
+        async with lock:
+            while True:
+                delay = max(bucket.delay(), self._global.delay())
+                if delay <= 0:
+                    break
+                self.waited += delay
+                await asyncio.sleep(delay)
+            bucket.take()
+            self._global.take()
+            self.sent += 1
+            message = await destination.send(*args, **kwargs)
+        if len(self._destinations) > 1000:
+            self._forget_idle()
+        return message
+
+    def _forget_idle(self):
+        for key, (lock, bucket) in list(self._destinations.items()):
+            if not lock.locked() and bucket.idle:
+                del self._destinations[key]
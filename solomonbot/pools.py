@@ -0,0 +1,66 @@
+"""Map pools with their maps numbered, so sets of them can be bitmasks."""
+import functools
+
+from .matching import MapMatcher
+
+
+class MapPool:
+    """An immutable pool of maps, shared by every draft using it.
+
+    Each map gets a small ID, its position in the sorted list of names, so a
+    set of maps from the pool (e.g. those a draft has left) is an int with
+    bit 1 << ID set for each of them. Listing such a set gives the names in
+    sorted order without any sorting."""
+
+    def __init__(self, names):
+        self.names = tuple(sorted(set(names)))
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.matcher = MapMatcher(self.names)
+        self.full = (1 << len(self.names)) - 1
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def mask_of(self, names):
+        """The bitmask of some of the pool's maps."""
+        mask = 0
+        for name in names:
+            mask |= 1 << self.ids[name]
+        return mask
+
+    def names_in(self, mask):
+        """The names of the maps in a bitmask, in sorted order."""
+        names = []
+        while mask:
+            low = mask & -mask
+            names.append(self.names[low.bit_length() - 1])
+            mask ^= low
+        return names
+
+    def sample(self, rng, size):
+        """The bitmask of a random selection of size maps from the pool."""
+        mask = 0
+        for i in rng.sample(range(len(self.names)), size):
+            mask |= 1 << i
+        return mask
+
+
+@functools.lru_cache(maxsize=256)
+def _intern(names):
+    return MapPool(names)
+
+
+def intern_pool(names):
+    """The shared MapPool of a collection of map names."""
+    if isinstance(names, MapPool):
+        return names
+    return _intern(frozenset(names))
+
+
+def parse_pool_spec(spec):
+    """Split a pool given as "name" or "size/name" into (name, size or None)."""
+    size, _, name = spec.rpartition("/")
+    return name, int(size) if size else None
@@ -0,0 +1,48 @@
+"""Cache of command output rendered from a guild's maps and rulesets."""
+from collections import OrderedDict
+import itertools
+
+# Version 0 is the default maps and rulesets, which every guild starts out with
+# (and goes back to when wiped), so they all share the same cached output.
+DEFAULT_VERSION = 0
+_versions = itertools.count(DEFAULT_VERSION + 1)
+
+
+def new_version():
+    """A version number that has never been used before.
+
+    Every catalog of maps and rulesets made by a change gets a new version;
+    output cached for the old one is then never used again and eventually
+    drops out of the cache."""
+    return next(_versions)
+
+
+class RenderCache:
+    """Remembers rendered output (strings and embeds) by state version and key.
+
+    Cached embeds are shared between every caller, so they must not be
+    modified after being rendered."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, version, key, render):
+        """The output cached for a key, calling render() to create it if needed."""
+        entry = (version, key)
+        try:
+            value = self._data[entry]
+        except KeyError:
+            self.misses += 1
+            value = self._data[entry] = render()
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        else:
+            self.hits += 1
+            self._data.move_to_end(entry)
+        return value
@@ -0,0 +1,86 @@
+"""Reading the lists of signed up and checked in players a page at a time."""
+from .export import export_query
+from .tournaments import player_table
+
+PAGE_SIZE = 100
+
+# The column each list is ordered by, and the counter holding its length.
+LISTS = {
+    "signups": "signup_time",
+    "checkins": "checkin_time",
+}
+
+
+class PlayerList:
+    """The players in one of a tournament's lists, in the order they joined it.
+
+    Pages are fetched by the (time, user ID) key of the player just before (or
+    after) them rather than by offset, so reading any page only touches that
+    page's entries in the index, however far down the list it is."""
+
+    def __init__(self, db, tournament, name, page_size=PAGE_SIZE):
+        self.db = db
+        self.tournament_id = tournament.id
+        self.table = player_table(tournament)
+        self.name = name
+        self.page_size = page_size
+        self.column = LISTS[name]
+
+    def key(self, row):
+        """The position of a player (row of a page) in the list."""
+        return (row[self.column], row["user_id"])
+
+    async def count(self):
+        row = await self.db.fetchone(
+            "SELECT value FROM counters WHERE tournament_id = ? AND name = ?;",
+            (self.tournament_id, self.name),
+        )
+        return row["value"] if row else 0
+
+    async def page(self, after=None, before=None):
+        """The players following the key after (or preceding the key before)."""
+        if before is not None:
+            rows = await self._fetch("<", "DESC", before)
+            return rows[::-1]
+        return await self._fetch(">", "ASC", after)
+
+    async def key_at(self, position):
+        """The key of the player at a position (counting from 0), if any.
+
+        Used to jump straight to a page; this does step through the index up
+        to that position, but reads nothing else."""
+        row = await self.db.fetchone(
+            "SELECT {0}, user_id FROM {1}"
+            " WHERE tournament_id = ? AND {0} IS NOT NULL"
+            " ORDER BY {0}, user_id LIMIT 1 OFFSET ?;".format(self.column, self.table),
+            (self.tournament_id, position),
+        )
+        return self.key(row) if row else None
+
+    async def export(self, format):
+        """Every player in the list, written to a file in the given format.
+
+        Returns the file (rewound) and how many players are in it."""
+        return await self.db.read(
+            export_query,
+            "SELECT user_id, display_name, signup_time, checkin_time, rating"
+            " FROM {1} WHERE tournament_id = ? AND {0} IS NOT NULL"
+            " ORDER BY {0}, user_id;".format(self.column, self.table),
+            (self.tournament_id,),
+            format,
+        )
+
+    async def _fetch(self, op, direction, key):
+        condition = ""
+        args = [self.tournament_id]
+        if key is not None:
+            condition = " AND ({}, user_id) {} (?, ?)".format(self.column, op)
+            args.extend(key)
+        return await self.db.fetchall(
+            "SELECT {0}, user_id, display_name FROM {3}"
+            " WHERE tournament_id = ? AND {0} IS NOT NULL{1}"
+            " ORDER BY {0} {2}, user_id {2} LIMIT ?;".format(
+                self.column, condition, direction, self.table
+            ),
+            (*args, self.page_size),
+        )
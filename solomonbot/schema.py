@@ -0,0 +1,221 @@
+"""The layout of the bot's database."""
+
+# Every table, with the statements that create it (and its indexes).
+TABLES = {
+    "settings": (
+        """
+        CREATE TABLE settings (
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (guild_id, name)
+        );
+        """,
+    ),
+    "tournaments": (
+        """
+        CREATE TABLE tournaments (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            signups INTEGER NOT NULL DEFAULT 0,
+            checkins INTEGER NOT NULL DEFAULT 0,
+            created_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            closed_time TIMESTAMP DEFAULT NULL
+        );
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS tournaments_by_name"
+        " ON tournaments (guild_id, name);",
+    ),
+    # The players of every tournament that hasn't been archived
+    "signups": (
+        """
+        CREATE TABLE signups (
+            tournament_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            display_name TEXT,
+            signup_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            checkin_time TIMESTAMP DEFAULT NULL,
+            rating REAL DEFAULT NULL,
+            PRIMARY KEY (tournament_id, user_id)
+        );
+        """,
+        # The (time, user ID) keys the lists of players are paged by
+        "CREATE INDEX IF NOT EXISTS signups_by_signup_key"
+        " ON signups (tournament_id, signup_time, user_id);",
+        "CREATE INDEX IF NOT EXISTS signups_by_checkin_key"
+        " ON signups (tournament_id, checkin_time, user_id);",
+    ),
+    # The players of archived tournaments, moved out of signups
+    "archived_signups": (
+        """
+        CREATE TABLE archived_signups (
+            tournament_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            display_name TEXT,
+            signup_time TIMESTAMP,
+            checkin_time TIMESTAMP,
+            rating REAL,
+            PRIMARY KEY (tournament_id, user_id)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS archived_signups_by_signup_key"
+        " ON archived_signups (tournament_id, signup_time, user_id);",
+        "CREATE INDEX IF NOT EXISTS archived_signups_by_checkin_key"
+        " ON archived_signups (tournament_id, checkin_time, user_id);",
+    ),
+    # The number of players signed up to and checked in for each tournament
+    "counters": (
+        """
+        CREATE TABLE counters (
+            tournament_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tournament_id, name)
+        );
+        """,
+    ),
+    "pickbans": (
+        """
+        CREATE TABLE pickbans (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            captain1_id INTEGER NOT NULL,
+            captain2_id INTEGER NOT NULL,
+            pool_name TEXT NOT NULL,
+            pickban_order TEXT NOT NULL,
+            channel_id INTEGER,
+            snapshot TEXT NOT NULL,
+            ruleset TEXT DEFAULT NULL
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS pickbans_by_guild ON pickbans (guild_id);",
+    ),
+    "pickban_actions": (
+        """
+        CREATE TABLE pickban_actions (
+            pickban_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            map TEXT NOT NULL,
+            PRIMARY KEY (pickban_id, seq)
+        ) WITHOUT ROWID;
+        """,
+    ),
+    # Guilds which have their own map pools and rulesets rather than the defaults
+    "catalogs": (
+        """
+        CREATE TABLE catalogs (
+            guild_id INTEGER PRIMARY KEY
+        );
+        """,
+    ),
+    "map_pools": (
+        """
+        CREATE TABLE map_pools (
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            maps TEXT NOT NULL,
+            PRIMARY KEY (guild_id, name)
+        );
+        """,
+    ),
+    "rulesets": (
+        """
+        CREATE TABLE rulesets (
+            guild_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            pool_name TEXT NOT NULL,
+            pickban_order TEXT NOT NULL,
+            PRIMARY KEY (guild_id, name)
+        );
+        """,
+    ),
+    # Every finished pick/ban process; rows are only ever added
+    "pickban_history": (
+        """
+        CREATE TABLE pickban_history (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            ruleset TEXT,
+            pool_name TEXT NOT NULL,
+            pickban_order TEXT NOT NULL,
+            captain1_id INTEGER NOT NULL,
+            captain2_id INTEGER NOT NULL,
+            outcome TEXT NOT NULL,
+            picks TEXT NOT NULL,
+            bans TEXT NOT NULL,
+            selections TEXT,
+            finished_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_ruleset"
+        " ON pickban_history (guild_id, ruleset, finished_time);",
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_pool"
+        " ON pickban_history (guild_id, pool_name, finished_time);",
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_captain1"
+        " ON pickban_history (guild_id, captain1_id, finished_time);",
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_captain2"
+        " ON pickban_history (guild_id, captain2_id, finished_time);",
+        "CREATE INDEX IF NOT EXISTS pickban_history_by_time"
+        " ON pickban_history (guild_id, finished_time);",
+    ),
+    # Totals over pickban_history for each pool and ruleset (kind "pool" or
+    # "ruleset"), kept up to date as drafts are archived
+    "draft_stats": (
+        """
+        CREATE TABLE draft_stats (
+            guild_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, kind, name)
+        ) WITHOUT ROWID;
+        """,
+    ),
+    "map_stats": (
+        """
+        CREATE TABLE map_stats (
+            guild_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            map TEXT NOT NULL,
+            picks INTEGER NOT NULL DEFAULT 0,
+            bans INTEGER NOT NULL DEFAULT 0,
+            plays INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, kind, name, map)
+        ) WITHOUT ROWID;
+        """,
+    ),
+    "shard_leases": (
+        """
+        CREATE TABLE shard_leases (
+            shard_id INTEGER PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+        """,
+    ),
+}
+
+# Columns added to tables since they were first created, with their definitions.
+ADDED_COLUMNS = {
+    "signups": {"rating": "REAL DEFAULT NULL"},
+    "pickbans": {"ruleset": "TEXT DEFAULT NULL"},
+}
+
+# Indexes which have since been replaced by others.
+RETIRED_INDEXES = ("signups_by_signup_time", "signups_by_checkin_time")
+
+
+def create_script():
+    """A script which (re)creates every table, dropping any existing data."""
+    statements = []
+    for table, creates in TABLES.items():
+        statements.append("DROP TABLE IF EXISTS {};".format(table))
+        statements.extend(creates)
+    return "\n".join(statements)
@@ -0,0 +1,165 @@
+"""Keeping pick/ban processes in the database so they survive restarts."""
+import asyncio
+import json
+import sqlite3
+
+from .draft import Draft, compile_order
+from .history import archive, record
+
+# How many journal entries may pile up before the draft is snapshotted (and the
+# entries compacted away); this bounds the work of replaying a draft.
+SNAPSHOT_INTERVAL = 8
+
+
+class SessionStore:
+    """Persists drafts as a snapshot plus an append-only journal of actions.
+
+    Each draft gets a row in 'pickbans' holding its settings and its latest
+    snapshot, and a row in 'pickban_actions' for every journal entry made
+    since then. Finished or cancelled drafts are moved to the archive."""
+
+    def __init__(self, db, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.db = db
+        self.snapshot_interval = snapshot_interval
+        # Drafts whose rows are still waiting to be written
+        self._creating = {}
+
+    async def create(self, draft, guild_id, channel_id):
+        """Start persisting a new draft."""
+        snapshot = json.dumps(draft.snapshot())
+        draft.journal = []
+        draft.guild_id = guild_id
+        draft.channel_id = channel_id
+        creating = self._creating[draft] = asyncio.ensure_future(
+            self.db.batched(
+                _create,
+                guild_id,
+                draft.captains,
+                draft.pool_name,
+                draft.order,
+                channel_id,
+                snapshot,
+                draft.ruleset,
+            )
+        )
+        try:
+            draft.session_id = await creating
+        finally:
+            self._creating.pop(draft, None)
+
+    async def save(self, draft):
+        """Append the draft's new journal entries, snapshotting when due."""
+        if draft.session_id is None or not draft.journal:
+            return
+        entries, draft.journal = draft.journal, []
+        first_seq = draft.seq - len(entries) + 1
+        snapshot = None
+        if draft.seq // self.snapshot_interval != (
+            (first_seq - 1) // self.snapshot_interval
+        ):
+            snapshot = json.dumps(draft.snapshot())
+        await self.db.batched(
+            _append, draft.session_id, first_seq, entries, draft.seq, snapshot
+        )
+
+    async def finish(self, draft, outcome):
+        """Archive a draft that has been completed or cancelled (the outcome).
+
+        The draft stops being persisted in the same transaction, so it is
+        archived exactly once even if the bot stops here. A draft finished
+        while its row is still being created waits for it, so that the row
+        is deleted rather than left to come back on the next restart."""
+        session_id = draft.session_id
+        creating = self._creating.get(draft)
+        if creating is not None:
+            session_id = await creating
+        await self.db.batched(_finish, session_id, record(draft, outcome))
+        draft.session_id = None
+
+    async def clear(self, guild_id):
+        """Forget every persisted draft in a guild."""
+        await self.db.batched(_delete_all, guild_id)
+
+    async def load(self):
+        """Rebuild every persisted draft by replaying its journal."""
+        try:
+            sessions = await self.db.fetchall("SELECT * FROM pickbans;")
+            actions = await self.db.fetchall(
+                "SELECT pickban_id, action, map FROM pickban_actions"
+                " ORDER BY pickban_id, seq;"
+            )
+        except sqlite3.OperationalError:
+            # The tables don't exist until the database has been set up.
+            return []
+        journals = {}
+        for row in actions:
+            journals.setdefault(row["pickban_id"], []).append(
+                (row["action"], row["map"])
+            )
+
+        drafts = []
+        for row in sessions:
+            draft = Draft.restore(
+                (row["captain1_id"], row["captain2_id"]),
+                compile_order(row["pickban_order"]),
+                json.loads(row["snapshot"]),
+                journals.get(row["id"], ()),
+                pool_name=row["pool_name"],
+            )
+            draft.ruleset = row["ruleset"]
+            draft.session_id = row["id"]
+            draft.guild_id = row["guild_id"]
+            draft.channel_id = row["channel_id"]
+            drafts.append(draft)
+        return drafts
+
+
+def _create(c, guild_id, captains, pool_name, order, channel_id, snapshot, ruleset):
+    c.execute(
+        "INSERT INTO pickbans (guild_id, captain1_id, captain2_id,"
+        " pool_name, pickban_order, channel_id, snapshot, ruleset)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+        (guild_id, *captains, pool_name, order, channel_id, snapshot, ruleset),
+    )
+    return c.lastrowid
+
+
+def _append(c, session_id, first_seq, entries, seq, snapshot):
+    if snapshot is not None:
+        # The snapshot already covers these entries (and all earlier ones).
+        c.execute(
+            "UPDATE pickbans SET snapshot = ? WHERE id = ?;", (snapshot, session_id)
+        )
+        c.execute(
+            "DELETE FROM pickban_actions WHERE pickban_id = ? AND seq <= ?;",
+            (session_id, seq),
+        )
+        return
+    c.executemany(
+        "INSERT INTO pickban_actions (pickban_id, seq, action, map)"
+        " VALUES (?, ?, ?, ?);",
+        (
+            (session_id, first_seq + i, action, choice)
+            for i, (action, choice) in enumerate(entries)
+        ),
+    )
+
+
+def _finish(c, session_id, row):
+    if session_id is not None:
+        _delete(c, session_id)
+    archive(c, row)
+
+
+def _delete(c, session_id):
+    c.execute("DELETE FROM pickban_actions WHERE pickban_id = ?;", (session_id,))
+    c.execute("DELETE FROM pickbans WHERE id = ?;", (session_id,))
+
+
+def _delete_all(c, guild_id):
+    c.execute(
+        "DELETE FROM pickban_actions WHERE pickban_id IN"
+        " (SELECT id FROM pickbans WHERE guild_id = ?);",
+        (guild_id,),
+    )
+    c.execute("DELETE FROM pickbans WHERE guild_id = ?;", (guild_id,))
@@ -0,0 +1,82 @@
+"""In-memory cache of the settings table."""
+from .cache import WriteThroughCache
+
+
+class SettingsCache(WriteThroughCache):
+    """Keeps the settings of every guild that uses them in memory.
+
+    A guild's settings are loaded on first use and then kept up to date by
+    writing through the cache; anything that changes the table behind its back
+    has to invalidate it."""
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+
+    async def load(self, guild_id):
+        """(Re)load a guild's settings from the database."""
+
+        def keep(rows):
+            self._data[guild_id] = {r["name"]: r["data"] for r in rows}
+
+        await self._load(
+            lambda: self.db.fetchall(
+                "SELECT name, data FROM settings WHERE guild_id = ?;", (guild_id,)
+            ),
+            keep,
+        )
+
+    async def load_all(self, owned=None):
+        """Load the settings of every guild (for which owned(guild_id) is true)."""
+
+        def keep(rows):
+            for r in rows:
+                if owned is None or owned(r["guild_id"]):
+                    self._data.setdefault(r["guild_id"], {})[r["name"]] = r["data"]
+
+        await self._load(
+            lambda: self.db.fetchall("SELECT guild_id, name, data FROM settings;"),
+            keep,
+        )
+
+    async def get(self, guild_id, name):
+        """Get the value of a setting, or None if it has never been set."""
+        data = self._data.get(guild_id)
+        if data is None:
+            self.misses += 1
+            await self.load(guild_id)
+            data = self._data.get(guild_id)
+            if data is None:
+                # Lost a race with a write; the database is authoritative.
+                row = await self.db.fetchone(
+                    "SELECT data FROM settings WHERE guild_id = ? AND name = ?;",
+                    (guild_id, name),
+                )
+                return row["data"] if row else None
+        else:
+            self.hits += 1
+        return data.get(name)
+
+    async def set(self, guild_id, name, data):
+        """Store a setting in the database and the cache."""
+        await self.db.execute(
+            "INSERT OR REPLACE INTO settings (guild_id, name, data) VALUES (?, ?, ?);",
+            (guild_id, name, data),
+        )
+        self._changed()
+        if guild_id in self._data:
+            self._data[guild_id][name] = data
+
+    def invalidate(self, guild_id=None):
+        """Forget a guild's cached settings (or everyone's)."""
+        self._changed()
+        if guild_id is None:
+            self._data.clear()
+        else:
+            self._data.pop(guild_id, None)
+
+    def items(self, guild_id):
+        """The cached settings of a guild, if they have been loaded."""
+        return sorted(self._data.get(guild_id, {}).items())
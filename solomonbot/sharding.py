@@ -0,0 +1,174 @@
+"""Running the bot as several processes, each connected for a range of shards."""
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+log = logging.getLogger(__name__)
+
+# A process holds a lease on each of its shards, renewing it well before it
+# expires. A process that dies keeps its shards locked out for at most this
+# long, after which a replacement can take them over.
+LEASE_DURATION = 60
+LEASE_RENEWAL = 15
+# The exit status of a worker that stopped because it lost its leases, so that
+# it's restarted (and waits to take its shards back) rather than left stopped.
+LEASE_LOST = 3
+
+
+class ShardLeaseError(Exception):
+    """The shards are already being run by another process."""
+
+
+def shard_for(guild_id, shard_count):
+    """The shard Discord delivers a guild's events to."""
+    return (guild_id >> 22) % shard_count
+
+
+def split_shards(shard_count, processes):
+    """Divide the shards into contiguous ranges, one for each process."""
+    return [
+        list(range(i * shard_count // processes, (i + 1) * shard_count // processes))
+        for i in range(processes)
+    ]
+
+
+class ShardLeases:
+    """Claims a set of shards in the database for the current process.
+
+    Every guild belongs to exactly one shard, so as long as no two processes
+    hold the same shard, no guild's commands, drafts or signups are ever
+    handled by two processes at once."""
+
+    def __init__(self, db, shard_ids, shard_count, duration=LEASE_DURATION):
+        self.db = db
+        self.shard_ids = tuple(shard_ids)
+        self.shard_count = shard_count
+        self.duration = duration
+        self.owner = "{}:{}".format(socket.gethostname(), os.getpid())
+        self.lost = False
+
+    def owns(self, guild_id):
+        """Whether a guild's commands are handled by this process."""
+        return shard_for(guild_id, self.shard_count) in self.shard_ids
+
+    async def acquire(self, wait=LEASE_DURATION * 2, retry=5):
+        """Take the leases, waiting for a dead process's leases to run out."""
+        deadline = time.time() + wait
+        while True:
+            holders = await self.db.transaction(_acquire, self, time.time())
+            if not holders:
+                return
+            if time.time() >= deadline:
+                raise ShardLeaseError(
+                    "Shards are held by other processes: {}".format(
+                        ", ".join(
+                            "{} ({})".format(s, o) for s, o in sorted(holders.items())
+                        )
+                    )
+                )
+            log.info("Waiting for shard leases held by %s", holders)
+            await asyncio.sleep(retry)
+
+    async def renew(self):
+        """Extend the leases, returning False if any of them have been lost."""
+        renewed = await self.db.transaction(_renew, self, time.time())
+        if renewed != len(self.shard_ids):
+            self.lost = True
+        return not self.lost
+
+    async def release(self):
+        await self.db.transaction(_release, self)
+
+
+def _acquire(c, leases, now):
+    placeholders = ", ".join("?" for _ in leases.shard_ids)
+    holders = {
+        row["shard_id"]: row["owner"]
+        for row in c.execute(
+            "SELECT shard_id, owner FROM shard_leases"
+            " WHERE shard_id IN ({}) AND owner != ? AND expires > ?;".format(
+                placeholders
+            ),
+            (*leases.shard_ids, leases.owner, now),
+        )
+    }
+    if holders:
+        return holders
+    c.executemany(
+        "INSERT OR REPLACE INTO shard_leases (shard_id, owner, expires)"
+        " VALUES (?, ?, ?);",
+        ((s, leases.owner, now + leases.duration) for s in leases.shard_ids),
+    )
+    return {}
+
+
+def _renew(c, leases, now):
+    # Leases which have gone missing (e.g. the database was wiped) are simply
+    # taken again, as long as nobody else has claimed them in the meantime.
+    c.executemany(
+        "INSERT INTO shard_leases (shard_id, owner, expires) VALUES (?, ?, ?)"
+        " ON CONFLICT (shard_id) DO UPDATE SET expires = excluded.expires"
+        " WHERE owner = excluded.owner;",
+        ((s, leases.owner, now + leases.duration) for s in leases.shard_ids),
+    )
+    return c.rowcount
+
+
+def _release(c, leases):
+    c.execute("DELETE FROM shard_leases WHERE owner = ?;", (leases.owner,))
+
+
+def run_worker(key, shard_ids, shard_count, path):
+    """Entry point of a worker process."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s shards {}-{} %(levelname)s %(message)s".format(
+            shard_ids[0], shard_ids[-1]
+        ),
+    )
+    import solomonbot
+
+    solomonbot.run_sharded(key, shard_ids, shard_count, path)
+
+
+def launch(key, shard_count, processes, path, restart_delay=5):
+    """Run the shards across several worker processes, restarting any that die.
+
+    A worker that exits cleanly (e.g. after the shutdown command) is not
+    restarted. One that loses its leases exits with LEASE_LOST, and is."""
+    context = multiprocessing.get_context("spawn")
+    ranges = split_shards(shard_count, processes)
+    workers = {}
+
+    def start(i):
+        worker = context.Process(
+            target=run_worker,
+            args=(key, ranges[i], shard_count, path),
+            name="solomonbot-shards-{}-{}".format(ranges[i][0], ranges[i][-1]),
+        )
+        worker.start()
+        workers[i] = worker
+
+    for i, shard_ids in enumerate(ranges):
+        if shard_ids:
+            start(i)
+    try:
+        while workers:
+            time.sleep(restart_delay)
+            for i, worker in list(workers.items()):
+                if worker.is_alive():
+                    continue
+                del workers[i]
+                if worker.exitcode != 0:
+                    log.warning(
+                        "%s exited with %s, restarting", worker.name, worker.exitcode
+                    )
+                    start(i)
+    except KeyboardInterrupt:
+        for worker in workers.values():
+            worker.terminate()
+        for worker in workers.values():
+            worker.join()
@@ -0,0 +1,138 @@
+"""Estimating how a ruleset plays out, by running it many times over at random.
+
+This needs numpy, which is an optional dependency of the bot (see
+requirements.txt); without it, simulate() raises SimulationError saying so."""
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # Only simulations need it
+    np = None
+
+from .draft import BAN, PICK, SWAP
+
+# Trials are run this many at a time, which bounds the memory used to a few
+# arrays of CHUNK_SIZE x (maps in the pool) numbers.
+CHUNK_SIZE = 100000
+MAX_TRIALS = 10000000
+
+Outcome = namedtuple("Outcome", "trials played picked banned")
+Outcome.__doc__ = """How often each map was played, picked and banned.
+
+Each of 'played', 'picked' and 'banned' maps every map in the pool to the
+fraction of trials it happened in. Maps chosen by r steps count as picked,
+as they do in a Draft."""
+
+
+class SimulationError(ValueError):
+    """The simulation can't be run as asked."""
+
+
+def simulate(pool, program, trials, weights=None, subpool_size=None, seed=None):
+    """Run a pick/ban program many times with captains choosing at random.
+
+    Follows the same rules as Draft: p and b steps are taken by the captains
+    and r steps at random, and a final digit and ?s choose at random from the
+    last picks. With subpool_size, every trial draws that many maps at random
+    from the pool to use, as pickban does for a #/pool. Captains pick each map
+    left with probability proportional to its weight (1 unless given) and ban
+    it in proportion to 1 / weight, so they pick the maps they prefer and ban
+    the rest. (Both captains have the same preferences, so ~ makes no
+    difference.)
+
+    Rather than a loop per trial, a chunk of trials is run side by side, with
+    every step a single batch of draws across all of them."""
+    if np is None:
+        raise SimulationError("Simulations need NumPy, which isn't installed.")
+    names = list(pool)
+    available = len(names) if subpool_size is None else subpool_size
+    if available > len(names):
+        raise SimulationError("The pool only has {} maps.".format(len(names)))
+    takes = [action for action in program.steps if action != SWAP]
+    if len(takes) > available:
+        raise SimulationError(
+            "The order takes {} maps, but only {} are available.".format(
+                len(takes), available
+            )
+        )
+    pick_count = sum(action != BAN for action in takes)
+    if program.subpool_selections > min(program.subpool_size, pick_count):
+        raise SimulationError(
+            "The order selects more maps than there are picks to select from."
+        )
+    weights = np.array([(weights or {}).get(name, 1.0) for name in names])
+    # NaN compares false with everything, so has to be ruled out separately
+    if not np.isfinite(weights).all() or (weights <= 0).any():
+        raise SimulationError("Weights have to be finite numbers greater than 0.")
+
+    rng = np.random.default_rng(seed)
+    counts = {
+        "played": np.zeros(len(names), dtype=np.int64),
+        "picked": np.zeros(len(names), dtype=np.int64),
+        "banned": np.zeros(len(names), dtype=np.int64),
+    }
+    for start in range(0, trials, CHUNK_SIZE):
+        _run_chunk(
+            rng,
+            min(CHUNK_SIZE, trials - start),
+            takes,
+            weights,
+            available,
+            program,
+            counts,
+        )
+    return Outcome(
+        trials,
+        *(
+            dict(zip(names, (counts[key] / max(trials, 1)).tolist()))
+            for key in ("played", "picked", "banned")
+        )
+    )
+
+
+def _run_chunk(rng, n, takes, weights, available, program, counts):
+    m = len(weights)
+    if available < m:
+        # Each trial keeps the maps with its `available` smallest random keys.
+        keys = rng.random((n, m))
+        kept = np.argpartition(keys, available - 1, axis=1)[:, :available]
+        left = np.zeros((n, m), dtype=bool)
+        np.put_along_axis(left, kept, True, axis=1)
+    else:
+        left = np.ones((n, m), dtype=bool)
+
+    rows = np.arange(n)
+    by_action = {PICK: weights, BAN: 1 / weights}
+    uniform = np.ones(m)
+    picks = []
+    for action in takes:
+        taken = _draw(rng, left, by_action.get(action, uniform))
+        left[rows, taken] = False
+        if action == BAN:
+            counts["banned"] += np.bincount(taken, minlength=m)
+        else:
+            picks.append(taken)
+    if not picks:
+        return
+    picks = np.stack(picks, axis=1)
+    counts["picked"] += np.bincount(picks.ravel(), minlength=m)
+
+    # As with Draft.preserved_picks and Draft.subpool
+    size = min(program.subpool_size, picks.shape[1])
+    if not size:
+        counts["played"] += np.bincount(picks.ravel(), minlength=m)
+        return
+    preserved = picks[:, :-size]
+    order = np.argsort(rng.random((n, size)), axis=1)
+    selected = np.take_along_axis(
+        picks[:, -size:], order[:, : program.subpool_selections], axis=1
+    )
+    counts["played"] += np.bincount(preserved.ravel(), minlength=m)
+    counts["played"] += np.bincount(selected.ravel(), minlength=m)
+
+
+def _draw(rng, left, weights):
+    """One map for every trial, from those it has left, in proportion to weight."""
+    cumulative = np.cumsum(left * weights, axis=1)
+    targets = rng.random(len(left)) * cumulative[:, -1]
+    return (cumulative <= targets[:, None]).sum(axis=1)
@@ -0,0 +1,126 @@
+"""Splitting players into teams of (nearly) equal size and strength."""
+from bisect import bisect_left, insort
+import heapq
+
+# Swaps which would even teams out by less than this aren't worth making.
+EPSILON = 1e-9
+
+
+class TeamError(ValueError):
+    """The players can't be split as asked."""
+
+
+def team_sizes(player_count, team_count):
+    """How many players each team gets; sizes differ by at most one."""
+    size, extra = divmod(player_count, team_count)
+    return [size + 1 if t < extra else size for t in range(team_count)]
+
+
+def balance(ratings, team_count, pinned=None, max_swaps=10000):
+    """Split players into teams of equal size with total ratings as close as possible.
+
+    ratings maps each player to their rating, and pinned maps players who
+    must be on a particular team (e.g. captains) to its index. Returns a list
+    of teams, each a list of players from highest rated to lowest.
+
+    Players are first dealt out greedily, highest rated first, each to the
+    weakest team that still has room. The split is then refined by swapping
+    pairs of unpinned players between teams wherever that brings the teams'
+    totals closer together, always picking the swap which best evens out the
+    pair of teams involved."""
+    pinned = pinned or {}
+    if team_count < 1:
+        raise TeamError("There has to be at least one team.")
+    if len(ratings) < team_count:
+        raise TeamError(
+            "Not enough players for {} teams: only {}.".format(team_count, len(ratings))
+        )
+
+    teams = [[] for _ in range(team_count)]
+    for player, team in pinned.items():
+        if not 0 <= team < team_count:
+            raise TeamError("There is no team {}.".format(team + 1))
+        teams[team].append(player)
+
+    # The teams with the most pinned players get the extra places.
+    by_pinned = sorted(range(team_count), key=lambda t: -len(teams[t]))
+    capacity = [0] * team_count
+    for team, size in zip(by_pinned, team_sizes(len(ratings), team_count)):
+        if len(teams[team]) > size:
+            raise TeamError(
+                "Too many players pinned to team {}: at most {} fit.".format(
+                    team + 1, size
+                )
+            )
+        capacity[team] = size
+
+    totals = [sum(ratings[p] for p in team) for team in teams]
+    heap = [(totals[t], t) for t in range(team_count) if len(teams[t]) < capacity[t]]
+    heapq.heapify(heap)
+    free = sorted((p for p in ratings if p not in pinned), key=lambda p: -ratings[p])
+    for player in free:
+        total, team = heapq.heappop(heap)
+        teams[team].append(player)
+        totals[team] = total + ratings[player]
+        if len(teams[team]) < capacity[team]:
+            heapq.heappush(heap, (totals[team], team))
+
+    # Each team's unpinned players, as (rating, player) in rating order
+    swappable = [
+        sorted((ratings[p], p) for p in team if p not in pinned) for team in teams
+    ]
+    for _ in range(max_swaps):
+        swap = _best_swap(totals, swappable)
+        if swap is None:
+            break
+        high, low, a, b = swap
+        swappable[high].remove(a)
+        swappable[low].remove(b)
+        insort(swappable[high], b)
+        insort(swappable[low], a)
+        totals[high] += b[0] - a[0]
+        totals[low] += a[0] - b[0]
+
+    result = []
+    for team, members in zip(teams, swappable):
+        team_pinned = [p for p in team if p in pinned]
+        result.append(
+            sorted(team_pinned, key=lambda p: -ratings[p])
+            + [p for _, p in reversed(members)]
+        )
+    return result
+
+
+def _best_swap(totals, swappable):
+    """A swap between two teams which evens them out, or None if there isn't one.
+
+    Teams are tried strongest against weakest first, and the first pair with
+    any improving swap is used. Swapping a player rated x on the stronger
+    team for one rated y on the weaker moves d = x - y between them, which
+    helps if 0 < d < gap and helps most when d is gap / 2."""
+    order = sorted(range(len(totals)), key=lambda t: totals[t])
+    for high in reversed(order):
+        for low in order:
+            gap = totals[high] - totals[low]
+            if gap <= EPSILON:
+                break
+            swap = _best_swap_between(high, low, gap, swappable)
+            if swap is not None:
+                return swap
+    return None
+
+
+def _best_swap_between(high, low, gap, swappable):
+    best = None
+    best_gain = EPSILON
+    candidates = swappable[low]
+    keys = [rating for rating, _ in candidates]
+    for a in swappable[high]:
+        i = bisect_left(keys, a[0] - gap / 2)
+        for j in (i - 1, i):
+            if 0 <= j < len(candidates):
+                d = a[0] - keys[j]
+                gain = d * (gap - d)
+                if gain > best_gain:
+                    best, best_gain = (high, low, a, candidates[j]), gain
+    return best
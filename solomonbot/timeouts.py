@@ -0,0 +1,92 @@
+"""Running callbacks after a delay, for any number of timers, from one task."""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Calls coroutine functions at set times, driven by a heap of deadlines.
+
+    Every timer has a key, and scheduling a key again replaces its timer.
+    Replaced and cancelled timers are left in the heap and skipped when they
+    come up, so scheduling is O(log n) and cancelling O(1); the heap is
+    rebuilt if they come to outnumber the live timers. A single task sleeps
+    until the earliest deadline, however many timers there are, and starts
+    each due callback as a task of its own."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.fired = 0
+        self._heap = []
+        self._timers = {}
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._timers)
+
+    def schedule(self, key, delay, callback):
+        """Call callback() in delay seconds, replacing any timer for the key."""
+        entry = (self.clock() + delay, next(self._seq), key)
+        self._timers[key] = (entry, callback)
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._timers) + 64:
+            self._heap = [entry for entry, _ in self._timers.values()]
+            heapq.heapify(self._heap)
+        if self._wakeup is not None and self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        self._timers.pop(key, None)
+
+    def remaining(self, key):
+        """Seconds until a key's timer goes off, or None if it has none."""
+        timer = self._timers.get(key)
+        if timer is None:
+            return None
+        return max(timer[0][0] - self.clock(), 0)
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._wakeup = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            for callback in self._due():
+                self.fired += 1
+                asyncio.ensure_future(callback()).add_done_callback(_log_failure)
+            timeout = self._heap[0][0] - self.clock() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _due(self):
+        due = []
+        now = self.clock()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            key = entry[2]
+            timer = self._timers.get(key)
+            if timer is not None and timer[0] is entry:
+                del self._timers[key]
+                due.append(timer[1])
+        return due
+
+
+def _log_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Timer callback failed", exc_info=task.exception())
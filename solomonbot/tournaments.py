@@ -0,0 +1,231 @@
+"""Tournaments, each with its own signups, of which a guild may run several."""
+from collections import namedtuple
+import re
+import sqlite3
+
+from .cache import WriteThroughCache
+
+CREATED = "created"
+OPEN = "open"
+CLOSED = "closed"
+ARCHIVED = "archived"
+
+# What can be opened (and closed again) while a tournament is open.
+PHASES = ("signups", "checkins")
+
+NAME = re.compile(r"[A-Za-z][\w-]{0,31}")
+
+Tournament = namedtuple("Tournament", "id guild_id name status signups checkins")
+Tournament.__doc__ = """A tournament, as it was when looked up.
+
+Tournaments go from created to open to closed to archived. 'signups' and
+'checkins' say whether players can currently sign up (or withdraw) and check
+in; only open tournaments have either."""
+
+
+class TournamentError(ValueError):
+    """A tournament can't be found or changed as asked."""
+
+
+def player_table(tournament):
+    """The table a tournament's players are kept in.
+
+    Archiving a tournament moves its players out of 'signups', which only
+    ever holds those of tournaments still going."""
+    return "archived_signups" if tournament.status == ARCHIVED else "signups"
+
+
+class TournamentStore(WriteThroughCache):
+    """The tournaments of every guild, loaded once and then written through.
+
+    There are only ever a few per guild, and every signup and checkin needs to
+    know which are open, so all of them are kept in memory."""
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._tournaments = {}
+
+    async def load(self):
+        """(Re)load every guild's tournaments."""
+        await self._load_everything(
+            lambda: self.db.fetchall(
+                "SELECT id, guild_id, name, status, signups, checkins"
+                " FROM tournaments;"
+            ),
+            self._keep,
+        )
+
+    def _keep(self, rows):
+        self._tournaments = {}
+        for row in rows:
+            tournament = _tournament(row)
+            self._tournaments.setdefault(tournament.guild_id, {})[
+                tournament.name
+            ] = tournament
+
+    async def all(self, guild_id):
+        """A guild's tournaments, oldest first."""
+        await self._ensure_loaded()
+        return sorted(self._tournaments.get(guild_id, {}).values())
+
+    async def get(self, guild_id, name):
+        """A guild's tournament with the given name, or None."""
+        await self._ensure_loaded()
+        return self._tournaments.get(guild_id, {}).get(name)
+
+    async def find(self, guild_id, name=None, phase=None):
+        """The tournament a command is about: the one named, or else the only
+        one not yet archived (with the given phase open, if any).
+
+        Raises TournamentError, saying why, if there isn't exactly one."""
+        if name is not None:
+            tournament = await self.get(guild_id, name)
+            if tournament is None:
+                raise TournamentError("There's no tournament called `{}`.".format(name))
+            if phase and not getattr(tournament, phase):
+                raise TournamentError(
+                    "{} for `{}` are not currently enabled.".format(
+                        phase.capitalize(), name
+                    )
+                )
+            return tournament
+        candidates = [
+            t
+            for t in await self.all(guild_id)
+            if t.status != ARCHIVED and (not phase or getattr(t, phase))
+        ]
+        if not candidates:
+            if phase:
+                raise TournamentError(
+                    "{} are not currently enabled.".format(phase.capitalize())
+                )
+            raise TournamentError("There are no tournaments at the moment.")
+        if len(candidates) > 1:
+            raise TournamentError(
+                "There are several tournaments; say which: {}.".format(
+                    ", ".join("`{}`".format(t.name) for t in candidates)
+                )
+            )
+        return candidates[0]
+
+    async def create(self, guild_id, name):
+        if not NAME.fullmatch(name):
+            raise TournamentError(
+                "Tournament names start with a letter, and have up to 32 letters,"
+                " digits, - and _."
+            )
+        try:
+            return await self._change(guild_id, _create, name)
+        except sqlite3.IntegrityError:
+            raise TournamentError(
+                "There's already a tournament called `{}`.".format(name)
+            )
+
+    async def open(self, guild_id, name, phase="signups"):
+        """Open a tournament (if need be) for signups or checkins."""
+        if phase not in PHASES:
+            raise TournamentError("Only `signups` and `checkins` can be opened.")
+        return await self._change(guild_id, _set_phase, name, phase, 1)
+
+    async def close(self, guild_id, name, phase=None):
+        """Stop signups or checkins, or with no phase, close the tournament."""
+        if phase is None:
+            return await self._change(guild_id, _close, name)
+        if phase not in PHASES:
+            raise TournamentError("Only `signups` and `checkins` can be closed.")
+        return await self._change(guild_id, _set_phase, name, phase, 0)
+
+    async def archive(self, guild_id, name):
+        """Move a closed tournament's players out of the signups table."""
+        return await self._change(guild_id, _archive, name)
+
+    async def _change(self, guild_id, change, name, *args):
+        # Changes check the tournament as it is in the database, not the cache.
+        row = await self.db.transaction(change, guild_id, name, *args)
+        tournament = _tournament(row)
+        self._changed()
+        if self._loaded:
+            self._tournaments.setdefault(guild_id, {})[name] = tournament
+        return tournament
+
+    def invalidate(self):
+        """Forget every tournament, to be loaded again on next use."""
+        self._forget()
+        self._tournaments = {}
+
+
+def _tournament(row):
+    return Tournament(
+        row["id"],
+        row["guild_id"],
+        row["name"],
+        row["status"],
+        bool(row["signups"]),
+        bool(row["checkins"]),
+    )
+
+
+def _read(c, guild_id, name):
+    row = c.execute(
+        "SELECT * FROM tournaments WHERE guild_id = ? AND name = ?;",
+        (guild_id, name),
+    ).fetchone()
+    if row is None:
+        raise TournamentError("There's no tournament called `{}`.".format(name))
+    return row
+
+
+def _read_running(c, guild_id, name):
+    row = _read(c, guild_id, name)
+    if row["status"] not in (CREATED, OPEN):
+        raise TournamentError("`{}` has already been {}.".format(name, row["status"]))
+    return row
+
+
+def _create(c, guild_id, name):
+    c.execute(
+        "INSERT INTO tournaments (guild_id, name, status) VALUES (?, ?, ?);",
+        (guild_id, name, CREATED),
+    )
+    return _read(c, guild_id, name)
+
+
+def _set_phase(c, guild_id, name, phase, on):
+    row = _read_running(c, guild_id, name)
+    # Opening either phase opens the tournament; closing one leaves it as it was.
+    c.execute(
+        "UPDATE tournaments SET status = ?, {} = ? WHERE id = ?;".format(phase),
+        (OPEN if on else row["status"], on, row["id"]),
+    )
+    return _read(c, guild_id, name)
+
+
+def _close(c, guild_id, name):
+    row = _read_running(c, guild_id, name)
+    c.execute(
+        "UPDATE tournaments SET status = ?, signups = 0, checkins = 0,"
+        " closed_time = CURRENT_TIMESTAMP WHERE id = ?;",
+        (CLOSED, row["id"]),
+    )
+    return _read(c, guild_id, name)
+
+
+def _archive(c, guild_id, name):
+    row = _read(c, guild_id, name)
+    if row["status"] != CLOSED:
+        raise TournamentError(
+            "Only closed tournaments can be archived, and `{}` is {}.".format(
+                name, row["status"]
+            )
+        )
+    c.execute(
+        "INSERT INTO archived_signups (tournament_id, user_id, guild_id,"
+        " display_name, signup_time, checkin_time, rating)"
+        " SELECT tournament_id, user_id, guild_id,"
+        " display_name, signup_time, checkin_time, rating"
+        " FROM signups WHERE tournament_id = ?;",
+        (row["id"],),
+    )
+    c.execute("DELETE FROM signups WHERE tournament_id = ?;", (row["id"],))
+    c.execute("UPDATE tournaments SET status = ? WHERE id = ?;", (ARCHIVED, row["id"]))
+    return _read(c, guild_id, name)
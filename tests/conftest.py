@@ -0,0 +1,29 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# The benchmarks' stand-ins for Discord objects serve the tests just as well.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks"))
+
+import solomonbot  # noqa: E402
+
+
+@pytest.fixture
+def run():
+    """Run coroutines to completion on an event loop kept for the whole test."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop.run_until_complete
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def bot(run, tmp_path):
+    """The bot, started up against a new database (but not connected)."""
+    run(solomonbot.start_up(str(tmp_path / "solomonbot.sqlite3")))
+    yield solomonbot
+    solomonbot.db.close()
@@ -0,0 +1,79 @@
+import asyncio
+
+from solomonbot.cache import WriteThroughCache
+
+
+class Store(WriteThroughCache):
+    """A cache of one value, where changes can land in the middle of a read."""
+
+    def __init__(self):
+        super().__init__(db={"value": "old"})
+        self.value = None
+        self.reads = 0
+        self.during_read = None
+
+    async def load(self):
+        await self._load_everything(self._read, self._keep)
+
+    async def get(self):
+        await self._ensure_loaded()
+        return self.value
+
+    async def change(self, value):
+        self.db["value"] = value
+        self._changed()
+        if self._loaded:
+            self.value = value
+
+    async def _read(self):
+        self.reads += 1
+        value = self.db["value"]
+        await asyncio.sleep(0)
+        if self.during_read:
+            await self.during_read()
+        return value
+
+    def _keep(self, value):
+        self.value = value
+
+
+def test_a_change_made_during_a_load_isnt_clobbered(run):
+    store = Store()
+
+    async def change_once():
+        store.during_read = None
+        await store.change("new")
+
+    store.during_read = change_once
+    assert run(store.get()) == "new"
+    # The first read was thrown away, as it was from before the change.
+    assert store.reads == 2
+
+
+def test_the_cache_is_only_loaded_once(run):
+    store = Store()
+    assert run(store.get()) == "old"
+    run(store.change("new"))
+    assert run(store.get()) == "new"
+    assert store.reads == 1
+
+
+def test_a_forgotten_cache_is_loaded_again(run):
+    store = Store()
+    run(store.get())
+    store.db["value"] = "behind its back"
+    store._forget()
+    assert run(store.get()) == "behind its back"
+    assert store.reads == 2
+
+
+def test_a_load_racing_an_invalidation_is_thrown_away(run):
+    store = Store()
+
+    async def forget():
+        store.during_read = None
+        store._forget()
+
+    store.during_read = forget
+    assert not run(store._load(store._read, store._keep))
+    assert store.value is None
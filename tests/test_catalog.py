@@ -0,0 +1,66 @@
+import pytest
+
+from solomonbot.catalog import (
+    DEFAULT_CATALOG,
+    CatalogError,
+    add_maps,
+    remove_maps,
+    remove_pool,
+    remove_ruleset,
+    set_ruleset,
+)
+
+
+@pytest.fixture
+def catalog():
+    return DEFAULT_CATALOG.editable()
+
+
+def test_pools_used_by_rulesets_cant_be_removed(catalog):
+    pools, rulesets = catalog
+    with pytest.raises(CatalogError) as e:
+        remove_pool(pools, rulesets, "ctf-ladder")
+    assert "`ctf-ladder`, `ctf-ladder-bans`" in str(e.value)
+    assert "ctf-ladder" in pools
+
+    remove_ruleset(pools, rulesets, "ctf-ladder")
+    remove_ruleset(pools, rulesets, "ctf-ladder-bans")
+    remove_pool(pools, rulesets, "ctf-ladder")
+    assert "ctf-ladder" not in pools
+
+
+def test_a_ruleset_using_part_of_a_pool_still_uses_it(catalog):
+    pools, rulesets = catalog
+    set_ruleset(pools, rulesets, "quick", "3/arena", "bp")
+    with pytest.raises(CatalogError):
+        remove_pool(pools, rulesets, "arena")
+
+
+def test_removing_the_last_maps_of_a_used_pool_is_refused(catalog):
+    pools, rulesets = catalog
+    with pytest.raises(CatalogError):
+        remove_maps(pools, rulesets, "byo5", list(pools["byo5"]))
+    remove_maps(pools, rulesets, "byo5", ["coral"])
+    assert "Coral" not in pools["byo5"]
+    remove_maps(pools, rulesets, "tdm", list(pools["tdm"]))
+    assert not pools["tdm"]
+
+
+def test_maps_have_to_be_named_to_be_added(catalog):
+    pools, rulesets = catalog
+    with pytest.raises(CatalogError):
+        add_maps(pools, rulesets, "new", ())
+    assert "new" not in pools
+    add_maps(pools, rulesets, "new", ("Alpha", "Beta"))
+    add_maps(pools, rulesets, "new", ("alpha", "Gamma"))
+    assert pools["new"] == {"Alpha", "Beta", "Gamma"}
+
+
+def test_removing_what_isnt_there_is_refused(catalog):
+    pools, rulesets = catalog
+    with pytest.raises(CatalogError):
+        remove_pool(pools, rulesets, "nowhere")
+    with pytest.raises(CatalogError):
+        remove_maps(pools, rulesets, "arena", ["Nowhere"])
+    with pytest.raises(CatalogError):
+        remove_ruleset(pools, rulesets, "nothing")
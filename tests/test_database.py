@@ -0,0 +1,110 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from solomonbot.database import Database
+
+
+@pytest.fixture
+def db(run, tmp_path):
+    db = Database(str(tmp_path / "test.sqlite3"))
+    run(db.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, value TEXT);"))
+    batches = db.batches = []
+    transaction_batch = db._transaction_batch
+
+    def counting(calls):
+        batches.append(len(calls))
+        return transaction_batch(calls)
+
+    db._transaction_batch = counting
+    yield db
+    db.close()
+
+
+def insert(c, id, value):
+    c.execute("INSERT INTO t (id, value) VALUES (?, ?);", (id, value))
+    return c.lastrowid
+
+
+def values(run, db):
+    return [tuple(r) for r in run(db.fetchall("SELECT id, value FROM t ORDER BY id;"))]
+
+
+def test_writes_made_together_share_one_commit(run, db):
+    async def writes():
+        return await asyncio.gather(*(db.batched(insert, i, str(i)) for i in range(10)))
+
+    assert run(writes()) == list(range(10))
+    assert db.batches == [10]
+    assert values(run, db) == [(i, str(i)) for i in range(10)]
+
+
+def test_writes_see_the_ones_before_them(run, db):
+    def count(c):
+        return c.execute("SELECT COUNT(*) FROM t;").fetchone()[0]
+
+    async def writes():
+        return await asyncio.gather(
+            db.batched(insert, 1, "a"), db.batched(count), db.batched(insert, 2, "b")
+        )
+
+    assert run(writes()) == [1, 1, 2]
+
+
+def test_a_failing_write_only_undoes_itself(run, db):
+    def insert_then_fail(c):
+        insert(c, 2, "undone")
+        raise ValueError("no")
+
+    async def writes():
+        return await asyncio.gather(
+            db.batched(insert, 1, "a"),
+            db.batched(insert_then_fail),
+            db.batched(insert, 1, "duplicate"),
+            db.batched(insert, 3, "c"),
+            return_exceptions=True,
+        )
+
+    first, failed, duplicate, last = run(writes())
+    assert (first, last) == (1, 3)
+    assert isinstance(failed, ValueError)
+    assert isinstance(duplicate, sqlite3.IntegrityError)
+    assert db.batches == [4]
+    assert values(run, db) == [(1, "a"), (3, "c")]
+
+
+def test_batches_are_limited_in_size(run, db):
+    db.batch_limit = 3
+
+    async def writes():
+        return await asyncio.gather(*(db.batched(insert, i, "x") for i in range(7)))
+
+    assert run(writes()) == list(range(7))
+    assert db.batches == [3, 3, 1]
+
+
+def test_writes_made_after_a_batch_has_gone_go_in_the_next(run, db):
+    async def writes():
+        first = asyncio.ensure_future(db.batched(insert, 1, "a"))
+        await asyncio.sleep(db.batch_window * 2)
+        second = db.batched(insert, 2, "b")
+        return await asyncio.gather(first, second)
+
+    assert run(writes()) == [1, 2]
+    assert db.batches == [1, 1]
+
+
+def test_every_caller_hears_of_a_batch_that_fails(run, db):
+    def failing(calls):
+        raise sqlite3.OperationalError("database is locked")
+
+    db._transaction_batch = failing
+
+    async def writes():
+        return await asyncio.gather(
+            *(db.batched(insert, i, "x") for i in range(3)), return_exceptions=True
+        )
+
+    assert all(isinstance(e, sqlite3.OperationalError) for e in run(writes()))
+    assert values(run, db) == []
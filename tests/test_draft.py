@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+from solomonbot.catalog import DEFAULT_CATALOG
+from solomonbot.draft import (
+    BAN,
+    PICK,
+    RANDOM,
+    SWAP,
+    Draft,
+    NotInPool,
+    NotYourTurn,
+    OrderError,
+    PoolExhausted,
+    WrongAction,
+    compile_order,
+)
+
+POOL = ["Map{}".format(i) for i in range(12)]
+
+
+def fuzzed_orders(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        order = "".join(rng.choice("pbr~") for _ in range(rng.randint(1, 8)))
+        picks = sum(action != "b" for action in order if action != "~")
+        if picks and rng.random() < 0.3:
+            size = rng.randint(1, min(picks, 9))
+            order += str(size) + "?" * rng.randint(1, size)
+        yield order
+
+
+def state(draft):
+    return (
+        draft.cursor,
+        draft.seq,
+        draft.remaining,
+        draft.picks,
+        draft.bans,
+        draft.selections,
+        draft.next_action,
+        draft.next_captain if not draft.complete else None,
+    )
+
+
+def test_compile_order():
+    program = compile_order("pb~r3??")
+    assert program.steps == (PICK, BAN, SWAP, RANDOM)
+    assert program.subpool_size == 3
+    assert program.subpool_selections == 2
+    assert compile_order("pbpb") == ("pbpb", (PICK, BAN, PICK, BAN), 0, 0)
+
+
+@pytest.mark.parametrize("order", ["pbx", "pb?", "p3?p", "p3?4?", "p2??x"])
+def test_compile_order_rejects_invalid_orders(order):
+    with pytest.raises(OrderError):
+        compile_order(order)
+
+
+def test_select_takes_turns():
+    draft = Draft(("alice", "bob"), POOL, compile_order("bp"))
+    assert draft.select("alice", BAN, "map3") == "Map3"
+    assert draft.select("bob", PICK, "Map4") == "Map4"
+    assert draft.complete
+    assert draft.bans == ["Map3"]
+    assert draft.picks == ["Map4"]
+    assert "Map3" not in draft.pool and "Map4" not in draft.pool
+    assert draft.journal == [(BAN, "Map3"), (PICK, "Map4")]
+
+
+def test_select_rejects_out_of_turn_actions():
+    draft = Draft(("alice", "bob"), POOL, compile_order("bp"))
+    with pytest.raises(NotYourTurn) as e:
+        draft.select("bob", BAN, "Map0")
+    assert e.value.captain == "alice"
+    with pytest.raises(WrongAction) as e:
+        draft.select("alice", PICK, "Map0")
+    assert e.value.expected == BAN
+    draft.select("alice", BAN, "Map0")
+    with pytest.raises(NotInPool):
+        draft.select("bob", PICK, "Map0")
+    with pytest.raises(NotInPool):
+        draft.select("bob", PICK, "Nowhere")
+    assert draft.seq == 1 and draft.next_captain == "bob"
+
+
+def test_advance_runs_random_steps_and_selections():
+    draft = Draft((1, 2), POOL, compile_order("rr~p2?"), rng=random.Random(1))
+    runs = draft.advance()
+    assert len(runs) == 1 and len(runs[0]) == 2
+    assert draft.next_action == PICK and draft.next_captain == 2
+    draft.select(2, PICK, draft.pool[0])
+    assert draft.advance() == []
+    assert draft.complete
+    # The first random pick is played whatever; one of the last two joins it.
+    assert draft.selections[0] == draft.picks[0]
+    assert len(draft.selections) == 2 and draft.selections[1] in draft.subpool
+
+
+def test_advance_stops_when_the_pool_runs_out():
+    draft = Draft((1, 2), POOL[:1], compile_order("rr"))
+    with pytest.raises(PoolExhausted) as e:
+        draft.advance()
+    assert e.value.automatic
+
+
+def play_and_restore(order, pool, seed):
+    """Run a draft as the bot does, restoring it from its journal at every turn."""
+    rng = random.Random(seed)
+    program = compile_order(order)
+    draft = Draft((1, 2), pool, program, rng=rng)
+    snapshot = draft.snapshot()
+    draft.journal = []
+    journal = []
+    while True:
+        draft.advance()
+        journal.extend(draft.journal)
+        draft.journal = []
+        restored = Draft.restore((1, 2), program, snapshot, journal)
+        assert state(restored) == state(draft), order
+        if draft.complete:
+            return
+        draft.select(draft.next_captain, draft.next_action, rng.choice(draft.pool))
+
+
+@pytest.mark.parametrize(
+    "order", [r.order for r in DEFAULT_CATALOG.rulesets.values()] + ["b~bpp", "~pp~b"]
+)
+def test_restore_matches_live_draft_for_catalog_orders(order):
+    pool = sorted(DEFAULT_CATALOG.pools["ctf"])
+    for seed in range(5):
+        play_and_restore(order, pool, seed)
+
+
+def test_restore_matches_live_draft_for_fuzzed_orders():
+    for seed, order in enumerate(fuzzed_orders(200)):
+        play_and_restore(order, POOL, seed)
+
+
+def test_restore_skips_a_trailing_swap():
+    program = compile_order("b~bpp")
+    draft = Draft((1, 2), POOL, program)
+    snapshot = draft.snapshot()
+    draft.journal = []
+    draft.select(1, BAN, "Map0")
+    draft.advance()
+    restored = Draft.restore((1, 2), program, snapshot, draft.journal)
+    assert restored.next_action == draft.next_action == BAN
+    assert restored.next_captain == draft.next_captain == 1
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from fakes import FakeChannel, FakeContext, FakeGuild, FakeMember
+
+
+def start(run, bot, order, board=False):
+    guild = FakeGuild()
+    captains = FakeMember("alice"), FakeMember("bob")
+    channel = FakeChannel(keep=True)
+    contexts = [FakeContext(c, guild, channel) for c in captains]
+    if board:
+        run(bot.enable(contexts[0], "board"))
+    run(bot.pickban(contexts[0], *captains, "ctf", order))
+    return guild, contexts
+
+
+def archived(run, bot, guild):
+    return run(
+        bot.db.fetchall(
+            "SELECT outcome, picks FROM pickban_history WHERE guild_id = ?;",
+            (guild.id,),
+        )
+    )
+
+
+def test_a_draft_cancelled_as_it_completes_is_archived_once(run, bot):
+    guild, (alice, bob) = start(run, bot, "pp")
+    run(bot.pick(alice, "Elite"))
+
+    async def last_pick_and_cancel():
+        await asyncio.gather(bot.pick(bob, "Coral"), bot.cancel(alice))
+
+    run(last_pick_and_cancel())
+    rows = archived(run, bot, guild)
+    assert [row["outcome"] for row in rows] == [bot.CANCELLED]
+    stats = run(
+        bot.db.fetchall(
+            "SELECT completed, cancelled FROM draft_stats WHERE guild_id = ?;",
+            (guild.id,),
+        )
+    )
+    assert [tuple(row) for row in stats] == [(0, 1)]
+    messages = [m.content for m in alice.channel.messages]
+    assert not any("have completed" in (m or "") for m in messages)
+
+
+def test_a_completed_draft_is_archived_once(run, bot):
+    guild, (alice, bob) = start(run, bot, "pp")
+    run(bot.pick(alice, "Elite"))
+    run(bot.pick(bob, "Coral"))
+    run(bot.cancel(alice))
+    rows = archived(run, bot, guild)
+    assert [row["outcome"] for row in rows] == [bot.COMPLETED]
+    assert json.loads(rows[0]["picks"]) == ["Elite", "Coral"]
+
+
+def test_a_draft_that_runs_out_of_maps_is_cancelled_whoever_started_it(run, bot):
+    guild = FakeGuild()
+    organiser, alice, bob = FakeMember("organiser"), FakeMember("a"), FakeMember("b")
+    channel = FakeChannel(keep=True)
+    ctx = FakeContext(organiser, guild, channel)
+    run(bot.pickban(ctx, alice, bob, "ctf", "r" * 24))
+    assert "You do not have" not in " ".join(m.content or "" for m in channel.messages)
+    assert not bot.guild_states.get(guild.id)["active-pickbans-by-user"]
+    assert [row["outcome"] for row in archived(run, bot, guild)] == [bot.CANCELLED]
+
+
+def test_status_replaces_the_board_rather_than_leaving_a_stale_copy(run, bot):
+    guild, (alice, bob) = start(run, bot, "pp", board=True)
+    process = bot.guild_states.get(guild.id)["active-pickbans-by-user"][alice.author.id]
+    first = process.board.message
+    run(bot.status(bob))
+    assert first.deleted
+    assert process.board.message is not first
+    assert not process.board.message.deleted
+
+
+def test_wiping_cancels_the_drafts_in_progress(run, bot):
+    guild, (alice, bob) = start(run, bot, "ppp", board=True)
+    run(bot.pick(alice, "Elite"))
+    process = bot.guild_states.get(guild.id)["active-pickbans-by-user"][bob.author.id]
+    run(bot.wipe(alice))
+    assert [row["outcome"] for row in archived(run, bot, guild)] == [bot.CANCELLED]
+    assert process.board.cancelled
+    assert "Cancelled." in process.board.message.content
+    assert not run(bot.db.fetchall("SELECT * FROM pickbans;"))
@@ -0,0 +1,122 @@
+import sqlite3
+
+import pytest
+
+from solomonbot import schema
+from solomonbot.migrations import (
+    MIGRATIONS,
+    SCHEMA_VERSION,
+    migrate,
+    unclaimed_tables,
+    upgrade_tables,
+)
+
+
+@pytest.fixture
+def c():
+    connection = sqlite3.connect(":memory:")
+    connection.row_factory = sqlite3.Row
+    yield connection
+    connection.close()
+
+
+def layout(c):
+    """Every table's columns and every index's columns, for comparing schemas."""
+    tables = {}
+    for (name,) in c.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name != ?;",
+        ("schema_version",),
+    ):
+        tables[name] = [
+            tuple(r)[1:] for r in c.execute("PRAGMA table_info({});".format(name))
+        ]
+    indexes = {}
+    for (name,) in c.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL;"
+    ):
+        indexes[name] = [
+            tuple(r) for r in c.execute("PRAGMA index_info({});".format(name))
+        ]
+    return tables, indexes
+
+
+def at_version(c, version):
+    c.execute("CREATE TABLE schema_version (version INTEGER NOT NULL);")
+    for step in MIGRATIONS[:version]:
+        step(c)
+    c.execute("INSERT INTO schema_version (version) VALUES (?);", (version,))
+
+
+def test_migrating_an_empty_database_gives_the_current_schema(c):
+    assert migrate(c) == list(range(1, SCHEMA_VERSION + 1))
+    current = sqlite3.connect(":memory:")
+    current.executescript(schema.create_script())
+    assert layout(c) == layout(current)
+    assert migrate(c) == []
+
+
+@pytest.mark.parametrize("version", range(1, SCHEMA_VERSION))
+def test_migrating_from_each_version_gives_the_current_schema(c, version):
+    at_version(c, version)
+    assert migrate(c) == list(range(version + 1, SCHEMA_VERSION + 1))
+    fresh = sqlite3.connect(":memory:")
+    fresh.row_factory = sqlite3.Row
+    migrate(fresh)
+    assert layout(c) == layout(fresh)
+
+
+def test_signups_from_version_1_join_a_default_tournament(c):
+    at_version(c, 1)
+    c.executemany(
+        "INSERT INTO signups (guild_id, user_id, checkin_time) VALUES (?, ?, ?);",
+        [(5, 1, None), (5, 2, "2020-01-01"), (6, 1, None)],
+    )
+    c.execute("INSERT INTO settings VALUES (5, 'signups', 'on');")
+    migrate(c)
+    tournaments = {
+        r["guild_id"]: tuple(r)
+        for r in c.execute(
+            "SELECT guild_id, id, name, status, signups, checkins FROM tournaments;"
+        )
+    }
+    assert tournaments[5][2:] == ("default", "open", 1, 0)
+    assert tournaments[6][2:] == ("default", "closed", 0, 0)
+    counters = {
+        (r["tournament_id"], r["name"]): r["value"]
+        for r in c.execute("SELECT * FROM counters;")
+    }
+    assert counters == {
+        (tournaments[5][1], "signups"): 2,
+        (tournaments[5][1], "checkins"): 1,
+        (tournaments[6][1], "signups"): 1,
+    }
+    assert not c.execute("SELECT * FROM settings;").fetchall()
+
+
+def test_databases_from_before_migrations_are_brought_up_to_date(c):
+    # Keyed by guild, but from before ratings and the current indexes
+    c.execute(
+        "CREATE TABLE signups (guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL,"
+        " display_name TEXT, signup_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,"
+        " checkin_time TIMESTAMP DEFAULT NULL, PRIMARY KEY (guild_id, user_id));"
+    )
+    c.execute("CREATE INDEX signups_by_signup_time ON signups (signup_time);")
+    c.execute("INSERT INTO signups (guild_id, user_id) VALUES (5, 1);")
+    migrate(c)
+    assert "rating" in [r["name"] for r in c.execute("PRAGMA table_info(signups);")]
+    assert not c.execute(
+        "SELECT * FROM sqlite_master WHERE name = 'signups_by_signup_time';"
+    ).fetchall()
+    assert [tuple(r) for r in c.execute("SELECT user_id FROM signups;")] == [(1,)]
+    assert c.execute("SELECT value FROM counters WHERE name = 'signups';").fetchall()
+
+
+def test_tables_from_before_guilds_are_left_for_dbupgrade(c):
+    c.execute("CREATE TABLE signups (mention TEXT PRIMARY KEY, display_name TEXT);")
+    c.execute("INSERT INTO signups VALUES ('<@!1>', 'alice');")
+    migrate(c)
+    assert unclaimed_tables(c) == ["signups"]
+    assert "signups" in upgrade_tables(c, 5)
+    assert unclaimed_tables(c) == []
+    row = c.execute("SELECT guild_id, user_id, display_name FROM signups;").fetchone()
+    assert tuple(row) == (5, 1, "alice")
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from solomonbot.outbound import Bucket, Outbox, pack
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_items_fill_each_message_up_to_the_limit():
+    items = ["x" * 9] * 4
+    # "header" + 2 * " xxxxxxxxx" is exactly 26 characters.
+    assert pack("header", items, limit=26) == [
+        "header " + " ".join(items[:2]),
+        " ".join(items[2:]),
+    ]
+    assert [len(m) for m in pack("header", items, limit=25)] == [16, 19, 9]
+
+
+def test_messages_are_never_longer_than_2000_characters():
+    items = ["<@{}>".format(10**17 + i) for i in range(1000)]
+    messages = pack("Reminder:", items)
+    assert all(len(m) <= 2000 for m in messages)
+    assert len(messages[0]) > 2000 - len(items[0]) - 1
+    assert " ".join(messages) == " ".join(["Reminder:"] + items)
+
+
+def test_an_item_longer_than_the_limit_is_refused():
+    with pytest.raises(ValueError):
+        pack("header", ["x" * 2001])
+    assert pack("", ["x" * 2000]) == ["x" * 2000]
+
+
+def test_nothing_to_send_gives_just_the_header():
+    assert pack("header", []) == ["header"]
+    assert pack("", []) == []
+
+
+def test_buckets_refill_as_requests_leave_the_window():
+    clock = Clock()
+    bucket = Bucket(2, 5.0, clock=clock)
+    assert bucket.idle
+    bucket.take()
+    clock.now = 1.0
+    bucket.take()
+    assert bucket.delay() == 5.0 - 1.0
+    clock.now = 4.999
+    assert bucket.delay() == pytest.approx(0.001)
+    clock.now = 5.0
+    assert bucket.delay() == 0
+    bucket.take()
+    assert bucket.delay() == pytest.approx(1.0)
+    clock.now = 11.0
+    assert bucket.delay() == 0 and bucket.idle
+
+
+class Channel:
+    def __init__(self, id, clock):
+        self.id = id
+        self.clock = clock
+        self.sent = []
+
+    async def send(self, content):
+        self.sent.append((self.clock(), content))
+
+
+def test_the_outbox_paces_messages_to_each_channel(run, monkeypatch):
+    clock = Clock()
+
+    async def sleep(delay):
+        clock.now += delay
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    outbox = Outbox(channel_rate=(2, 1.0), global_rate=(3, 1.0), clock=clock)
+    a, b = Channel(1, clock), Channel(2, clock)
+
+    async def main():
+        for i in range(3):
+            await outbox.send(a, "a{}".format(i))
+        await outbox.send(b, "b0")
+
+    run(main())
+    assert a.sent == [(0.0, "a0"), (0.0, "a1"), (1.0, "a2")]
+    # By then the first two have left the global limit's window.
+    assert b.sent == [(1.0, "b0")]
+    assert outbox.sent == 4
+    assert outbox.waited == pytest.approx(1.0)
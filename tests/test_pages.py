@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from fakes import FakeChannel, FakeContext, FakeGuild, FakeMember, FakeMessage
+
+from solomonbot import NEXT_PAGE, PREVIOUS_PAGE
+
+PLAYERS = 250
+
+
+class Reader:
+    """Someone reacting to the last message listed, with the given emoji in
+    turn; after them, the bot times out waiting."""
+
+    def __init__(self):
+        self.member = FakeMember("reader")
+        self.emoji = []
+        self.message = None
+
+    async def wait_for(self, event, check, timeout):
+        while self.emoji:
+            reaction = SimpleNamespace(message=self.message, emoji=self.emoji.pop(0))
+            if check(reaction, self.member):
+                return reaction, self.member
+        raise asyncio.TimeoutError()
+
+
+@pytest.fixture
+def reader(bot, monkeypatch):
+    reader = Reader()
+    monkeypatch.setattr(bot.bot, "wait_for", reader.wait_for)
+    return reader
+
+
+def list_signups(run, bot, reader, page=1):
+    """List PLAYERS signups, letting the reader turn the pages until done."""
+    guild = FakeGuild()
+    owner = FakeContext(FakeMember("owner"), guild)
+    run(bot.tournament(owner, "create", "cup"))
+    t = run(bot.tournament_store.get(guild.id, "cup"))
+
+    def add_players(c):
+        c.executemany(
+            "INSERT INTO signups (tournament_id, user_id, guild_id, display_name,"
+            " signup_time) VALUES (?, ?, ?, ?, ?);",
+            (
+                (t.id, i, guild.id, "player{}".format(i), "2020-01-01")
+                for i in range(PLAYERS)
+            ),
+        )
+        c.execute(
+            "INSERT INTO counters (tournament_id, name, value)"
+            " VALUES (?, 'signups', ?);",
+            (t.id, PLAYERS),
+        )
+
+    run(bot.db.transaction(add_players))
+    ctx = FakeContext(reader.member, guild, FakeChannel(keep=True))
+
+    async def show():
+        await bot.signups(ctx, "cup", page)
+        reader.message = ctx.channel.messages[-1]
+        await asyncio.wait(bot.page_turners)
+        await asyncio.sleep(0)
+
+    run(show())
+    return reader.message
+
+
+def first_field(message):
+    return message.embed.to_dict()["fields"][0]
+
+
+def test_pages_turn_forwards_and_back(run, bot, reader):
+    reader.emoji = [NEXT_PAGE, NEXT_PAGE, NEXT_PAGE, PREVIOUS_PAGE]
+    message = list_signups(run, bot, reader)
+    # The third "next" had nowhere to go, so only three edits were made.
+    assert message.edits == 3
+    assert message.embed.footer.text == "Page 2 of 3"
+    assert first_field(message)["name"] == "101-120:"
+    assert first_field(message)["value"].split("\n")[0] == "player100"
+    assert not bot.page_turners
+
+
+def test_pages_can_be_turned_from_any_page(run, bot, reader):
+    reader.emoji = [PREVIOUS_PAGE, "\N{THUMBS UP SIGN}", PREVIOUS_PAGE, PREVIOUS_PAGE]
+    message = list_signups(run, bot, reader, page=3)
+    assert message.edits == 2
+    assert message.embed.footer.text == "Page 1 of 3"
+    assert first_field(message)["name"] == "1-20:"
+
+
+def test_failing_to_turn_pages_is_logged(run, bot, reader, monkeypatch, caplog):
+    async def add_reaction(self, emoji):
+        raise discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), "")
+
+    monkeypatch.setattr(FakeMessage, "add_reaction", add_reaction)
+    with caplog.at_level(logging.ERROR, logger="solomonbot"):
+        list_signups(run, bot, reader)
+    assert [r.message for r in caplog.records] == ["Turning pages failed"]
+    assert not bot.page_turners
@@ -0,0 +1,17 @@
+from solomonbot.sharding import ShardLeases
+
+
+def test_leases_taken_by_another_process_are_lost_for_good(run, bot):
+    leases = ShardLeases(bot.db, [0, 1], 4)
+    run(leases.acquire(wait=0))
+    assert run(leases.renew())
+    run(
+        bot.db.execute(
+            "UPDATE shard_leases SET owner = 'elsewhere:1' WHERE shard_id = 1;"
+        )
+    )
+    assert not run(leases.renew())
+    assert leases.lost
+    # Getting the lease back doesn't make it safe to carry on.
+    run(bot.db.execute("DELETE FROM shard_leases WHERE shard_id = 1;"))
+    assert not run(leases.renew())
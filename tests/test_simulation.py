@@ -0,0 +1,18 @@
+import math
+
+import pytest
+
+from solomonbot.draft import compile_order
+from solomonbot.simulation import SimulationError, simulate
+
+POOL = ["Elite", "Coral", "Forge", "Bogus"]
+
+
+@pytest.mark.parametrize("weight", [0, -1, math.nan, math.inf])
+def test_weights_have_to_be_finite_and_positive(weight):
+    with pytest.raises(SimulationError):
+        simulate(POOL, compile_order("pb"), 10, weights={"Elite": weight})
+
+
+def test_weighted_simulation_runs():
+    simulate(POOL, compile_order("pb"), 10, weights={"Elite": 2.5}, seed=1)
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from solomonbot.teams import TeamError, balance, team_sizes
+
+
+def spread(ratings, teams):
+    totals = [sum(ratings[p] for p in team) for team in teams]
+    return max(totals) - min(totals)
+
+
+def random_ratings(count, seed):
+    rng = random.Random(seed)
+    return {"p{}".format(i): rng.uniform(800, 2200) for i in range(count)}
+
+
+def test_team_sizes_differ_by_at_most_one():
+    assert team_sizes(10, 3) == [4, 3, 3]
+    assert team_sizes(6, 3) == [2, 2, 2]
+
+
+@pytest.mark.parametrize("count,team_count", [(10, 2), (11, 3), (17, 4), (5, 5)])
+def test_every_player_is_placed_in_teams_of_nearly_equal_size(count, team_count):
+    ratings = random_ratings(count, count)
+    teams = balance(ratings, team_count)
+    assert sorted(p for team in teams for p in team) == sorted(ratings)
+    sizes = [len(team) for team in teams]
+    assert max(sizes) - min(sizes) <= 1
+    for team in teams:
+        assert team == sorted(team, key=lambda p: -ratings[p])
+
+
+def test_pinned_captains_stay_on_their_team():
+    ratings = random_ratings(12, 1)
+    # The two strongest players captaining the same side can't be helped.
+    strongest = sorted(ratings, key=lambda p: -ratings[p])
+    pinned = {strongest[0]: 1, strongest[1]: 1, strongest[2]: 0}
+    teams = balance(ratings, 2, pinned)
+    for player, team in pinned.items():
+        assert player in teams[team]
+    assert [len(team) for team in teams] == [6, 6]
+
+
+def test_the_team_with_most_pinned_players_gets_the_extra_place():
+    ratings = random_ratings(7, 2)
+    players = sorted(ratings)
+    teams = balance(ratings, 2, {players[0]: 1, players[1]: 1, players[2]: 1})
+    assert [len(team) for team in teams] == [3, 4]
+
+
+def test_balancing_is_deterministic():
+    ratings = random_ratings(40, 3)
+    pinned = {"p0": 0, "p1": 1, "p2": 2, "p3": 3}
+    assert balance(ratings, 4, pinned) == balance(dict(ratings), 4, dict(pinned))
+
+
+def test_ratings_are_spread_evenly():
+    ratings = {"a": 2000, "b": 1800, "c": 1500, "d": 1400, "e": 1200, "f": 1100}
+    teams = balance(ratings, 2)
+    assert spread(ratings, teams) == 0
+    assert sorted(map(sorted, teams)) == [["a", "d", "f"], ["b", "c", "e"]]
+    # Refining the greedy split gets close to even on bigger groups too.
+    ratings = random_ratings(60, 4)
+    greedy = spread(ratings, balance(ratings, 6, max_swaps=0))
+    assert spread(ratings, balance(ratings, 6)) < min(greedy / 5, 10)
+
+
+def test_impossible_splits_are_refused():
+    ratings = random_ratings(4, 5)
+    with pytest.raises(TeamError):
+        balance(ratings, 0)
+    with pytest.raises(TeamError):
+        balance(ratings, 5)
+    with pytest.raises(TeamError):
+        balance(ratings, 2, {"p0": 2})
+    with pytest.raises(TeamError):
+        balance(ratings, 2, {"p0": 0, "p1": 0, "p2": 0})
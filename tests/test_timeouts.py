@@ -0,0 +1,114 @@
+import asyncio
+import logging
+
+from solomonbot.timeouts import Scheduler
+
+
+def recorder(fired, name):
+    async def callback():
+        fired.append(name)
+
+    return callback
+
+
+def test_timers_go_off_in_order_of_their_deadlines(run):
+    scheduler = Scheduler()
+    fired = []
+
+    async def main():
+        scheduler.start()
+        scheduler.schedule("c", 0.06, recorder(fired, "c"))
+        scheduler.schedule("a", 0.02, recorder(fired, "a"))
+        scheduler.schedule("b", 0.04, recorder(fired, "b"))
+        await asyncio.sleep(0.01)
+        assert fired == []
+        await asyncio.sleep(0.1)
+        scheduler.stop()
+
+    run(main())
+    assert fired == ["a", "b", "c"]
+    assert scheduler.fired == 3
+    assert len(scheduler) == 0
+
+
+def test_cancelled_timers_never_go_off(run):
+    scheduler = Scheduler()
+    fired = []
+
+    async def main():
+        scheduler.start()
+        scheduler.schedule("a", 0.02, recorder(fired, "a"))
+        scheduler.schedule("b", 0.02, recorder(fired, "b"))
+        scheduler.cancel("a")
+        scheduler.cancel("nothing")
+        assert scheduler.remaining("a") is None
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+
+    run(main())
+    assert fired == ["b"]
+
+
+def test_scheduling_a_key_again_replaces_its_timer(run):
+    scheduler = Scheduler()
+    fired = []
+
+    async def main():
+        scheduler.start()
+        scheduler.schedule("a", 0.02, recorder(fired, "first"))
+        scheduler.schedule("a", 0.05, recorder(fired, "second"))
+        assert len(scheduler) == 1
+        assert 0.04 < scheduler.remaining("a") <= 0.05
+        await asyncio.sleep(0.035)
+        assert fired == []
+        # Brought forward, the sleeping task has to wake up early for it.
+        scheduler.schedule("a", 0.005, recorder(fired, "third"))
+        await asyncio.sleep(0.01)
+        assert fired == ["third"]
+        await asyncio.sleep(0.03)
+        scheduler.stop()
+
+    run(main())
+    assert fired == ["third"]
+
+
+def test_the_heap_is_rebuilt_when_replaced_timers_pile_up():
+    scheduler = Scheduler()
+    for i in range(1000):
+        scheduler.schedule("a", i, None)
+    assert len(scheduler) == 1
+    assert len(scheduler._heap) <= 2 + 64
+
+
+def test_a_failing_callback_is_logged_and_the_others_still_run(run, caplog):
+    scheduler = Scheduler()
+    fired = []
+
+    async def fail():
+        raise RuntimeError("oops")
+
+    async def main():
+        scheduler.start()
+        scheduler.schedule("fails", 0.01, fail)
+        scheduler.schedule("b", 0.02, recorder(fired, "b"))
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+
+    with caplog.at_level(logging.ERROR, logger="solomonbot.timeouts"):
+        run(main())
+    assert fired == ["b"]
+    assert any(r.exc_info and "oops" in str(r.exc_info[1]) for r in caplog.records)
+
+
+def test_stopped_schedulers_fire_nothing(run):
+    scheduler = Scheduler()
+    fired = []
+
+    async def main():
+        scheduler.start()
+        scheduler.schedule("a", 0.02, recorder(fired, "a"))
+        scheduler.stop()
+        await asyncio.sleep(0.04)
+
+    run(main())
+    assert fired == []
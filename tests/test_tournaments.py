@@ -0,0 +1,169 @@
+import sqlite3
+
+import pytest
+
+from fakes import FakeChannel, FakeContext, FakeGuild, FakeMember
+
+import solomonbot
+from solomonbot.migrations import MIGRATIONS
+
+
+def context(guild, name="owner"):
+    return FakeContext(FakeMember(name), guild, FakeChannel(keep=True))
+
+
+def replies(ctx):
+    return [m.content for m in ctx.channel.messages]
+
+
+def test_signups_and_checkins_are_not_settings_any_more(run, bot):
+    ctx = context(FakeGuild())
+    run(bot.enable(ctx, "signups"))
+    run(bot.disable(ctx, "checkins"))
+    assert all("tournament open|close" in reply for reply in replies(ctx))
+    assert run(bot.get_setting(ctx, "signups")) is None
+    run(bot.enable(ctx, "board"))
+    assert replies(ctx)[-1] == "Set `board` to `on`."
+
+
+def counters(run, bot, guild, name):
+    t = run(bot.tournament_store.get(guild.id, name))
+    rows = run(
+        bot.db.fetchall(
+            "SELECT name, value FROM counters WHERE tournament_id = ?;", (t.id,)
+        )
+    )
+    return {row["name"]: row["value"] for row in rows}
+
+
+def test_signups_checkins_and_withdrawals_keep_count(run, bot):
+    guild = FakeGuild()
+    owner = context(guild)
+    run(bot.tournament(owner, "create", "cup"))
+    alice, bob = context(guild, "alice"), context(guild, "bob")
+    run(bot.signup(alice))
+    assert replies(alice) == ["Signups are not currently enabled."]
+
+    run(bot.tournament(owner, "open", "cup"))
+    run(bot.signup(alice))
+    run(bot.signup(alice))
+    run(bot.signup(bob))
+    assert replies(bob)[-1].endswith("is now signed up (#2, bob).")
+    assert replies(alice)[-1].startswith("You're already signed up")
+    assert counters(run, bot, guild, "cup") == {"signups": 2}
+
+    run(bot.checkin(alice))
+    assert replies(alice)[-1] == "Checkins are not currently enabled."
+    run(bot.tournament(owner, "open", "cup", "checkins"))
+    run(bot.checkin(alice))
+    run(bot.checkin(alice))
+    assert replies(alice)[-1].startswith("You're already checked in")
+    assert counters(run, bot, guild, "cup") == {"signups": 2, "checkins": 1}
+
+    run(bot.withdraw(alice))
+    run(bot.withdraw(alice))
+    assert replies(alice)[-1].startswith("You're not signed up")
+    assert counters(run, bot, guild, "cup") == {"signups": 1, "checkins": 0}
+    run(bot.checkin(alice))
+    assert replies(alice)[-1].startswith("You're not signed up")
+
+    run(bot.tournament(owner, "close", "cup", "signups"))
+    t = run(bot.tournament_store.get(guild.id, "cup"))
+    assert (t.status, t.signups, t.checkins) == (bot.tournaments.OPEN, False, True)
+
+
+def test_two_tournaments_run_at_once(run, bot):
+    guild = FakeGuild()
+    owner = context(guild)
+    for name in ("cup", "ladder"):
+        run(bot.tournament(owner, "create", name))
+        run(bot.tournament(owner, "open", name))
+    alice, bob = context(guild, "alice"), context(guild, "bob")
+    run(bot.signup(alice))
+    assert replies(alice)[-1] == (
+        "There are several tournaments; say which: `cup`, `ladder`."
+    )
+    run(bot.signup(alice, "cup"))
+    run(bot.signup(alice, "ladder"))
+    run(bot.signup(bob, "ladder"))
+    assert counters(run, bot, guild, "cup") == {"signups": 1}
+    assert counters(run, bot, guild, "ladder") == {"signups": 2}
+
+    # With signups closed for one, the other is the only choice.
+    run(bot.tournament(owner, "close", "cup", "signups"))
+    run(bot.withdraw(bob))
+    assert replies(bob)[-1].startswith("Your signup has been withdrawn")
+    assert counters(run, bot, guild, "ladder") == {"signups": 1}
+    assert counters(run, bot, guild, "cup") == {"signups": 1}
+
+    # Nor does another server see either of them.
+    elsewhere = context(FakeGuild(), "carol")
+    run(bot.signup(elsewhere))
+    assert replies(elsewhere) == ["Signups are not currently enabled."]
+
+
+def test_closed_tournaments_can_be_archived(run, bot):
+    guild = FakeGuild()
+    owner = context(guild)
+    run(bot.tournament(owner, "create", "cup"))
+    run(bot.tournament(owner, "open", "cup"))
+    alice = context(guild, "alice")
+    run(bot.signup(alice))
+    run(bot.tournament(owner, "archive", "cup"))
+    assert replies(owner)[-1] == (
+        "Only closed tournaments can be archived, and `cup` is open."
+    )
+
+    run(bot.tournament(owner, "close", "cup"))
+    run(bot.tournament(owner, "archive", "cup"))
+    assert replies(owner)[-1] == "`cup` is now archived."
+    t = run(bot.tournament_store.get(guild.id, "cup"))
+    assert bot.tournaments.player_table(t) == "archived_signups"
+    assert not run(
+        bot.db.fetchall("SELECT * FROM signups WHERE tournament_id = ?;", (t.id,))
+    )
+    out, count = run(bot.PlayerList(bot.db, t, "signups").export("jsonl"))
+    assert count == 1 and b'"display_name": "alice"' in out.read()
+    assert counters(run, bot, guild, "cup") == {"signups": 1}
+
+    run(bot.tournament(owner, "open", "cup"))
+    assert replies(owner)[-1] == "`cup` has already been archived."
+    run(bot.signup(alice, "cup"))
+    assert replies(alice)[-1] == "Signups for `cup` are not currently enabled."
+
+
+@pytest.fixture
+def old_bot(run, tmp_path):
+    """The bot, started up against a database from before tournaments."""
+    path = str(tmp_path / "solomonbot.sqlite3")
+    guild = FakeGuild()
+    c = sqlite3.connect(path)
+    c.row_factory = sqlite3.Row
+    c.execute("CREATE TABLE schema_version (version INTEGER NOT NULL);")
+    for step in MIGRATIONS[:2]:
+        step(c)
+    c.execute("INSERT INTO schema_version (version) VALUES (2);")
+    c.executemany(
+        "INSERT INTO signups (guild_id, user_id, display_name, checkin_time)"
+        " VALUES (?, ?, ?, ?);",
+        [(guild.id, 1, "alice", "2020-01-01 00:00:00"), (guild.id, 2, "bob", None)],
+    )
+    c.execute("INSERT INTO settings VALUES (?, 'signups', 'on');", (guild.id,))
+    c.commit()
+    c.close()
+    run(solomonbot.start_up(path))
+    yield solomonbot, guild
+    solomonbot.db.close()
+
+
+def test_signups_from_before_tournaments_carry_on_in_a_default_one(run, old_bot):
+    bot, guild = old_bot
+    t = run(bot.tournament_store.get(guild.id, "default"))
+    assert (t.status, t.signups, t.checkins) == (bot.tournaments.OPEN, True, False)
+    assert counters(run, bot, guild, "default") == {"signups": 2, "checkins": 1}
+    carol = context(guild, "carol")
+    run(bot.signup(carol))
+    assert replies(carol)[-1].endswith("is now signed up (#3, carol).")
+    owner = context(guild)
+    run(bot.list_settings(owner))
+    assert "signups" not in str(owner.channel.messages[-1].embed.to_dict())